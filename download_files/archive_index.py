@@ -0,0 +1,278 @@
+import os
+import stat
+import time
+import sqlite3
+import argparse
+import threading
+from staged_scan import full_hash
+from parallel_hash import DEFAULT_WORKERS, hash_files
+from hash_cache import get_cache
+
+# Archive index shared by the scripts (in the same directory as them),
+# set DDAS_ARCHIVE_INDEX to use another path
+INDEX_FILE = os.environ.get(
+    "DDAS_ARCHIVE_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive_index.db"),
+)
+
+# Classification of a downloaded file against the archives
+UNIQUE = "unique"
+IN_ARCHIVE = "in archive"
+RENAMED = "in archive under another name"
+
+# Values bound per IN (...) query
+QUERY_BATCH = 500
+
+class ArchiveIndex:
+    """SQLite (WAL mode) index of the files of one or more archive folders.
+
+    update() only stats an archive: new and changed files are recorded by
+    size, modification time and inode, files that disappeared are dropped,
+    and unchanged files keep their digest. Digests are computed lazily,
+    only for archive files whose size matches a file being classified, so
+    a large archive is never read in full just to be compared with a
+    handful of downloads.
+
+    Files are keyed by archive and path, so a file inside two nested or
+    overlapping archive folders has one row in each, and updating one
+    archive never rewrites the rows of another.
+    """
+
+    def __init__(self, db_path=INDEX_FILE):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archives ("
+            " root TEXT PRIMARY KEY,"
+            " updated REAL NOT NULL)"
+        )
+        # Indexes created before files were keyed by archive and path
+        primary_key = [row[1] for row in self._conn.execute("PRAGMA table_info(files)") if row[5]]
+        if primary_key == ['path']:
+            self._conn.execute("ALTER TABLE files RENAME TO files_by_path")
+            self._conn.execute("DROP INDEX IF EXISTS files_archive")
+            self._conn.execute("DROP INDEX IF EXISTS files_size")
+            self._conn.execute("DROP INDEX IF EXISTS files_digest")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " archive TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest TEXT,"
+            " PRIMARY KEY (archive, path))"
+        )
+        if primary_key == ['path']:
+            self._conn.execute(
+                "INSERT INTO files (archive, path, name, size, mtime_ns, inode, digest) "
+                "SELECT archive, path, name, size, mtime_ns, inode, digest FROM files_by_path")
+            self._conn.execute("DROP TABLE files_by_path")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_path ON files (path)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_size ON files (size)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_digest ON files (digest)")
+        self._conn.commit()
+
+    def update(self, archive_dir):
+        """
+        Bring the entries of an archive folder up to date with a stat walk.
+
+        Returns:
+            (added or changed, removed) file counts.
+        """
+        root = os.path.abspath(archive_dir)
+        with self._lock:
+            known = {path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in self._conn.execute(
+                "SELECT path, size, mtime_ns, inode FROM files WHERE archive = ?", (root,))}
+        changed = []
+        for dirpath, _, file_names in os.walk(root):
+            for file_name in file_names:
+                file_path = os.path.join(dirpath, file_name)
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+                if known.pop(file_path, None) != signature:
+                    changed.append((root, file_path, file_name) + signature)
+        with self._lock:
+            # Changed files lose their digest, it is computed again when needed
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (archive, path, name, size, mtime_ns, inode, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL)", changed)
+            self._conn.executemany("DELETE FROM files WHERE archive = ? AND path = ?",
+                                   ((root, path) for path in known))
+            self._conn.execute("INSERT OR REPLACE INTO archives VALUES (?, ?)", (root, time.time()))
+            self._conn.commit()
+        return len(changed), len(known)
+
+    def remove_archive(self, archive_dir):
+        """Forget an archive folder and its files."""
+        root = os.path.abspath(archive_dir)
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE archive = ?", (root,))
+            self._conn.execute("DELETE FROM archives WHERE root = ?", (root,))
+            self._conn.commit()
+
+    def archives(self):
+        """Return the indexed archive folders."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT root FROM archives ORDER BY root")]
+
+    def _scope(self, archives):
+        """SQL condition and parameters restricting queries to some archives, all if None."""
+        if archives is None:
+            return "1", []
+        roots = [os.path.abspath(archive_dir) for archive_dir in archives]
+        return f"archive IN ({', '.join('?' for _ in roots)})", roots
+
+    def sizes(self, archives=None):
+        """Return the set of file sizes present in the archives."""
+        condition, params = self._scope(archives)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT size FROM files WHERE {condition}", params)}
+
+    def _select_by_size(self, columns, sizes, archives, extra=""):
+        condition, params = self._scope(archives)
+        sizes = list(sizes)
+        rows = []
+        for start in range(0, len(sizes), QUERY_BATCH):
+            batch = sizes[start:start + QUERY_BATCH]
+            with self._lock:
+                rows.extend(self._conn.execute(
+                    f"SELECT {columns} FROM files WHERE {condition} "
+                    f"AND size IN ({', '.join('?' for _ in batch)}){extra}", params + batch))
+        return rows
+
+    def hash_sizes(self, sizes, archives=None, workers=DEFAULT_WORKERS, use_processes=False):
+        """
+        Compute the missing digests of the archive files with one of the given sizes.
+
+        Each file is stat'ed before it is hashed and again after, a file
+        that changed meanwhile keeps no digest rather than one that may
+        not match its recorded size.
+
+        Returns:
+            Number of files hashed.
+        """
+        rows = self._select_by_size("DISTINCT path", sizes, archives, " AND digest IS NULL")
+        signatures = {}
+
+        def jobs():
+            for (file_path,) in rows:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    continue
+                signatures[file_path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                yield file_path, st.st_size, "sha256"
+
+        hashed = []
+        for (file_path, _, _), digest, _ in hash_files(jobs(), full_hash, workers, use_processes,
+                                                       cache=get_cache()):
+            if digest is None:
+                print(f"Could not read archive file: {file_path}")
+                continue
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            signature = signatures.pop(file_path)
+            if (st.st_size, st.st_mtime_ns, st.st_ino) != signature:
+                print(f"Archive file changed while hashed, skipped: {file_path}")
+                continue
+            hashed.append((digest,) + signature + (file_path,))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET digest = ?, size = ?, mtime_ns = ?, inode = ? WHERE path = ?", hashed)
+            self._conn.commit()
+        return len(hashed)
+
+    def find_digest(self, digest, archives=None):
+        """Return (path, name) of every archive file with a digest."""
+        condition, params = self._scope(archives)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT DISTINCT path, name FROM files WHERE {condition} AND digest = ? ORDER BY path",
+                params + [digest]).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def classify_files(files, index, archives=None, workers=DEFAULT_WORKERS, use_processes=False):
+    """
+    Compare files against indexed archives.
+
+    Files whose size appears in no archive are unique without being read.
+    The others are hashed, together with the archive files of the same
+    sizes that have no digest yet.
+
+    Args:
+        files: Iterable of (path, size) pairs, as yielded by walk_files.
+        index: ArchiveIndex, up to date for the archives.
+        archives: Archive folders to compare with, all indexed ones if None.
+        workers: Number of hashing workers.
+        use_processes: Hash in worker processes instead of threads.
+
+    Returns:
+        Dict mapping each path to (UNIQUE, None), (IN_ARCHIVE, archive path)
+        or (RENAMED, archive path). A copy under the same file name is
+        preferred over a renamed one.
+    """
+    archive_sizes = index.sizes(archives)
+    results = {}
+    candidates = []
+    for file_path, size in files:
+        if size in archive_sizes:
+            candidates.append((file_path, size))
+        else:
+            results[file_path] = (UNIQUE, None)
+
+    index.hash_sizes({size for _, size in candidates}, archives, workers, use_processes)
+
+    jobs = ((file_path, size, "sha256") for file_path, size in candidates)
+    for (file_path, _, _), digest, _ in hash_files(jobs, full_hash, workers, use_processes, cache=get_cache()):
+        if digest is None:
+            print(f"Could not read file: {file_path}")
+            continue
+        matches = index.find_digest(digest, archives)
+        name = os.path.normcase(os.path.basename(file_path))
+        same_name = [path for path, archive_name in matches if os.path.normcase(archive_name) == name]
+        if same_name:
+            results[file_path] = (IN_ARCHIVE, same_name[0])
+        elif matches:
+            results[file_path] = (RENAMED, matches[0][0])
+        else:
+            results[file_path] = (UNIQUE, None)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index archive folders for downloadfolder.py.")
+    parser.add_argument("archives", nargs="*", help="archive folders to add or refresh (default: all indexed)")
+    parser.add_argument("--remove", action="store_true", help="forget the given archive folders instead")
+    parser.add_argument("--index", default=INDEX_FILE, help="index database (default: %(default)s)")
+    args = parser.parse_args()
+
+    index = ArchiveIndex(args.index)
+    if args.remove:
+        for archive_dir in args.archives:
+            index.remove_archive(archive_dir)
+            print(f"Removed {archive_dir}")
+    else:
+        for archive_dir in args.archives or index.archives():
+            changed, removed = index.update(archive_dir)
+            print(f"{archive_dir}: {changed} new or changed, {removed} removed")
+    print(f"{len(index)} archive files indexed")
+    index.close()
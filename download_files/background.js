@@ -1,26 +1,171 @@
+// Local lookup service (python -m ddas serve), it knows every completed download by URL, ETag and size
+const SERVICE_URL = "http://127.0.0.1:8765";
+
+// The service only answers requests carrying its token (lookup_token.txt), pasted in the settings
+const TOKEN_HEADER = "X-DDAS-Token";
+
+// Milliseconds to wait for the service before falling back to file names
+const SERVICE_TIMEOUT = 1500;
+
+// ETag and Content-Length of recent responses by URL, downloads don't expose their headers
+const responseHeaders = new Map();
+const MAX_REMEMBERED_RESPONSES = 500;
+
+// URLs the user chose to download again from a duplicate alert
+const allowedOnce = new Set();
+
+chrome.webRequest.onHeadersReceived.addListener((details) => {
+    let headers = {};
+    for (let header of details.responseHeaders || []) {
+        let name = header.name.toLowerCase();
+        if (name === "etag" || name === "content-length") {
+            headers[name] = header.value;
+        }
+    }
+    if (!headers.etag) {
+        return;
+    }
+    responseHeaders.delete(details.url);
+    responseHeaders.set(details.url, headers);
+    if (responseHeaders.size > MAX_REMEMBERED_RESPONSES) {
+        // Maps keep insertion order, drop the oldest
+        responseHeaders.delete(responseHeaders.keys().next().value);
+    }
+}, { urls: ["<all_urls>"], types: ["main_frame", "sub_frame", "other"] }, ["responseHeaders"]);
+
+function headersFor(downloadItem) {
+    return responseHeaders.get(downloadItem.finalUrl) || responseHeaders.get(downloadItem.url) || {};
+}
+
+// POST a JSON request to the service, resolves to null if it isn't running or refuses it
+async function queryService(path, body) {
+    let { serviceToken } = await getStorage(["serviceToken"]);
+    let controller = new AbortController();
+    let timer = setTimeout(() => controller.abort(), SERVICE_TIMEOUT);
+    try {
+        let response = await fetch(SERVICE_URL + path, {
+            method: "POST",
+            headers: { "Content-Type": "application/json", [TOKEN_HEADER]: serviceToken || "" },
+            body: JSON.stringify(body),
+            signal: controller.signal
+        });
+        return response.ok ? await response.json() : null;
+    } catch (e) {
+        return null;
+    } finally {
+        clearTimeout(timer);
+    }
+}
+
+function getStorage(keys) {
+    return new Promise((resolve) => chrome.storage.local.get(keys, resolve));
+}
+
+// File names seen so far, an object used as a set (older versions kept an array)
+async function getDownloadedNames() {
+    let result = await getStorage(["downloadedFiles"]);
+    let downloadedFiles = result.downloadedFiles || {};
+    if (Array.isArray(downloadedFiles)) {
+        downloadedFiles = Object.fromEntries(downloadedFiles.map((name) => [name, true]));
+    }
+    return downloadedFiles;
+}
+
+async function isIgnored(filename) {
+    let result = await getStorage(["ignoredExtensions"]);
+    let extension = filename.includes(".") ? filename.split(".").pop().toLowerCase() : "";
+    return (result.ignoredExtensions || []).some((ignored) => ignored.replace(/^\./, "") === extension);
+}
+
+function showAlert(message) {
+    chrome.notifications.create({
+        type: "basic",
+        iconUrl: "icon.png",
+        title: "Duplicate File Alert",
+        message: message
+    });
+}
+
+async function checkDownload(downloadItem, filename) {
+    if (allowedOnce.delete(downloadItem.url) || await isIgnored(filename)) {
+        return {};
+    }
+
+    // Ask the service first: same URL, same ETag and length, or same name and length
+    let headers = headersFor(downloadItem);
+    let result = await queryService("/downloads/check", {
+        url: downloadItem.url,
+        final_url: downloadItem.finalUrl,
+        etag: headers.etag,
+        content_length: downloadItem.totalBytes > 0 ? downloadItem.totalBytes : headers["content-length"],
+        name: filename
+    });
+    if (result !== null) {
+        let existing = result.matches.find((match) => match.exists);
+        return result.duplicate ? { cancel: true, existing: existing } : {};
+    }
+
+    // Service not running: compare the file name with the names seen so far
+    let downloadedFiles = await getDownloadedNames();
+    return downloadedFiles[filename] ? { overwrite: true } : {};
+}
+
 chrome.downloads.onDeterminingFilename.addListener((downloadItem, suggest) => {
-    let filename = downloadItem.filename.split('\\').pop(); // Get only the file name
+    let filename = downloadItem.filename.split(/[\\/]/).pop(); // Get only the file name
 
-    // Check if the file exists
-    chrome.storage.local.get(["downloadedFiles"], (result) => {
-        let downloadedFiles = result.downloadedFiles || [];
-        
-        if (downloadedFiles.includes(filename)) {
-            // Show alert for duplicate file
-            chrome.notifications.create({
+    checkDownload(downloadItem, filename).then((decision) => {
+        if (decision.cancel) {
+            // Already on disk, stop before the file is written
+            suggest();
+            chrome.downloads.cancel(downloadItem.id);
+            chrome.notifications.create("download-again:" + downloadItem.url, {
                 type: "basic",
                 iconUrl: "icon.png",
-                title: "Duplicate File Alert",
-                message: `The file "${filename}" is already downloaded!`
+                title: "Duplicate Download Cancelled",
+                message: `"${filename}" is already downloaded:\n${decision.existing.path}`,
+                buttons: [{ title: "Download anyway" }]
             });
-
-            
+        } else if (decision.overwrite) {
+            // Show alert for duplicate file
+            showAlert(`The file "${filename}" is already downloaded!`);
             suggest({ filename, conflictAction: "overwrite" });
         } else {
-            // Add new file to storage
-            downloadedFiles.push(filename);
-            chrome.storage.local.set({ downloadedFiles });
+            suggest();
         }
     });
+    return true; // suggest is called asynchronously
 });
 
+chrome.notifications.onButtonClicked.addListener((notificationId) => {
+    if (notificationId.startsWith("download-again:")) {
+        let url = notificationId.slice("download-again:".length);
+        allowedOnce.add(url);
+        chrome.downloads.download({ url: url });
+        chrome.notifications.clear(notificationId);
+    }
+});
+
+// Record completed downloads, with the service and in the file names kept as a fallback
+chrome.downloads.onChanged.addListener((delta) => {
+    if (!delta.state || delta.state.current !== "complete") {
+        return;
+    }
+    chrome.downloads.search({ id: delta.id }, async (items) => {
+        let downloadItem = items[0];
+        if (!downloadItem) {
+            return;
+        }
+        let headers = headersFor(downloadItem);
+        queryService("/downloads/record", {
+            path: downloadItem.filename,
+            url: downloadItem.url,
+            final_url: downloadItem.finalUrl,
+            etag: headers.etag,
+            content_length: downloadItem.fileSize > 0 ? downloadItem.fileSize : downloadItem.totalBytes
+        });
+
+        let downloadedFiles = await getDownloadedNames();
+        downloadedFiles[downloadItem.filename.split(/[\\/]/).pop()] = true;
+        chrome.storage.local.set({ downloadedFiles });
+    });
+});
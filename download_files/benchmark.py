@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from synthetic_tree import MANIFEST_FILE, add_tree_arguments, generate_tree, tree_options
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Detector name -> (script or harness function, command line, answer to every prompt,
+# folder given as DDAS_DOWNLOAD_DIR). Paths use {root}, {downloads} and {archive}.
+DETECTORS = {
+    'ddas': ('_run_ddas', [], "", "{downloads}"),
+    'downloadfolder': ('downloadfolder.py', ["{downloads}", "{archive}"], "", "{downloads}"),
+    'duplicate detect': ('duplicate detect.py', [], "no", "{downloads}"),
+    'c drive': ('c drive.py', ["{root}", "--quiet"], "0", "{downloads}"),
+    'similar content': ('similar content.py', ["{root}"], "n", "{root}"),
+    'filedetected': ('_run_filedetected', [], "", "{downloads}"),
+    'newdetect': ('_run_newdetect', [], "", "{downloads}"),
+}
+
+def _tree_paths(tree):
+    return {'root': tree, 'downloads': os.path.join(tree, "downloads"), 'archive': os.path.join(tree, "archive")}
+
+def _run_ddas(tree):
+    """Check every download with ddas.check.check_for_duplicates, as the extension does one file at a time."""
+    from ddas.check import check_for_duplicates, download_directory
+    for file_name in sorted(os.listdir(download_directory)):
+        check_for_duplicates(file_name)
+
+def _run_filedetected(tree):
+    """One pass of the filedetected monitor loop over every download, without prompting."""
+    import filedetected
+    # Start from an empty database rather than the file_hashes.txt next to the scripts
+    filedetected.HASH_STORE_FILE = os.path.join(os.getcwd(), "file_hashes.txt")
+    store, file_hashes = filedetected.load_existing_hashes()
+    hash_filter = filedetected.HashFilter(store)
+    for file_name in sorted(os.listdir(filedetected.DOWNLOAD_DIR)):
+        file_hash = filedetected.calculate_hash(os.path.join(filedetected.DOWNLOAD_DIR, file_name))
+        if file_hash in file_hashes or filedetected.find_similar_filenames(file_name, file_hashes.values()):
+            continue
+        file_hashes[file_hash] = file_name
+        store.add(file_hash, file_name, size=os.path.getsize(os.path.join(filedetected.DOWNLOAD_DIR, file_name)))
+        hash_filter.add(file_hash)
+
+def _run_newdetect(tree):
+    """Index the archive as a monitored root, then check every download as the event pipeline would."""
+    import newdetect
+    from tail_hash import hash_with_prefix
+    newdetect.HASH_STORE_FILE = os.path.join(os.getcwd(), "file_hashes.txt")
+    paths = _tree_paths(tree)
+    handler = newdetect.DownloadHandler({"archive": paths['archive']})
+    for file_name in sorted(os.listdir(paths['downloads'])):
+        file_path = os.path.join(paths['downloads'], file_name)
+        file_hash, prefix = hash_with_prefix(file_path, "md5")
+        handler.process_file(file_path, file_hash, True, prefix)
+
+def _measure():
+    """I/O counters and peak memory of the current process, whatever this platform reports."""
+    stats = {'bytes_read': None, 'bytes_read_from_disk': None, 'read_syscalls': None,
+             'write_syscalls': None, 'peak_rss': None}
+    try:
+        with open("/proc/self/io") as f:
+            io = dict(line.split(": ", 1) for line in f.read().splitlines())
+        stats.update(bytes_read=int(io['rchar']), bytes_read_from_disk=int(io['read_bytes']),
+                     read_syscalls=int(io['syscr']), write_syscalls=int(io['syscw']))
+    except (OSError, KeyError, ValueError):
+        if psutil is not None:
+            io = psutil.Process().io_counters()
+            stats.update(bytes_read=io.read_bytes, read_syscalls=io.read_count, write_syscalls=io.write_count)
+    if resource is not None:
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # Linux reports KiB, macOS bytes
+        stats['peak_rss'] = peak if sys.platform == 'darwin' else peak * 1024
+    elif psutil is not None:
+        stats['peak_rss'] = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+    return stats
+
+def run_child(result_path, detector, tree):
+    """Run one detector in this process and write its counters to result_path."""
+    target, argv, _, _ = DETECTORS[detector]
+    paths = _tree_paths(tree)
+    sys.path.insert(0, SCRIPT_DIR)
+    error = None
+    try:
+        if target.endswith(".py"):
+            sys.argv = [target] + [arg.format(**paths) for arg in argv]
+            runpy.run_path(os.path.join(SCRIPT_DIR, target), run_name="__main__")
+        else:
+            globals()[target](tree)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"exit status {e.code}"
+    except ImportError as e:
+        error = f"skipped: {e}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    result = _measure()
+    result['error'] = error
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+def run_detector(detector, tree, files, use_cache=False, log_dir=None):
+    """
+    Run a detector on a tree in a fresh process with its own databases.
+
+    Returns:
+        Dict with wall time, files/s and the counters from _measure.
+    """
+    _, _, answer, download_dir = DETECTORS[detector]
+    state_dir = tempfile.mkdtemp(prefix="ddas-bench-")
+    try:
+        env = dict(os.environ)
+        env.update({
+            'DDAS_DOWNLOAD_DIR': download_dir.format(**_tree_paths(tree)),
+            'DDAS_HASH_DB': os.path.join(state_dir, "file_hashes.db"),
+            'DDAS_HASH_CACHE': os.path.join(state_dir, "hash_cache.db") if use_cache else "",
+            'DDAS_CHUNK_INDEX': os.path.join(state_dir, "chunk_index.db"),
+            'DDAS_ARCHIVE_INDEX': os.path.join(state_dir, "archive_index.db"),
+            'DDAS_DOWNLOAD_INDEX': os.path.join(state_dir, "download_index.db"),
+        })
+        result_path = os.path.join(state_dir, "result.json")
+        log_path = os.path.join(log_dir or state_dir, f"{detector.replace(' ', '_')}.log")
+        with open(log_path, "w") as log:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--child", result_path, detector, tree],
+                           input=(answer + "\n") * (files + 10), text=True, env=env, cwd=state_dir,
+                           stdout=log, stderr=subprocess.STDOUT)
+            wall = time.perf_counter() - start
+        if os.path.exists(result_path):
+            with open(result_path) as f:
+                result = json.load(f)
+        else:
+            result = {'error': f"crashed, see {log_path}"}
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    result['detector'] = detector
+    result['wall_seconds'] = round(wall, 4)
+    result['files_per_second'] = round(files / wall, 1) if wall else None
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(tree, detectors=None, repeat=1, use_cache=False, log_dir=None):
+    """Run detectors on a generated tree, keeping the fastest of repeat runs of each."""
+    with open(os.path.join(tree, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    results = []
+    for detector in detectors or DETECTORS:
+        runs = [run_detector(detector, tree, manifest['files'], use_cache, log_dir) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['wall_seconds'])
+        results.append(best)
+        status = f" ({best['error']})" if best.get('error') else ""
+        print(f"{detector:<17} {best['wall_seconds']:8.2f} s {best['files_per_second'] or 0:9.0f} files/s{status}")
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cache': use_cache,
+        'repeat': repeat,
+        'tree': manifest,
+        'results': results,
+    }
+
+def compare(report, baseline):
+    """Print the change in wall time and bytes read against an earlier report."""
+    before = {result['detector']: result for result in baseline['results']}
+    print(f"Compared with {baseline.get('commit') or 'baseline'}:")
+    for result in report['results']:
+        old = before.get(result['detector'])
+        if old is None or not old.get('wall_seconds'):
+            continue
+        line = f"  {result['detector']:<17} time {result['wall_seconds'] / old['wall_seconds'] - 1:+7.1%}"
+        if result.get('bytes_read') and old.get('bytes_read'):
+            line += f"  bytes read {result['bytes_read'] / old['bytes_read'] - 1:+7.1%}"
+        if result.get('peak_rss') and old.get('peak_rss'):
+            line += f"  peak RSS {result['peak_rss'] / old['peak_rss'] - 1:+7.1%}"
+        print(line)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        run_child(*sys.argv[2:])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark the duplicate detectors on a synthetic tree.")
+    parser.add_argument("--tree", help="existing tree from synthetic_tree.py (default: generate one)")
+    parser.add_argument("--detector", action="append", choices=list(DETECTORS),
+                        help="detector to run, repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per detector, the fastest is kept")
+    parser.add_argument("--cache", action="store_true", help="let detectors use a (fresh) hash cache")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON report (default: %(default)s)")
+    parser.add_argument("--compare", help="earlier JSON report to compare with")
+    parser.add_argument("--logs", help="folder to keep detector output in")
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+
+    tree = args.tree
+    if tree is None:
+        tree = tempfile.mkdtemp(prefix="ddas-tree-")
+        manifest = generate_tree(tree, **tree_options(args))
+        print(f"Generated {manifest['files']} files ({manifest['bytes'] / 1e6:.1f} MB) in {tree}")
+    if args.logs:
+        os.makedirs(args.logs, exist_ok=True)
+    try:
+        report = run_benchmarks(os.path.abspath(tree), args.detector, args.repeat, args.cache, args.logs)
+    finally:
+        if args.tree is None:
+            shutil.rmtree(tree, ignore_errors=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,352 @@
+import os
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+from staged_scan import walk_files, format_bytes
+from parallel_hash import DEFAULT_WORKERS, hash_files
+
+# Chunk index shared by the scanners (in the same directory as the scripts),
+# set DDAS_CHUNK_INDEX to use another path
+INDEX_FILE = os.environ.get(
+    "DDAS_CHUNK_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "chunk_index.db"),
+)
+
+# FastCDC chunk sizes: no cut before MIN_CHUNK, a forced cut at MAX_CHUNK,
+# and cut points tuned so chunks average about AVG_CHUNK bytes
+MIN_CHUNK = 2 * 1024
+AVG_CHUNK = 8 * 1024
+MAX_CHUNK = 64 * 1024
+
+# Read size used while chunking a file
+READ_SIZE = 1024 * 1024
+
+# Minimum share of a file found in another one for them to be reported
+DEFAULT_MIN_CONTAINMENT = 0.5
+
+# Chunks occurring more often than this in the index (runs of zeros, common
+# headers) say little about two files and are left out of comparisons,
+# which keeps each comparison linear in the size of the file
+MAX_CHUNK_OCCURRENCES = 64
+
+# Gear table of the rolling hash, fixed so chunk boundaries are stable between runs
+_gear_random = random.Random(0x5DD45)
+GEAR = [_gear_random.getrandbits(32) for _ in range(256)]
+
+def _mask(bits):
+    """Mask over the top bits of the 32-bit gear hash, which depend on the last 32 bytes."""
+    return ((1 << bits) - 1) << (32 - bits)
+
+# Normalized chunking: a stricter mask before AVG_CHUNK and a looser one after
+# it pulls chunk sizes towards the average
+_AVG_BITS = AVG_CHUNK.bit_length() - 1
+MASK_SMALL = _mask(_AVG_BITS + 2)
+MASK_LARGE = _mask(_AVG_BITS - 2)
+
+def cut_point(data, start, end):
+    """Length of the chunk starting at data[start], not extending past end."""
+    remaining = end - start
+    if remaining <= MIN_CHUNK:
+        return remaining
+    normal = start + min(remaining, AVG_CHUNK)
+    limit = start + min(remaining, MAX_CHUNK)
+
+    gear = GEAR
+    h = 0
+    i = start + MIN_CHUNK
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+        if not h & MASK_SMALL:
+            return i - start + 1
+        i += 1
+    while i < limit:
+        h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+        if not h & MASK_LARGE:
+            return i - start + 1
+        i += 1
+    return limit - start
+
+def chunk_file(file_path):
+    """
+    Split a file into content-defined chunks.
+
+    Boundaries depend only on the bytes around them, so an insertion or a
+    removal early in a file only changes the chunks near the edit and the
+    rest still match the original file.
+
+    The rolling hash runs in pure Python at about 5 MB/s and holds the
+    GIL, chunk many files in worker processes (see index_files).
+
+    Returns:
+        List of (length, SHA-256 hex digest) pairs, one per chunk in file order.
+    """
+    chunks = []
+    buffer = b""
+    with open(file_path, "rb") as f:
+        eof = False
+        while True:
+            # Keep a full MAX_CHUNK ahead so cut points never depend on read sizes
+            if not eof and len(buffer) < MAX_CHUNK:
+                block = f.read(READ_SIZE)
+                eof = not block
+                buffer += block
+                continue
+            if not buffer:
+                break
+            start = 0
+            while len(buffer) - start >= MAX_CHUNK or (eof and start < len(buffer)):
+                length = cut_point(buffer, start, len(buffer))
+                chunks.append((length, hashlib.sha256(buffer[start:start + length]).hexdigest()))
+                start += length
+            buffer = buffer[start:]
+    return chunks
+
+class ChunkIndex:
+    """SQLite (WAL mode) index of the chunk digests of every scanned file.
+
+    Files are rechunked only when their size, modification time or inode
+    changed, and the digest index finds every file sharing chunks with a
+    given one without comparing files pairwise. Chunks stored more than
+    max_occurrences times are ignored by shared_bytes() and
+    compared_bytes(), so a chunk common to thousands of files costs one
+    bounded count instead of a join of every pair of them.
+    """
+
+    def __init__(self, db_path=INDEX_FILE, max_occurrences=MAX_CHUNK_OCCURRENCES):
+        self.db_path = db_path
+        self.max_occurrences = max_occurrences
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " path TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " PRIMARY KEY (path, seq))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_digest ON chunks (digest)")
+        self._conn.commit()
+
+    def is_current(self, file_path, st):
+        """Check if a file is indexed and unchanged since it was chunked."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode FROM files WHERE path = ?", (file_path,)
+            ).fetchone()
+        return row is not None and row == (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def add_file(self, file_path, st, chunks):
+        """Replace the chunks stored for a file."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE path = ?", (file_path,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (file_path, st.st_size, st.st_mtime_ns, st.st_ino),
+            )
+            self._conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                ((file_path, seq, digest, length) for seq, (length, digest) in enumerate(chunks)),
+            )
+            self._conn.commit()
+
+    def remove_file(self, file_path):
+        """Forget a file, returns True if it was indexed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE path = ?", (file_path,))
+            cursor = self._conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def prune_missing(self):
+        """Forget indexed files that no longer exist, returns how many were removed."""
+        missing = [file_path for file_path in self.paths() if not os.path.exists(file_path)]
+        for file_path in missing:
+            self.remove_file(file_path)
+        return len(missing)
+
+    def paths(self):
+        """Return every indexed path."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM files ORDER BY path")]
+
+    def file_size(self, file_path):
+        """Return the indexed size of a file, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM files WHERE path = ?", (file_path,)).fetchone()
+        return row[0] if row else None
+
+    def shared_bytes(self, file_path):
+        """
+        Find the files sharing chunks with a file.
+
+        Returns:
+            Dict mapping every other path to the number of bytes of file_path
+            whose chunks also occur in it, common chunks left out.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, SUM(length) FROM"
+                " (SELECT DISTINCT mine.seq, mine.length, other.path FROM chunks AS mine"
+                "  JOIN chunks AS other ON other.digest = mine.digest"
+                f"  WHERE mine.path = ? AND other.path != mine.path AND {_UNCOMMON})"
+                " GROUP BY path",
+                (file_path, self.max_occurrences + 1, self.max_occurrences),
+            ).fetchall()
+        return dict(rows)
+
+    def compared_bytes(self, file_path):
+        """Return the bytes of a file shared_bytes() can find elsewhere, those of its uncommon chunks."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(SUM(length), 0) FROM chunks AS mine WHERE path = ? AND {_UNCOMMON}",
+                (file_path, self.max_occurrences + 1, self.max_occurrences),
+            ).fetchone()
+        return row[0]
+
+    def dedup_estimate(self):
+        """Return (total bytes, bytes left once identical chunks are stored once)."""
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+            unique = self._conn.execute(
+                "SELECT COALESCE(SUM(length), 0) FROM"
+                " (SELECT MAX(length) AS length FROM chunks GROUP BY digest)"
+            ).fetchone()[0]
+        return total, unique
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Condition on a chunk "mine" occurring at most max_occurrences times, counting no further
+_UNCOMMON = "(SELECT COUNT(*) FROM (SELECT 1 FROM chunks WHERE digest = mine.digest LIMIT ?)) <= ?"
+
+def index_files(files, index, workers=DEFAULT_WORKERS, use_processes=True):
+    """
+    Chunk new or changed files into the index.
+
+    Args:
+        files: Iterable of (path, size) pairs, as yielded by walk_files.
+        index: ChunkIndex to update.
+        workers: Number of chunking workers.
+        use_processes: Chunk in worker processes, the default. Chunking is
+            pure Python and holds the GIL, so threads add nothing.
+
+    Returns:
+        Number of files that had to be chunked.
+    """
+    def jobs():
+        for file_path, _ in files:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            if not index.is_current(file_path, st):
+                yield file_path, st
+
+    chunked = 0
+    for (file_path, st), chunks, _ in hash_files(jobs(), _chunk_job, workers, use_processes):
+        if chunks is None:
+            print(f"Could not read file: {file_path}")
+            continue
+        index.add_file(file_path, st, chunks)
+        chunked += 1
+    return chunked
+
+def _chunk_job(file_path, st):
+    """Worker entry point, the stat result only travels with the job."""
+    return chunk_file(file_path)
+
+def find_similar_files(index, paths=None, min_containment=DEFAULT_MIN_CONTAINMENT):
+    """
+    Find pairs of files sharing a large part of their content.
+
+    Containment of a in b is the share of a's bytes whose chunks also occur
+    in b, so a file that was appended to is fully contained in the longer
+    version while that one is only partly contained in it. Chunks too
+    common to compare count on neither side.
+
+    Args:
+        index: ChunkIndex holding the files.
+        paths: Paths to compare, every indexed path by default.
+        min_containment: Report pairs where either containment reaches this (0-1).
+
+    Returns:
+        List of (path_a, path_b, containment of a in b, containment of b in a),
+        most overlapping first. Byte-identical files are included with 1.0.
+    """
+    if paths is None:
+        paths = index.paths()
+    wanted = set(paths)
+    sizes = {file_path: index.compared_bytes(file_path) for file_path in wanted}
+
+    shared = {}
+    for file_path in wanted:
+        for other_path, shared_size in index.shared_bytes(file_path).items():
+            if other_path in wanted:
+                shared[(file_path, other_path)] = shared_size
+
+    pairs = []
+    for (path_a, path_b), shared_a in shared.items():
+        if path_a > path_b:
+            continue
+        contained_a = shared_a / sizes[path_a] if sizes[path_a] else 0.0
+        contained_b = shared.get((path_b, path_a), 0) / sizes[path_b] if sizes[path_b] else 0.0
+        if max(contained_a, contained_b) >= min_containment:
+            pairs.append((path_a, path_b, contained_a, contained_b))
+
+    pairs.sort(key=lambda pair: (-max(pair[2], pair[3]), pair[0], pair[1]))
+    return pairs
+
+def report_near_duplicates(directory, min_containment=DEFAULT_MIN_CONTAINMENT, index_path=INDEX_FILE,
+                           workers=DEFAULT_WORKERS, use_processes=True):
+    """Chunk a directory tree and print overlapping files and the block-level dedup estimate."""
+    index = ChunkIndex(index_path)
+    try:
+        index.prune_missing()
+        files = list(walk_files(directory))
+        chunked = index_files(files, index, workers, use_processes)
+        print(f"Indexed {len(files)} files ({chunked} chunked, {len(files) - chunked} unchanged)")
+
+        paths = [file_path for file_path, _ in files]
+
+        pairs = find_similar_files(index, paths, min_containment)
+        if not pairs:
+            print("No near-duplicate files found.")
+        for path_a, path_b, contained_a, contained_b in pairs:
+            print(f"\n{contained_a:.0%} of {path_a}")
+            print(f"  is contained in {path_b} ({contained_b:.0%} the other way)")
+
+        # Covers every indexed file, including other trees scanned into the same index
+        total, unique = index.dedup_estimate()
+        if total:
+            saved = total - unique
+            print(f"\nBlock-level dedup of indexed files: {format_bytes(total)} -> {format_bytes(unique)}, "
+                  f"saves {format_bytes(saved)} ({saved / total:.1%})")
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find files sharing content with content-defined chunking.")
+    parser.add_argument("directory", help="directory tree to scan")
+    parser.add_argument("--min-overlap", type=float, default=DEFAULT_MIN_CONTAINMENT * 100,
+                        help="minimum percentage of a file found in another one (default: %(default).0f)")
+    parser.add_argument("--index", default=INDEX_FILE, help="chunk index database (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"number of chunking processes, each chunks about 5 MB/s (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--threads", action="store_true",
+                        help="chunk in threads instead of processes, only one runs at a time")
+    args = parser.parse_args()
+
+    report_near_duplicates(args.directory, args.min_overlap / 100, args.index, args.workers, not args.threads)
@@ -0,0 +1,13 @@
+"""Download duplicate detection, one command per tool:
+
+    python -m ddas check FILE...            check files against the metadata store
+    python -m ddas scan [PATH]              find duplicate files under a folder or drive
+    python -m ddas watch [ROOT...]          watch folders for duplicate downloads
+    python -m ddas diff-archive [DIR ...]   list downloads that are not in the archives
+    python -m ddas similar [DIR]            find duplicates and similar names in a folder
+    python -m ddas serve [STORE...]         answer lookups from memory on localhost
+
+Run from the download_files directory, which holds the modules the
+commands are built on. Importing the package loads nothing else; each
+command imports what it needs when it runs.
+"""
@@ -0,0 +1,6 @@
+import sys
+from ddas.cli import main
+
+# Worker processes started with spawn import this module again, only the parent runs the CLI
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import datetime
+from file_hashing import hash_file
+from hash_cache import cached_hash
+from hash_store import open_hash_store
+from hash_filter import HashFilter
+
+# Set DDAS_DOWNLOAD_DIR to check another folder
+download_directory = os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files")
+
+_metadata_store = None
+_hash_filter = None
+
+def get_metadata_store(metadata_file="file_metadata.json"):
+    """Open the indexed metadata store, file_metadata.json is imported into it the first time."""
+    global _metadata_store
+    if _metadata_store is None:
+        _metadata_store = open_hash_store("file_metadata.db", legacy_json=metadata_file)
+    return _metadata_store
+
+def get_hash_filter():
+    """Open the Bloom filter in front of the metadata store, built on first use."""
+    global _hash_filter
+    if _hash_filter is None:
+        _hash_filter = HashFilter(get_metadata_store())
+    return _hash_filter
+
+@cached_hash("sha256")
+def get_file_hash(file_path):
+    return hash_file(file_path, "sha256")
+
+def check_for_duplicates(file_name):
+    """Check a file of the download directory (or any path) against the metadata store, recording it if new."""
+    metadata = get_metadata_store()
+    
+    file_path = os.path.join(download_directory, file_name)
+    
+    if not os.path.exists(file_path):
+        print(f"File '{file_name}' does not exist in the directory.")
+        return
+    
+    file_hash = get_file_hash(file_path)
+    
+    # Most files are new, the filter rules them out without querying the store
+    existing_info = metadata.get(file_hash) if file_hash in get_hash_filter() else None
+    if existing_info is not None:
+        if existing_info['location'] == file_path:
+            print(f"Duplicate file found!\nFile Name: {file_name}\nIt is already in the Location: {existing_info['location']}\nDownloaded at: {existing_info['timestamp']}")
+        else:
+            print(f"File with the same content already exists in this location:\n{existing_info['location']}")
+    else:
+        current_time = str(datetime.datetime.now())
+        metadata.add(file_hash, file_name, location=file_path, timestamp=current_time,
+                     size=os.path.getsize(file_path))
+        get_hash_filter().add(file_hash)
+        print(f"File '{file_name}' added to metadata at {current_time}.")
+
+def add_arguments(parser):
+    parser.add_argument("files", nargs="+",
+                        help=f"file names in the download directory, or paths (download directory: {download_directory})")
+
+def run(args):
+    for file_name in args.files:
+        check_for_duplicates(file_name)
+    
\ No newline at end of file
@@ -0,0 +1,40 @@
+import sys
+import argparse
+import importlib
+
+# Subcommand -> (module implementing it, one-line help). A module is only
+# imported when its command is run, so `ddas --help` and `ddas check`
+# never load watchdog, difflib or the scanning engine.
+COMMANDS = {
+    'check': ('ddas.check', "check downloaded files against the metadata store"),
+    'scan': ('ddas.scan', "find duplicate files under a folder or drive"),
+    'watch': ('ddas.watch', "watch folders for duplicate downloads"),
+    'diff-archive': ('ddas.diff_archive', "list downloaded files that are not in the archives"),
+    'similar': ('ddas.similar', "find duplicate files and similar names in a folder"),
+    'serve': ('ddas.serve', "answer have-I-downloaded-this lookups from memory over HTTP or a UNIX socket"),
+}
+
+def build_parser(command=None):
+    """
+    Build the ddas argument parser.
+
+    Every command is listed, but only the arguments of command are added,
+    so building the parser imports a single command module at most.
+    """
+    parser = argparse.ArgumentParser(prog="ddas", description="Detect duplicate downloads.")
+    subparsers = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, (module_name, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text, description=help_text)
+        if name == command:
+            module = importlib.import_module(module_name)
+            module.add_arguments(subparser)
+            subparser.set_defaults(run=module.run)
+    return parser
+
+def main(argv=None):
+    """Run a ddas command, returns its exit status."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Commands take no options before their name
+    command = next((arg for arg in argv if not arg.startswith("-")), None)
+    args = build_parser(command).parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,36 @@
+import os
+from parallel_hash import add_worker_arguments
+from archive_index import IN_ARCHIVE, RENAMED, UNIQUE
+from downloadfolder import classify_downloads
+
+def add_arguments(parser):
+    # Define directories for download and archive
+    parser.add_argument("download_dir", nargs="?",
+                        default=os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files"))
+    parser.add_argument("archive_dirs", nargs="*",
+                        default=[os.environ.get("DDAS_ARCHIVE_DIR", r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\archive_files")])
+    add_worker_arguments(parser)
+
+def run(args):
+    """List downloaded files that are not in the archives."""
+    # Compare the downloads with the archives
+    results = classify_downloads(args.download_dir, args.archive_dirs, args.workers, args.processes)
+    unique_files = sorted(file_path for file_path, (status, _) in results.items() if status == UNIQUE)
+    renamed_files = sorted((file_path, archived) for file_path, (status, archived) in results.items()
+                           if status == RENAMED)
+    archived_files = sorted((file_path, archived) for file_path, (status, archived) in results.items()
+                            if status == IN_ARCHIVE)
+
+    # Display results
+    if unique_files:
+        print("Files in the download folder that are not in the archive:")
+        for file_path in unique_files:
+            print(f"- {file_path}")
+    else:
+        print("All files in the download folder are already in the archive.")
+    if renamed_files:
+        print("\nFiles in the archive under another name:")
+        for file_path, archived in renamed_files:
+            print(f"- {file_path} (archived as {archived})")
+    print(f"\n{len(unique_files)} unique, {len(archived_files)} in the archive, "
+          f"{len(renamed_files)} in the archive under another name")
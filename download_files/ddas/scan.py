@@ -0,0 +1,94 @@
+import os
+import sys
+from parallel_hash import DEFAULT_WORKERS, add_worker_arguments
+from file_hashing import FAST_ALGORITHM, available_algorithms
+from staged_scan import iter_duplicate_groups, new_scan_stats, print_progress, print_scan_stats, walk_files
+from dedup_actions import add_action_arguments, deduplicate, print_summary
+from verify_duplicates import new_verify_stats, print_verify_stats, verify_groups
+
+def iter_duplicates(drive_path, workers=DEFAULT_WORKERS, use_processes=False, algorithm=FAST_ALGORITHM,
+                    stats=None, progress=None):
+    """
+    Yield (hash, files) for each group of duplicates across the drive as soon as it is confirmed.
+
+    Nothing is printed: stats (from new_scan_stats) is filled in as the
+    scan goes and progress is called as iter_duplicate_groups describes.
+    """
+    # Only files sharing a size are sampled, and only matching samples are fully hashed
+    yield from iter_duplicate_groups(walk_files(drive_path), stats=stats, workers=workers,
+                                     use_processes=use_processes, algorithm=algorithm, progress=progress)
+
+def find_duplicates(drive_path, workers=DEFAULT_WORKERS, use_processes=False, algorithm=FAST_ALGORITHM):
+    """Find and group duplicate files by hash across the specified drive."""
+    return dict(iter_duplicates(drive_path, workers, use_processes, algorithm))
+
+def prompt_delete_duplicates(duplicates):
+    """Prompt the user to delete duplicate files."""
+    for file_hash, files in duplicates.items():
+        print(f"\nIdentical files with content hash '{file_hash}':")
+        for i, file_path in enumerate(files):
+            print(f"  {i + 1}. {file_path}")
+        
+        while True:
+            # Ask user which file to keep
+            keep_index = input(f"\nWhich file would you like to keep (1-{len(files)})? Enter '0' to skip: ")
+            if keep_index.isdigit() and 0 <= int(keep_index) <= len(files):
+                keep_index = int(keep_index) - 1
+                break
+            else:
+                print("Invalid input. Please enter a valid number.")
+
+        # Delete all duplicates except the one to keep
+        if keep_index != -1:
+            for i, file_path in enumerate(files):
+                if i != keep_index:
+                    try:
+                        os.remove(file_path)
+                        print(f"Deleted: {file_path}")
+                    except PermissionError:
+                        print(f"Permission denied: Could not delete {file_path}")
+                    except FileNotFoundError:
+                        print(f"File not found: {file_path}")
+
+def add_arguments(parser):
+    # Define the drive to search for duplicate files
+    parser.add_argument("drive_path", nargs="?",
+                        default=os.environ.get("DDAS_SCAN_DIR", r"C:\Users\Manoj\OneDrive\Documents"))
+    add_worker_arguments(parser)
+    parser.add_argument("--algorithm", choices=available_algorithms(), default=FAST_ALGORITHM,
+                        help="digest used to find duplicates, verified with SHA-256 (default: %(default)s)")
+    parser.add_argument("--quiet", action="store_true", help="don't show scan progress")
+    add_action_arguments(parser)
+
+def run(args):
+    """Find and delete duplicate files on a drive."""
+    # Find duplicates, listing each group as soon as it is confirmed
+    duplicates = {}
+    stats = new_scan_stats()
+    for file_hash, files in iter_duplicates(args.drive_path, args.workers, args.processes, args.algorithm,
+                                            stats=stats, progress=None if args.quiet else print_progress):
+        if not args.quiet:
+            print(f"\r{'':<79}\r", end="", file=sys.stderr)
+        print(f"Duplicates ({len(files)} files): {', '.join(files)}")
+        duplicates[file_hash] = files
+    if not args.quiet:
+        print(file=sys.stderr)
+    print_scan_stats(stats)
+
+    # Delete duplicates, by rule for unattended runs or by asking for each group
+    if duplicates and args.keep:
+        summary = deduplicate(duplicates.values(), args.keep, args.action, args.root_priority,
+                              args.workers, args.dry_run, verify=args.verify)
+        print_summary(summary, args.action, args.dry_run)
+    elif duplicates:
+        if args.verify:
+            # Only offer files whose bytes match, a group split by the comparison gets one entry per part
+            stats = new_verify_stats()
+            groups = list(verify_groups(duplicates.values(), args.workers, stats=stats))
+            print_verify_stats(stats)
+            duplicates = {(file_hash if i == 0 else f"{file_hash} (part {i + 1})"): subgroup
+                          for file_hash, (_, confirmed) in zip(duplicates, groups)
+                          for i, subgroup in enumerate(confirmed)}
+        prompt_delete_duplicates(duplicates)
+    else:
+        print("No duplicate files found.")
\ No newline at end of file
@@ -0,0 +1,52 @@
+import threading
+from download_index import INDEX_FILE, DownloadIndex
+from lookup_service import (DEFAULT_PORT, DEFAULT_STORES, TOKEN_FILE, LookupHTTPServer, LookupIndex, load_token,
+                            open_stores, start_refreshing)
+
+def add_arguments(parser):
+    parser.add_argument("stores", nargs="*", default=DEFAULT_STORES,
+                        help="hash stores to serve (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="HTTP port on 127.0.0.1, 0 to disable (default: %(default)s)")
+    parser.add_argument("--socket", help="also answer on this UNIX socket")
+    parser.add_argument("--download-index", default=INDEX_FILE,
+                        help="index of completed downloads checked by the browser extension (default: %(default)s)")
+    parser.add_argument("--token-file", default=TOKEN_FILE,
+                        help="secret HTTP clients must send, created if missing (default: %(default)s)")
+    parser.add_argument("--extension-id", action="append", default=[],
+                        help="browser extension allowed to call the service, repeatable (default: any)")
+
+def run(args):
+    """Serve lookups until interrupted."""
+    stores = open_stores(args.stores)
+    if not stores:
+        print("No hash store to serve, only downloads will be checked.")
+    index = LookupIndex(stores)
+    print(f"Loaded {len(index)} entries from {len(stores)} stores")
+    stop_refreshing = start_refreshing(index)
+
+    servers = []
+    if args.port:
+        servers.append(LookupHTTPServer(index, args.port, downloads=DownloadIndex(args.download_index),
+                                        token=load_token(args.token_file), extension_ids=args.extension_id))
+        print(f"Lookups: http://127.0.0.1:{servers[-1].server_address[1]}/lookup")
+        print(f"Token for the extension settings: {args.token_file}")
+    if args.socket:
+        from lookup_service import LookupUnixServer
+        servers.append(LookupUnixServer(index, args.socket))
+        print(f"Lookups: {args.socket}")
+    if not servers:
+        print("Nothing to listen on, give --port or --socket.")
+        return 1
+
+    # Every server but the last runs on its own thread
+    for server in servers[:-1]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        servers[-1].serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping lookup service...")
+    finally:
+        stop_refreshing.set()
+        for server in servers:
+            server.server_close()
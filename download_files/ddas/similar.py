@@ -0,0 +1,110 @@
+import os
+from staged_scan import find_duplicate_groups
+
+def find_duplicates(directory, check_name_similarity=False, name_similarity_threshold=0.8):
+    """
+    Find duplicate files by content hash, optionally checking name similarity.
+    
+    Args:
+        directory: Directory to search.
+        check_name_similarity: If True, also checks for similar filenames within content duplicates.
+        name_similarity_threshold: Minimum similarity ratio (0-1) if checking names.
+    
+    Returns:
+        List of duplicate file groups.
+    """
+    # First pass: group files by size, head/tail sample, then full content hash
+    # Empty files are ignored
+    file_hashes = find_duplicate_groups(directory, skip_empty=True)
+    duplicate_groups = list(file_hashes.values())
+    
+    # If not checking name similarity, return all content duplicates
+    if not check_name_similarity:
+        return duplicate_groups
+    
+    # If checking name similarity, split each group into clusters of similar names
+    # (name_cluster is built on difflib, only loaded when names are compared)
+    from name_cluster import cluster_similar_names
+    filtered_groups = []
+    for group in duplicate_groups:
+        filtered_groups.extend(cluster_similar_names(group, name_similarity_threshold))
+    
+    return filtered_groups
+
+def handle_duplicates(duplicate_groups):
+    """Let the user choose which duplicates to delete."""
+    if not duplicate_groups:
+        print("No duplicates found.")
+        return
+    
+    print(f"\nFound {len(duplicate_groups)} duplicate groups:")
+    
+    for group_num, group in enumerate(duplicate_groups, 1):
+        print(f"\nGroup {group_num} (identical content):")
+        for i, file_path in enumerate(group, 1):
+            print(f"  {i}. {file_path}")
+        
+        while True:
+            choice = input("\nChoose action:\n"
+                          "[k]eep all\n"
+                          "[d]elete all\n"
+                          "[s]elect which to keep\n"
+                          "[n]ext group\n"
+                          "[q]uit\n"
+                          "Your choice: ").lower()
+            
+            if choice == 'k':
+                print("Keeping all files in this group.")
+                break
+            elif choice == 'd':
+                for file_path in group:
+                    try:
+                        os.remove(file_path)
+                        print(f"Deleted: {file_path}")
+                    except Exception as e:
+                        print(f"Error deleting {file_path}: {e}")
+                break
+            elif choice == 's':
+                try:
+                    keep_indices = [int(i)-1 for i in input("Enter file numbers to keep (e.g., '1 3'): ").split()]
+                    for i, file_path in enumerate(group):
+                        if i not in keep_indices:
+                            try:
+                                os.remove(file_path)
+                                print(f"Deleted: {file_path}")
+                            except Exception as e:
+                                print(f"Error deleting {file_path}: {e}")
+                    break
+                except ValueError:
+                    print("Invalid input. Please try again.")
+            elif choice == 'n':
+                break
+            elif choice == 'q':
+                return
+            else:
+                print("Invalid choice. Please try again.")
+
+def add_arguments(parser):
+    # Directory to scan, set DDAS_DOWNLOAD_DIR to scan another one
+    parser.add_argument("directory", nargs="?",
+                        default=os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files"))
+    parser.add_argument("--names", action="store_true",
+                        help="only group duplicates whose file names are similar too")
+    parser.add_argument("--threshold", type=float, default=0.7,
+                        help="name similarity (0-1) needed with --names (default: %(default)s)")
+    parser.add_argument("--near", action="store_true",
+                        help="also report files sharing most of their content (re-saved documents, etc.), "
+                             "chunking new files at about 5 MB/s per CPU")
+
+def run(args):
+    # Find duplicates
+    duplicates = find_duplicates(args.directory, check_name_similarity=args.names,
+                                 name_similarity_threshold=args.threshold)
+    
+    # Handle duplicates
+    handle_duplicates(duplicates)
+    
+    # Files sharing most of their content but not byte-identical (re-saved documents, etc.)
+    if args.near:
+        from chunk_index import report_near_duplicates
+        report_near_duplicates(args.directory)
\ No newline at end of file
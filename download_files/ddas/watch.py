@@ -0,0 +1,13 @@
+import os
+
+def add_arguments(parser):
+    # Parsing needs neither watchdog nor the monitor, they are imported by run()
+    from metrics import add_metrics_arguments
+    download_dir = os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\Downloads")
+    parser.add_argument("roots", nargs="*", help=f"Folders to watch, as id=path or path (default: {download_dir})")
+    add_metrics_arguments(parser)
+
+def run(args):
+    """Watch folders for duplicate downloads until interrupted."""
+    from newdetect import parse_roots, start_monitoring
+    start_monitoring(parse_roots(args.roots), args)
@@ -0,0 +1,245 @@
+import os
+import sys
+import errno
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from parallel_hash import DEFAULT_WORKERS, QUEUE_DEPTH, add_worker_arguments
+from staged_scan import format_bytes, iter_duplicate_groups, walk_files
+from verify_duplicates import new_verify_stats, print_verify_stats, verified_groups
+
+# Rules for picking the file of a group that stays as it is
+POLICIES = ('oldest', 'newest', 'shortest-path', 'root-priority')
+
+# What happens to the other files of a group, and how it is reported once done
+ACTIONS = ('delete', 'hardlink', 'reflink')
+_DONE = {'delete': "Deleted", 'hardlink': "Hard linked", 'reflink': "Reflinked"}
+
+# Suffix of the temporary link or clone written next to a file before it replaces it
+TEMP_SUFFIX = ".ddas-tmp"
+
+# Linux FICLONE ioctl, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+def _root_rank(file_path, root_priority):
+    """Index of the first root containing a path, roots not listed rank last."""
+    file_path = os.path.normcase(os.path.abspath(file_path))
+    for rank, root in enumerate(root_priority):
+        root = os.path.normcase(os.path.abspath(root)).rstrip(os.sep) + os.sep
+        if file_path.startswith(root):
+            return rank
+    return len(root_priority)
+
+def choose_keeper(files, policy="oldest", root_priority=()):
+    """
+    Pick the file of a duplicate group that is kept.
+
+    Args:
+        files: List of (path, os.stat_result) for the group.
+        policy: One of POLICIES. 'oldest' and 'newest' compare modification
+            times, 'root-priority' keeps the file under the earliest root in
+            root_priority and falls back to the oldest within that root.
+        root_priority: Directories in order of preference, for 'root-priority'.
+
+    Returns:
+        Index into files. Ties go to the file listed first.
+    """
+    if policy == 'oldest':
+        key = lambda i: files[i][1].st_mtime_ns
+    elif policy == 'newest':
+        key = lambda i: -files[i][1].st_mtime_ns
+    elif policy == 'shortest-path':
+        key = lambda i: len(files[i][0])
+    elif policy == 'root-priority':
+        key = lambda i: (_root_rank(files[i][0], root_priority), files[i][1].st_mtime_ns)
+    else:
+        raise ValueError(f"Unknown keep policy: {policy}")
+    return min(range(len(files)), key=key)
+
+def plan_actions(groups, policy="oldest", root_priority=()):
+    """
+    Decide which file of every duplicate group is kept.
+
+    Files that are already hard links of the kept file, or can no longer
+    be found, are left out.
+
+    Args:
+        groups: Iterable of lists of paths with identical content, such as
+            the values of group_duplicates or the groups of iter_duplicate_groups.
+        policy, root_priority: As for choose_keeper.
+
+    Yields:
+        (target, keeper, size) for every file to act on.
+    """
+    for group in groups:
+        files = []
+        for file_path in group:
+            try:
+                files.append((file_path, os.stat(file_path)))
+            except OSError:
+                continue  # Removed since the scan
+        if len(files) < 2:
+            continue
+        keeper, keeper_stat = files[choose_keeper(files, policy, root_priority)]
+        for file_path, st in files:
+            if file_path == keeper or (st.st_dev, st.st_ino) == (keeper_stat.st_dev, keeper_stat.st_ino):
+                continue
+            yield file_path, keeper, st.st_size
+
+def reflink(src_path, dest_path):
+    """
+    Create dest_path as a copy-on-write clone of src_path.
+
+    Supported on Linux filesystems with FICLONE (Btrfs, XFS with reflink,
+    bcachefs) and on macOS APFS through cp -c. Raises OSError with
+    EOPNOTSUPP where the filesystem or platform can't clone.
+    """
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+            try:
+                fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            except OSError:
+                dest.close()
+                os.remove(dest_path)
+                raise
+    elif sys.platform == 'darwin':
+        import subprocess
+        if subprocess.run(["cp", "-c", src_path, dest_path], capture_output=True).returncode != 0:
+            raise OSError(errno.EOPNOTSUPP, "Filesystem does not support clones", dest_path)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform", dest_path)
+
+def apply_action(action, target, keeper):
+    """
+    Delete target, or replace it with a hard link or reflink of keeper.
+
+    Links and clones are written next to target and renamed over it, so
+    target is never missing and is left untouched if linking fails.
+    """
+    if action == 'delete':
+        os.remove(target)
+        return
+    temp_path = target + TEMP_SUFFIX
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    if action == 'hardlink':
+        os.link(keeper, temp_path)
+    elif action == 'reflink':
+        reflink(keeper, temp_path)
+        # A clone is a file of its own, keep the permissions and times target had
+        shutil.copystat(target, temp_path)
+    else:
+        raise ValueError(f"Unknown action: {action}")
+    try:
+        os.replace(temp_path, target)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+def execute_plan(plan, action="delete", workers=DEFAULT_WORKERS, dry_run=False):
+    """
+    Apply an action to every (target, keeper, size) of a plan on a thread pool.
+
+    The plan is consumed lazily, at most workers * QUEUE_DEPTH operations
+    are in flight, so it can be fed straight from a streaming scan.
+
+    Args:
+        plan: Iterable from plan_actions.
+        action: One of ACTIONS.
+        workers: Number of threads running file operations.
+        dry_run: Only report what would be done.
+
+    Yields:
+        (target, keeper, size, error) in plan order, error is None on success
+        (and always in a dry run) or the message of the failure.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+    if dry_run:
+        for target, keeper, size in plan:
+            yield target, keeper, size, None
+        return
+
+    def run(job):
+        target, keeper, size = job
+        try:
+            apply_action(action, target, keeper)
+        except OSError as e:
+            return target, keeper, size, str(e)
+        return target, keeper, size, None
+
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for job in plan:
+            pending.append(executor.submit(run, job))
+            while len(pending) >= workers * QUEUE_DEPTH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def deduplicate(groups, policy="oldest", action="delete", root_priority=(), workers=DEFAULT_WORKERS,
+                dry_run=False, verbose=True, verify=False):
+    """
+    Resolve duplicate groups without asking: keep one file per group by
+    policy and delete or link the others.
+
+    With verify, groups are first compared byte for byte and only files
+    with an identical copy are acted on.
+
+    Returns:
+        Dict with the number of files acted on, bytes reclaimed (or that
+        would be, in a dry run), the list of (target, error) failures and,
+        with verify, the counters of the byte comparison.
+    """
+    summary = {'files': 0, 'bytes': 0, 'errors': []}
+    if verify:
+        summary['verify'] = new_verify_stats()
+        groups = verified_groups(groups, workers, summary['verify'])
+    plan = plan_actions(groups, policy, root_priority)
+    for target, keeper, size, error in execute_plan(plan, action, workers, dry_run):
+        if error is not None:
+            summary['errors'].append((target, error))
+            print(f"Failed to {action} {target}: {error}")
+            continue
+        summary['files'] += 1
+        summary['bytes'] += size
+        if verbose:
+            print(f"{'Would ' + action if dry_run else _DONE[action]}: {target} (keeping {keeper})")
+    return summary
+
+def print_summary(summary, action="delete", dry_run=False):
+    """Print the totals returned by deduplicate."""
+    if 'verify' in summary:
+        print_verify_stats(summary['verify'])
+    print(f"{summary['files']} files {'would be' if dry_run else 'were'} {_DONE[action].lower()}, "
+          f"{format_bytes(summary['bytes'])} {'reclaimable' if dry_run else 'reclaimed'}"
+          + (f", {len(summary['errors'])} failed" if summary['errors'] else ""))
+
+def add_action_arguments(parser):
+    """Add the --keep/--action/--root/--dry-run options to an argparse parser."""
+    parser.add_argument("--keep", choices=POLICIES,
+                        help="resolve every group without asking, keeping the file chosen by this rule")
+    parser.add_argument("--action", choices=ACTIONS, default="delete",
+                        help="what to do with the other files of a group (default: %(default)s)")
+    parser.add_argument("--root", action="append", default=[], dest="root_priority",
+                        help="preferred folder for --keep root-priority, repeatable, first wins")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be done")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare files byte for byte before acting on them")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove duplicate files without prompting.")
+    parser.add_argument("directories", nargs="+", help="folders to scan together")
+    add_worker_arguments(parser)
+    add_action_arguments(parser)
+    args = parser.parse_args()
+
+    files = (entry for directory in args.directories for entry in walk_files(directory))
+    groups = (paths for _, paths in iter_duplicate_groups(files, skip_empty=True, workers=args.workers,
+                                                          use_processes=args.processes))
+    summary = deduplicate(groups, args.keep or "oldest", args.action, args.root_priority,
+                          args.workers, args.dry_run, verify=args.verify)
+    print_summary(summary, args.action, args.dry_run)
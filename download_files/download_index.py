@@ -0,0 +1,176 @@
+import os
+import time
+import sqlite3
+import threading
+from urllib.parse import urldefrag
+
+# Download index shared by the monitor and the lookup service (in the same
+# directory as the scripts), set DDAS_DOWNLOAD_INDEX to use another path
+INDEX_FILE = os.environ.get(
+    "DDAS_DOWNLOAD_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "download_index.db"),
+)
+
+# Why a download matched an earlier one, strongest first
+MATCH_URL = "url"
+MATCH_ETAG = "etag"
+MATCH_NAME_SIZE = "name and size"
+
+# Matches returned per check
+MAX_MATCHES = 10
+
+_COLUMNS = "path, name, url, final_url, etag, content_length, hash, timestamp"
+
+class DownloadIndex:
+    """SQLite (WAL mode) index of completed downloads, for checks before a download starts.
+
+    Each downloaded file is one row, keyed by its path. The browser
+    extension records the URL, final URL, ETag and Content-Length of a
+    download once it completes. DownloadHandler records the size and
+    hash of every new file it sees, including downloads from other
+    programs. Whichever comes first creates the row, and the other fills
+    in its own columns.
+
+    check() matches a download that is about to start, using only what
+    its response headers tell. It tries the same URL, then the same ETag
+    and length (signed or mirrored URLs change, the ETag does not), then
+    the same file name and length. A URL can serve a new file over time
+    ("latest" links, nightly builds), so a URL match whose recorded
+    length or ETag differs from the new response is not a match.
+    """
+
+    def __init__(self, db_path=INDEX_FILE):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            " path TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " url TEXT,"
+            " final_url TEXT,"
+            " etag TEXT,"
+            " content_length INTEGER,"
+            " hash TEXT,"
+            " timestamp REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_final_url ON downloads (final_url)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_etag ON downloads (etag)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS downloads_name ON downloads (name, content_length)")
+        self._conn.commit()
+
+    def record(self, path, url=None, final_url=None, etag=None, content_length=None):
+        """Record a completed download as the browser saw it, keeping the hash already stored for its path."""
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO downloads ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, NULL, ?) "
+                "ON CONFLICT (path) DO UPDATE SET url = excluded.url, final_url = excluded.final_url, "
+                "etag = excluded.etag, content_length = excluded.content_length, timestamp = excluded.timestamp",
+                (path, _name_key(path), _normalize_url(url), _normalize_url(final_url), _normalize_etag(etag),
+                 _length(content_length), time.time()))
+            self._conn.commit()
+
+    def record_file(self, path, file_hash, size=None):
+        """Record a file the monitor hashed, keeping the URL and ETag already stored for its path."""
+        if size is None:
+            size = os.path.getsize(path)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO downloads ({_COLUMNS}) VALUES (?, ?, NULL, NULL, NULL, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET content_length = excluded.content_length, hash = excluded.hash",
+                (path, _name_key(path), size, file_hash, time.time()))
+            self._conn.commit()
+
+    def forget(self, path):
+        """Drop the row of a file that was deleted."""
+        with self._lock:
+            self._conn.execute("DELETE FROM downloads WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def check(self, url=None, final_url=None, etag=None, content_length=None, name=None):
+        """
+        Find earlier downloads of a download that is about to start.
+
+        Args:
+            url, final_url: URL requested and URL after redirects.
+            etag: ETag response header, if the client saw it.
+            content_length: Content-Length, None or negative if unknown.
+            name: File name the browser is about to use.
+
+        Returns:
+            {'duplicate': bool, 'matches': [...]}, each match giving path,
+            url, hash, the reason it matched (MATCH_URL, MATCH_ETAG or
+            MATCH_NAME_SIZE) and whether the file still exists. duplicate
+            is True if an earlier download still exists on disk.
+        """
+        urls = [u for u in {_normalize_url(url), _normalize_url(final_url)} if u]
+        etag = _normalize_etag(etag)
+        content_length = _length(content_length)
+        rows = []
+        with self._lock:
+            if urls:
+                marks = ", ".join("?" for _ in urls)
+                rows += [(MATCH_URL, row) for row in self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM downloads WHERE url IN ({marks}) OR final_url IN ({marks}) "
+                    f"ORDER BY timestamp DESC LIMIT ?", urls + urls + [MAX_MATCHES])]
+            # An ETag alone can be as short as "1", it only counts together with the length
+            if etag and content_length is not None:
+                rows += [(MATCH_ETAG, row) for row in self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM downloads WHERE etag = ? AND content_length = ? "
+                    f"ORDER BY timestamp DESC LIMIT ?", (etag, content_length, MAX_MATCHES))]
+            if name and content_length is not None:
+                rows += [(MATCH_NAME_SIZE, row) for row in self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM downloads WHERE name = ? AND content_length = ? "
+                    f"ORDER BY timestamp DESC LIMIT ?", (_name_key(name), content_length, MAX_MATCHES))]
+
+        matches = []
+        seen = set()
+        for reason, (path, _, row_url, row_final_url, row_etag, row_length, file_hash, timestamp) in rows:
+            if path in seen:
+                continue
+            if reason == MATCH_URL and (_differ(content_length, row_length) or _differ(etag, row_etag)):
+                continue  # Same URL, another file behind it
+            seen.add(path)
+            matches.append({'path': path, 'url': row_final_url or row_url, 'content_length': row_length,
+                            'hash': file_hash, 'timestamp': timestamp, 'match': reason,
+                            'exists': os.path.isfile(path)})
+        matches = matches[:MAX_MATCHES]
+        return {'duplicate': any(match['exists'] for match in matches), 'matches': matches}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _differ(new, recorded):
+    """True if both values are known and not equal."""
+    return new is not None and recorded is not None and new != recorded
+
+def _name_key(path):
+    # Browsers on Windows report paths with backslashes, whatever the platform of the service
+    return os.path.normcase(str(path).replace("\\", "/").rsplit("/", 1)[-1])
+
+def _normalize_url(url):
+    """URL without its fragment, which is never sent to the server."""
+    return urldefrag(url)[0] if url else None
+
+def _normalize_etag(etag):
+    """ETag without its weak validator prefix, or None."""
+    if not etag:
+        return None
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+def _length(content_length):
+    """Content-Length as an int, None if missing or unknown (Chrome reports -1 or 0)."""
+    try:
+        content_length = int(content_length)
+    except (TypeError, ValueError):
+        return None
+    return content_length if content_length > 0 else None
@@ -0,0 +1,308 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from parallel_hash import DEFAULT_WORKERS
+from tail_hash import TailingHasher
+from metrics import FileTrace, Metrics
+
+# Names browsers write a download to before renaming it to its final name
+DOWNLOAD_SUFFIXES = ('.crdownload', '.part', '.download')
+
+# Every temporary name, including the scratch files of editors and installers
+TEMP_SUFFIXES = DOWNLOAD_SUFFIXES + ('.tmp',)
+
+def is_temporary(file_path):
+    """Check if a path is an in-progress download or temporary file."""
+    return file_path.lower().endswith(TEMP_SUFFIXES)
+
+def is_partial_download(file_path):
+    """Check if a path is an in-progress browser download, held until it is renamed."""
+    return file_path.lower().endswith(DOWNLOAD_SUFFIXES)
+
+class _PendingFile:
+    """Events merged so far for one path."""
+
+    __slots__ = ('path', 'is_new_file', 'deadline', 'task', 'settling', 'hasher', 'prefix_reported', 'trace',
+                 'last_activity', 'size')
+
+    def __init__(self, path, is_new_file):
+        self.path = path
+        self.is_new_file = is_new_file
+        self.deadline = 0.0
+        self.last_activity = 0.0
+        self.size = None
+        self.task = None
+        self.settling = False
+        self.hasher = None
+        self.prefix_reported = False
+        self.trace = FileTrace()
+
+class DownloadPipeline:
+    """Processes file events on an asyncio loop instead of the observer thread.
+
+    Watchdog handlers only report events, which returns immediately. All
+    events for one path are coalesced into a single pending file: repeated
+    created/modified events push its quiet period back, and a rename from a
+    .crdownload/.part name carries it over to the final name. A partial
+    download that neither grows nor gets events for idle_timeout seconds
+    (paused or abandoned) is dropped; if it is resumed and renamed later,
+    the rename starts it over. Once a file has been quiet for its delay
+    and stopped growing, it is hashed exactly once on a thread pool. Stability checks are async timers, so any number
+    of downloads settle concurrently, and results are handled one at a time
+    on the loop thread, so the hash index needs no locking.
+
+    Browser downloads (.crdownload/.part/.download names) are hashed while
+    they download: every poll the bytes appended since the previous one
+    are fed to a TailingHasher, so the digest is ready right after the
+    file settles, and the prefix fingerprint is reported as soon as the
+    first few MB have landed. Other files may be rewritten in place while
+    written, they are read whole once settled.
+
+    Every file carries a FileTrace from its first event to the end of
+    on_hashed, recorded in metrics together with the event counters.
+    """
+
+    def __init__(self, on_hashed, algorithm="sha256", on_prefix=None, workers=DEFAULT_WORKERS,
+                 poll_interval=1, required_stable_checks=3, max_wait=30, idle_timeout=600, metrics=None):
+        """
+        Args:
+            on_hashed: Called as on_hashed(file_path, file_hash, is_new_file, prefix, trace)
+                on the loop thread, file_hash is None if the file could not be read
+                and prefix is None for files shorter than the fingerprinted prefix.
+                trace is the file's FileTrace, to be marked "checked" and "alerted";
+                the value returned is recorded as the outcome of the file.
+            algorithm: Digest used for files and prefix fingerprints.
+            on_prefix: Optional, called as on_prefix(file_path, prefix) on the
+                loop thread once the prefix of a new file has been read.
+            workers: Number of hashing threads.
+            poll_interval: Seconds between reads of a growing file and between
+                size checks of a settling file.
+            required_stable_checks: Consecutive unchanged sizes needed.
+            max_wait: Size checks before a file that keeps changing is given up.
+            idle_timeout: Seconds a partial download may go without growing
+                or new events before it is dropped.
+            metrics: Metrics to record counters and latencies in, a new one if None.
+        """
+        self.on_hashed = on_hashed
+        self.algorithm = algorithm
+        self.on_prefix = on_prefix
+        self.poll_interval = poll_interval
+        self.required_stable_checks = required_stable_checks
+        self.max_wait = max_wait
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics or Metrics()
+        # events: reported events, collapsed: events merged into an already
+        # pending file, settled: files that were stable and got hashed,
+        # abandoned: files that never stopped changing, stalled: partial
+        # downloads dropped after idle_timeout. The counters live in the
+        # metrics, which other threads snapshot.
+        self.metrics.register('events', 'collapsed', 'settled', 'abandoned', 'stalled', 'hash_errors',
+                              'bytes_hashed')
+        self.metrics.gauge('pending_files', lambda: len(self._pending))
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._backlog = []
+        self._loop = None
+
+    def submit(self, file_path, is_new_file=True, delay=0):
+        """Report a created or modified file, to be processed once quiet for delay seconds."""
+        self._call(self._submit, file_path, is_new_file, delay)
+
+    def move(self, src_path, dest_path, delay=0):
+        """Report a rename, pending events for src_path carry over to dest_path."""
+        self._call(self._move, src_path, dest_path, delay)
+
+    def discard(self, file_path):
+        """Report a deleted file, dropping it if it was pending."""
+        self._call(self._discard, file_path)
+
+    def is_pending(self, file_path):
+        """Check if a file has events waiting to be processed."""
+        return file_path in self._pending
+
+    def format_stats(self):
+        """Summary of the event counters for display."""
+        count = self.metrics.counter
+        return f"{count('events')} events, {count('collapsed')} collapsed, {count('settled')} files settled"
+
+    async def run(self):
+        """Process reported events until cancelled."""
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            backlog, self._backlog = self._backlog, []
+        for method, args in backlog:
+            method(*args)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for entry in list(self._pending.values()):
+                if entry.task is not None:
+                    entry.task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._loop = None
+
+    def _call(self, method, *args):
+        """Run method on the loop thread, safe to call from any thread."""
+        with self._lock:
+            if self._loop is None:
+                # Events seen before run() started are replayed by it
+                self._backlog.append((method, args))
+                return
+            loop = self._loop
+        loop.call_soon_threadsafe(method, *args)
+
+    def _submit(self, file_path, is_new_file, delay):
+        self.metrics.incr('events')
+        entry = self._pending.get(file_path)
+        if entry is None:
+            entry = self._pending[file_path] = _PendingFile(file_path, is_new_file)
+        else:
+            self.metrics.incr('collapsed')
+            entry.is_new_file = entry.is_new_file or is_new_file
+        self._postpone(entry, delay)
+
+    def _move(self, src_path, dest_path, delay):
+        entry = self._pending.pop(src_path, None)
+        if entry is None or entry.settling:
+            # Nothing pending, or already being checked under the old name: start over
+            if entry is not None:
+                entry.task.cancel()
+            self._submit(dest_path, True, delay)
+            return
+
+        self.metrics.incr('events')
+        self.metrics.incr('collapsed')
+        existing = self._pending.get(dest_path)
+        if existing is not None:
+            # Replaced an already pending file, keep that one and drop the renamed entry
+            if entry.task is not None:
+                entry.task.cancel()
+            existing.is_new_file = True
+            self._postpone(existing, delay)
+            return
+        entry.path = dest_path
+        entry.is_new_file = True
+        self._pending[dest_path] = entry
+        self._postpone(entry, delay)
+
+    def _discard(self, file_path):
+        entry = self._pending.pop(file_path, None)
+        if entry is None:
+            return
+        self.metrics.incr('events')
+        self.metrics.incr('collapsed')
+        if entry.task is not None:
+            entry.task.cancel()
+
+    def _postpone(self, entry, delay):
+        """Push back the quiet period of an entry and make sure it is scheduled."""
+        if entry.settling:
+            return  # Already past the quiet period, the stability check sees further changes
+        entry.last_activity = self._loop.time()
+        entry.deadline = max(entry.deadline, entry.last_activity + delay)
+        # Browsers only append to downloads, so they can be hashed as they grow.
+        # Other files are read whole once settled.
+        if entry.hasher is None and is_partial_download(entry.path):
+            entry.hasher = TailingHasher(self.algorithm)
+        if entry.task is None:
+            entry.task = asyncio.ensure_future(self._process(entry))
+
+    async def _process(self, entry):
+        """Wait for a file to settle, hash it on the pool and hand the result over."""
+        loop = asyncio.get_running_loop()
+        file_path = entry.path
+        try:
+            # Partial downloads wait for the rename to their final name, and
+            # every new event for the file moves the deadline back
+            while is_partial_download(entry.path) or entry.deadline > loop.time():
+                delay = entry.deadline - loop.time()
+                if is_partial_download(entry.path):
+                    if self._grew(entry):
+                        entry.last_activity = loop.time()
+                    elif loop.time() - entry.last_activity > self.idle_timeout:
+                        print(f"Stopped waiting for {os.path.basename(entry.path)}: "
+                              f"no progress in {self.idle_timeout:g} s")
+                        self.metrics.incr('stalled')
+                        return
+                    delay = self.poll_interval
+                if entry.hasher is not None:
+                    await self._tail(entry)
+                    delay = min(self.poll_interval, delay)
+                await asyncio.sleep(max(0.0, delay))
+            entry.settling = True
+            file_path = entry.path
+            if not await self.wait_for_stable_file(file_path):
+                self.metrics.incr('abandoned')
+                return
+            self.metrics.incr('settled')
+            entry.trace.mark('stable')
+            hasher = entry.hasher or TailingHasher(self.algorithm)
+            try:
+                file_hash = await loop.run_in_executor(self._executor, hasher.finish, file_path)
+                self.metrics.incr('bytes_hashed', hasher.offset)
+            except OSError as e:
+                print(f"Error calculating hash for {file_path}: {e}")
+                self.metrics.incr('hash_errors')
+                file_hash = None
+            entry.trace.mark('hashed')
+            outcome = self.on_hashed(file_path, file_hash, entry.is_new_file, hasher.prefix, entry.trace)
+            self.metrics.record(file_path, entry.trace, outcome)
+        except Exception as e:
+            print(f"Error processing {os.path.basename(file_path)}: {e}")
+        finally:
+            if self._pending.get(entry.path) is entry:
+                del self._pending[entry.path]
+
+    def _grew(self, entry):
+        """Check if a file changed size since the last call."""
+        try:
+            size = os.path.getsize(entry.path)
+        except OSError:
+            return False
+        grew, entry.size = size != entry.size, size
+        return grew
+
+    async def _tail(self, entry):
+        """Hash what was appended to a growing file, reporting its prefix once complete."""
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, entry.hasher.update, entry.path)
+        except OSError:
+            return  # Renamed or not readable yet, picked up again on the next poll
+        if entry.hasher.prefix is not None and not entry.prefix_reported:
+            entry.prefix_reported = True
+            if self.on_prefix is not None:
+                self.on_prefix(entry.path, entry.hasher.prefix)
+
+    async def wait_for_stable_file(self, file_path):
+        """Wait for file to be stable (not changing size)"""
+        stable_count = 0
+        wait_count = 0
+
+        while stable_count < self.required_stable_checks and wait_count < self.max_wait:
+            try:
+                if not os.path.exists(file_path):
+                    return False
+
+                current_size = os.path.getsize(file_path)
+                await asyncio.sleep(self.poll_interval)
+                wait_count += 1
+
+                if not os.path.exists(file_path):
+                    return False
+
+                new_size = os.path.getsize(file_path)
+
+                if current_size == new_size and current_size > 0:
+                    stable_count += 1
+                else:
+                    stable_count = 0
+
+            except OSError as e:
+                print(f"Error waiting for stable file: {e}")
+                await asyncio.sleep(self.poll_interval)
+                wait_count += 1
+
+        return stable_count >= self.required_stable_checks
@@ -1,46 +1,52 @@
 import os
-import hashlib
+import sys
+from parallel_hash import DEFAULT_WORKERS, hash_files
+from file_hashing import hash_file
+from hash_cache import get_cache
+from staged_scan import walk_files
+from archive_index import UNIQUE, ArchiveIndex, classify_files
 
 def calculate_hash(file_path):
     """Calculate the SHA-256 hash of the file."""
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+    return hash_file(file_path, "sha256")
 
-def get_files_hash(directory):
+def get_files_hash(directory, workers=DEFAULT_WORKERS, use_processes=False):
     """Get a dictionary of file hashes for all files in a directory."""
     file_hashes = {}
-    for root, _, files in os.walk(directory):
-        for file_name in files:
-            file_path = os.path.join(root, file_name)
-            file_hash = calculate_hash(file_path)
+    # The walker feeds the worker pool, results come back in walk order
+    jobs = ((os.path.join(root, file_name),) for root, _, files in os.walk(directory) for file_name in files)
+    for (file_path,), file_hash, _ in hash_files(jobs, calculate_hash, workers, use_processes,
+                                                 cache=get_cache()):
+        if file_hash is not None:
             file_hashes[file_hash] = file_path
     return file_hashes
 
-def find_files_not_in_archive(download_dir, archive_dir):
-    """Identify files in the download directory that are not in the archive directory."""
-    # Get hashes of files in both directories
-    archive_hashes = get_files_hash(archive_dir)
-    download_hashes = get_files_hash(download_dir)
-    
-    # Find files in download that aren't in the archive by checking hash values
-    unique_files = {file_path for hash_val, file_path in download_hashes.items() if hash_val not in archive_hashes}
-    
-    return unique_files
+def classify_downloads(download_dir, archive_dirs, workers=DEFAULT_WORKERS, use_processes=False, index=None):
+    """
+    Compare the download directory with one or more archive directories.
 
-# Define directories for download and archive
-download_dir = r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files"
-archive_dir = r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\archive_files"
+    The archives are kept in a persistent ArchiveIndex: each call only
+    stats them to pick up changes, and archive files are hashed once, when
+    a download of the same size first needs them.
 
-# Find files that are not in the archive
-unique_files = find_files_not_in_archive(download_dir, archive_dir)
+    Returns:
+        Dict mapping each downloaded file to (status, archive path), the
+        status being UNIQUE, IN_ARCHIVE or RENAMED.
+    """
+    if isinstance(archive_dirs, str):
+        archive_dirs = [archive_dirs]
+    if index is None:
+        index = ArchiveIndex()
+    for archive_dir in archive_dirs:
+        index.update(archive_dir)
+    return classify_files(walk_files(download_dir), index, archive_dirs, workers, use_processes)
 
-# Display results
-if unique_files:
-    print("Files in the download folder that are not in the archive:")
-    for file_path in unique_files:
-        print(f"- {file_path}")
-else:
-    print("All files in the download folder are already in the archive.")
+def find_files_not_in_archive(download_dir, archive_dir, workers=DEFAULT_WORKERS, use_processes=False):
+    """Identify files in the download directory that are not in the archive directory (or directories)."""
+    results = classify_downloads(download_dir, archive_dir, workers, use_processes)
+    return {file_path for file_path, (status, _) in results.items() if status == UNIQUE}
+
+if __name__ == "__main__":
+    # Same as `python -m ddas diff-archive`
+    from ddas.cli import main
+    sys.exit(main(["diff-archive"] + sys.argv[1:]))
@@ -1,29 +1,22 @@
 import os
-import hashlib
 import json
 import re
+from staged_scan import group_duplicates
+from verify_duplicates import files_identical
 
-download_directory = r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files"
+# Set DDAS_DOWNLOAD_DIR to check another folder
+download_directory = os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\OneDrive\Desktop\ddas_project\download_files")
 
-def get_file_hash(file_path):
-    """Generate a SHA-256 hash for the given file."""
-    hasher = hashlib.sha256()
-    try:
-        with open(file_path, 'rb') as f:
-            chunk = f.read(8192)
-            while chunk:
-                hasher.update(chunk)
-                chunk = f.read(8192)
-    except FileNotFoundError:
-        print(f"Error: {file_path} not found.")
-        return None
-    return hasher.hexdigest()
+# Compare a file byte for byte with another copy before deleting it
+VERIFY_BEFORE_DELETE = True
+
+def similar_name_key(file_name):
+    """Base of a file name with numbers removed, equal for names is_similar_name matches."""
+    return re.sub(r'[\d]', '', file_name.split('.')[0])
 
 def is_similar_name(file_name1, file_name2):
     """Check if two file names are similar based on a naming convention."""
-    base1 = re.sub(r'[\d]', '', file_name1.split('.')[0])  # Remove numbers
-    base2 = re.sub(r'[\d]', '', file_name2.split('.')[0])  # Remove numbers
-    return base1 == base2  # Return true if bases are the same after removing numbers
+    return similar_name_key(file_name1) == similar_name_key(file_name2)  # Same bases once numbers are removed
 
 def check_for_similar_files():
     """Check for files with similar content and names in the specified directory."""
@@ -36,32 +29,28 @@ def check_for_similar_files():
     else:
         metadata = {}
 
-    # Dictionary to track files by hash and names
-    files_by_hash = {}
+    # Files and sizes for the content check, and files grouped by names
+    listed_files = []
     similar_files = {}
+    first_by_key = {}
 
     # Iterate through each file in the download directory
     for file_name in os.listdir(download_directory):
         file_path = os.path.join(download_directory, file_name)
         
         if os.path.isfile(file_path):
-            file_hash = get_file_hash(file_path)
-
-            # If file hash couldn't be generated, skip this file
-            if not file_hash:
+            try:
+                listed_files.append((file_path, os.path.getsize(file_path)))
+            except FileNotFoundError:
+                print(f"Error: {file_path} not found.")
                 continue
 
-            # Group files by their hash
-            if file_hash not in files_by_hash:
-                files_by_hash[file_hash] = []
-            files_by_hash[file_hash].append(file_path)
-
-            # Check for similar names with existing files
-            for existing_file_name in similar_files.keys():
-                if is_similar_name(existing_file_name, file_name):
-                    similar_files[existing_file_name].append(file_path)
-                    break
+            # Group under the first file whose name shares the same key
+            key = similar_name_key(file_name)
+            if key in first_by_key:
+                similar_files[first_by_key[key]].append(file_path)
             else:
+                first_by_key[key] = file_name
                 similar_files[file_name] = [file_path]
 
     print("=" * 60)
@@ -75,7 +64,8 @@ def check_for_similar_files():
             for path in paths:
                 print(f" - {path}")
 
-    # Check for files with identical content
+    # Check for files with identical content, only size collisions get hashed
+    files_by_hash = group_duplicates(listed_files)
     print("\n" + "=" * 60)
     print("Identifying Duplicate Content:")
     for file_hash, paths in files_by_hash.items():
@@ -87,7 +77,11 @@ def check_for_similar_files():
             delete_choice = input("Do you want to delete one of these files? (yes/no): ").strip().lower()
             if delete_choice == 'yes':
                 file_to_delete = input("Enter the full path of the file you want to delete: ")
-                if os.path.exists(file_to_delete):
+                others = [path for path in paths if path != file_to_delete]
+                if VERIFY_BEFORE_DELETE and os.path.exists(file_to_delete) and \
+                        not any(files_identical(file_to_delete, path) for path in others):
+                    print("No byte-identical copy of this file is left. Skipping deletion.")
+                elif os.path.exists(file_to_delete):
                     os.remove(file_to_delete)
                     print(f"Deleted file: {file_to_delete}")
                 else:
@@ -98,4 +92,5 @@ def check_for_similar_files():
     print("=" * 60)
 
 # Run the duplicate check for all files in the download directory
-check_for_similar_files()
+if __name__ == "__main__":
+    check_for_similar_files()
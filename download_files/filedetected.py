@@ -1,58 +1,39 @@
 import os
-import hashlib
 import re
-import time
 import subprocess
+from hash_store import open_hash_store
+from hash_filter import HashFilter
+from file_hashing import hash_file
+from snapshot_poller import SnapshotPoller
+from compact_index import CompactHashIndex
+from verify_duplicates import files_identical
 
 # Directory to monitor for downloads
-DOWNLOAD_DIR = r"C:\Users\Manoj\Downloads"
+# Set DDAS_DOWNLOAD_DIR to monitor another folder
+DOWNLOAD_DIR = os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\Downloads")
 
 # File to store hashes of downloaded files (in the same directory as the script)
 HASH_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_hashes.txt")
 
+# Indexed hash database, file_hashes.txt is imported into it on first use
+HASH_DB_FILE = os.environ.get("DDAS_HASH_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_hashes.db"))
+
 # Function to calculate file hash
 def calculate_hash(file_path):
-    hasher = hashlib.md5()
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hasher.update(chunk)
-    return hasher.hexdigest()
+    return hash_file(file_path, "md5")
 
 # Load existing file hashes
 def load_existing_hashes():
-    if not os.path.exists(HASH_STORE_FILE):
-        return {}
-    
-    file_hashes = {}
-    with open(HASH_STORE_FILE, "r") as file:
-        for line in file.readlines():
-            # Skip empty lines
-            if not line.strip():
-                continue
-            
-            # Split the line by the first comma only
-            parts = line.strip().split(",", 1)
-            
-            # Ensure the line has exactly two parts (hash and filename)
-            if len(parts) == 2:
-                file_hash, file_name = parts
-                file_hashes[file_hash] = file_name
-            else:
-                print(f"Skipping malformed line: {line.strip()}")
-    
-    return file_hashes
-
-# Save new file hashes
-def save_hashes(hash_dict):
-    with open(HASH_STORE_FILE, "w") as file:
-        for file_hash, file_name in hash_dict.items():
-            file.write(f"{file_hash},{file_name}\n")
-
-# Check if a file is fully downloaded (size remains constant)
-def is_file_stable(file_path, check_interval=2):
-    initial_size = os.path.getsize(file_path)
-    time.sleep(check_interval)
-    return initial_size == os.path.getsize(file_path)
+    store = open_hash_store(HASH_DB_FILE, legacy_txt=HASH_STORE_FILE)
+    # MD5 digests as bytes and names in an arena, streamed from the store in batches
+    file_hashes = CompactHashIndex(digest_size=16, capacity=len(store))
+    for entry in store.iter_entries():
+        try:
+            file_hashes[entry['hash']] = entry['name']
+        except ValueError:
+            # Imported lines that aren't an MD5 digest, skipped as the text file loader did
+            print(f"Skipping malformed entry: {entry['hash']},{entry['name']}")
+    return store, file_hashes
 
 # Detect similar filenames (e.g., tamil-1.txt, tamil-2.txt)
 def find_similar_filenames(file_name, existing_files):
@@ -61,11 +42,12 @@ def find_similar_filenames(file_name, existing_files):
     base_name = os.path.splitext(base_name)[0]  # Remove file extension
     
     # Find files with similar base names
-    similar_files = [f for f in existing_files if re.sub(r"-\d+", "", f).startswith(base_name)]
+    similar_files = [f for f in existing_files
+                     if f != file_name and re.sub(r"-\d+", "", f).startswith(base_name)]
     return similar_files
 
 # Handle duplicate files (open or delete)
-def handle_duplicate(file_path):
+def handle_duplicate(file_path, original_path=None):
     print(f"\nDuplicate file detected: {os.path.basename(file_path)}")
     action = input("Do you want to [O]pen or [D]elete the file? (O/D): ").strip().upper()
     
@@ -80,6 +62,12 @@ def handle_duplicate(file_path):
         except Exception as e:
             print(f"Failed to open file: {e}")
     elif action == "D":
+        # MD5 matches can collide, only delete a content duplicate whose bytes match
+        if original_path is not None and (not os.path.isfile(original_path)
+                                          or os.path.samefile(file_path, original_path)
+                                          or not files_identical(file_path, original_path)):
+            print(f"Not deleted: no byte-identical copy of {file_path} found at {original_path}")
+            return
         # Delete the file
         try:
             os.remove(file_path)
@@ -91,48 +79,53 @@ def handle_duplicate(file_path):
 
 # Monitor downloads directory for new files
 def monitor_directory():
-    file_hashes = load_existing_hashes()
+    store, file_hashes = load_existing_hashes()
+    # The other monitors skip the store for hashes the filter rules out, keep it up to date for them
+    hash_filter = HashFilter(store)
     print("Monitoring for new downloads...")
     
-    # Track files already processed in the current session
+    # Diffs directory snapshots, files are reported once their size and mtime stop changing
+    poller = SnapshotPoller(DOWNLOAD_DIR)
+
+    # (name, hash) of the files already checked, the poller reports a file again when it is touched
     processed_files = set()
 
     while True:
-        with os.scandir(DOWNLOAD_DIR) as entries:
-            # Collect all files in the directory
-            current_files = [entry.name for entry in entries if entry.is_file()]
+        # Check the files that finished downloading since the last poll
+        for file_name in poller.poll():
+            file_path = os.path.join(DOWNLOAD_DIR, file_name)
+            try:
+                file_hash = calculate_hash(file_path)
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                continue  # Removed or locked since the snapshot
+            if (file_name, file_hash) in processed_files:
+                continue  # Touched without changing its content
+            processed_files.add((file_name, file_hash))
             
-            # Check for new or duplicate files
-            for file_name in current_files:
-                if file_name not in processed_files:
-                    file_path = os.path.join(DOWNLOAD_DIR, file_name)
-                    
-                    # Wait for the file to be fully downloaded
-                    if is_file_stable(file_path):
-                        file_hash = calculate_hash(file_path)
-                        
-                        # Check for content-based duplicates
-                        if file_hash in file_hashes:
-                            print(f"\n--- Duplicate File Detected (Content-Based) ---")
-                            print(f"{file_name} is a duplicate of {file_hashes[file_hash]}")
-                            handle_duplicate(file_path)
-                        else:
-                            # Check for name-based duplicates
-                            similar_files = find_similar_filenames(file_name, file_hashes.values())
-                            if similar_files:
-                                print(f"\n--- Duplicate File Detected (Name-Based) ---")
-                                print(f"{file_name} is similar to {', '.join(similar_files)}")
-                                handle_duplicate(file_path)
-                            else:
-                                print(f"\n--- New File Downloaded ---")
-                                print(f"{file_name} is a new download.")
-                                file_hashes[file_hash] = file_name
-                                save_hashes(file_hashes)
-                        
-                        # Mark the file as processed
-                        processed_files.add(file_name)
+            # Check for content-based duplicates
+            if file_hash in file_hashes:
+                if file_hashes[file_hash] == file_name:
+                    continue  # This very file, recorded in an earlier session
+                print(f"\n--- Duplicate File Detected (Content-Based) ---")
+                print(f"{file_name} is a duplicate of {file_hashes[file_hash]}")
+                handle_duplicate(file_path, os.path.join(DOWNLOAD_DIR, file_hashes[file_hash]))
+            else:
+                # Check for name-based duplicates
+                similar_files = find_similar_filenames(file_name, file_hashes.values())
+                if similar_files:
+                    print(f"\n--- Duplicate File Detected (Name-Based) ---")
+                    print(f"{file_name} is similar to {', '.join(similar_files)}")
+                    handle_duplicate(file_path)
+                else:
+                    print(f"\n--- New File Downloaded ---")
+                    print(f"{file_name} is a new download.")
+                    file_hashes[file_hash] = file_name
+                    store.add(file_hash, file_name, size=file_size)
+                    hash_filter.add(file_hash)
         
-        time.sleep(5)  # Adjust monitoring interval as needed
+        # Polls every 2 s while files are pending, backing off to 30 s when idle
+        poller.wait()
 
 # Run the monitoring function
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+import functools
+
+# Cache database shared by all scanners (in the same directory as the scripts),
+# set DDAS_HASH_CACHE to another path, or to an empty string to disable caching
+CACHE_FILE = os.environ.get(
+    "DDAS_HASH_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "hash_cache.db"),
+)
+
+# Entries kept before eviction kicks in on close
+DEFAULT_MAX_ENTRIES = 1000000
+
+# Pending writes flushed to disk in one transaction
+COMMIT_EVERY = 1000
+
+class HashCache:
+    """On-disk digest cache keyed by (path, size, mtime, inode, device).
+
+    A cached digest is only returned while the file still has the same
+    size, modification time, inode and device it had when it was hashed,
+    so an unchanged tree can be rescanned with one stat call per file.
+    Paths are stored absolute, whatever form they were given in.
+    """
+
+    def __init__(self, db_path=CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._touched = {}
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " path TEXT NOT NULL,"
+            " algorithm TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " device INTEGER,"
+            " PRIMARY KEY (path, algorithm))"
+        )
+        # Caches created before the device was recorded, their entries miss until hashed again
+        if 'device' not in [row[1] for row in self._conn.execute("PRAGMA table_info(hashes)")]:
+            self._conn.execute("ALTER TABLE hashes ADD COLUMN device INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+        self._conn.commit()
+
+    def lookup(self, file_path, st, algorithm="sha256"):
+        """Return the cached digest if the file is unchanged since it was hashed."""
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, device, digest FROM hashes WHERE path = ? AND algorithm = ?",
+                (file_path, algorithm),
+            ).fetchone()
+            if row is None or row[:4] != _signature(st):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[(file_path, algorithm)] = time.time()
+            return row[4]
+
+    def store(self, file_path, st, digest, algorithm="sha256"):
+        """Remember the digest of a file along with its stat signature."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, algorithm, size, mtime_ns, inode, device, digest, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(file_path), algorithm) + _signature(st) + (digest, time.time()),
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._flush()
+
+    def hash_file(self, file_path, hash_func, algorithm="sha256", *args):
+        """Return the digest of a file, calling hash_func(file_path, *args) on a miss."""
+        file_path = os.path.abspath(file_path)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return hash_func(file_path, *args)  # Let the hash function report the error
+
+        digest = self.lookup(file_path, st, algorithm)
+        if digest is None:
+            digest = hash_func(file_path, *args)
+            if digest is not None:
+                self.store(file_path, st, digest, algorithm)
+        return digest
+
+    def _flush(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE hashes SET last_used = ? WHERE path = ? AND algorithm = ?",
+                [(used, path, algorithm) for (path, algorithm), used in self._touched.items()],
+            )
+            self._touched = {}
+        self._conn.commit()
+        self._pending = 0
+
+    def commit(self):
+        """Write pending entries to disk."""
+        with self._lock:
+            self._flush()
+
+    def count(self):
+        """Number of cached entries."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def prune(self, max_entries=None):
+        """
+        Evict entries so that at most max_entries remain.
+
+        Entries whose file no longer exists (or changed since it was hashed)
+        are dropped first, starting from the least recently used. If the cache
+        is still too big, the least recently used live entries go next.
+
+        Returns:
+            Number of entries removed.
+        """
+        if max_entries is None:
+            max_entries = self.max_entries
+
+        with self._lock:
+            self._flush()
+            removed = 0
+            stale = []
+            rows = self._conn.execute(
+                "SELECT path, algorithm, size, mtime_ns, inode, device FROM hashes ORDER BY last_used"
+            ).fetchall()
+            for path, algorithm, *signature in rows:
+                try:
+                    if _signature(os.stat(path)) == tuple(signature):
+                        continue
+                except OSError:
+                    pass
+                stale.append((path, algorithm))
+            self._conn.executemany("DELETE FROM hashes WHERE path = ? AND algorithm = ?", stale)
+            removed += len(stale)
+
+            excess = len(rows) - len(stale) - max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM hashes WHERE rowid IN "
+                    "(SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                removed += excess
+            self._conn.commit()
+            return removed
+
+    def close(self):
+        """Flush pending writes, evict if over the size bound and close the database."""
+        if self._conn is None:
+            return
+        if self.count() > self.max_entries:
+            self.prune()
+        self.commit()
+        self._conn.close()
+        self._conn = None
+
+def _signature(st):
+    """What must not change for a cached digest to stay valid."""
+    return (st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+_default_cache = None
+
+def get_cache():
+    """Return the cache shared by every scanner in this process, or None if disabled."""
+    global _default_cache
+    if _default_cache is None and CACHE_FILE:
+        try:
+            _default_cache = HashCache(CACHE_FILE)
+        except sqlite3.Error as e:
+            print(f"Hash cache unavailable ({CACHE_FILE}): {e}")
+            return None
+        atexit.register(_default_cache.close)
+    return _default_cache
+
+def cached_hash(algorithm):
+    """Decorator that serves hash_func(file_path) from the shared cache when possible."""
+    def decorator(hash_func):
+        @functools.wraps(hash_func)
+        def wrapper(file_path):
+            cache = get_cache()
+            if cache is None:
+                return hash_func(file_path)
+            return cache.hash_file(file_path, hash_func, algorithm)
+        return wrapper
+    return decorator
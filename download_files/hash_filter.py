@@ -0,0 +1,208 @@
+import os
+import math
+import mmap
+import struct
+import hashlib
+import threading
+from hash_store import HashStore
+
+# Default share of lookups for unknown hashes that still go to the store
+FALSE_POSITIVE_RATE = 0.01
+
+# Smallest number of hashes a filter is sized for
+MIN_CAPACITY = 1024
+
+# magic, version, bits, hash functions, capacity, bits set, last store sequence number, false positive rate
+_HEADER = struct.Struct('<4sIQIQQqd')
+_MAGIC = b'DDBF'
+# Version 1 filters recorded a rowid, which the store can reuse, and are rebuilt
+_VERSION = 2
+
+# Bits start on their own cache line after the header
+_BITS_OFFSET = 64
+
+def filter_size(capacity, false_positive_rate):
+    """Return (bits, hash functions) of a Bloom filter holding capacity hashes at the given rate."""
+    bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+    num_hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, num_hashes
+
+class HashFilter:
+    """Memory-mapped Bloom filter of the hashes in a HashStore.
+
+    Most new downloads are not duplicates, and the filter answers "never
+    seen this hash" from a few bits of a mapped file without querying the
+    store; only hashes it may contain are looked up for real. It never
+    misses a stored hash, so a negative answer is final.
+
+    The filter is kept next to the database and remembers the last store
+    sequence number it covered. Opening it adds the entries written since,
+    so rows inserted by tools that don't update the filter are caught up
+    on the next start, and add() sets the bits of new hashes in place. Deleted
+    hashes keep their bits until the filter is rebuilt, which happens once
+    the bits set suggest more hashes than it was sized for, or when a
+    different false positive rate is asked for. Hashes recorded twice
+    (by add() and again by a later sync) set no new bits, so they are not
+    counted twice.
+    """
+
+    def __init__(self, store, filter_path=None, false_positive_rate=FALSE_POSITIVE_RATE):
+        """
+        Args:
+            store: HashStore the filter covers.
+            filter_path: Filter file, defaults to the database path plus ".bloom".
+            false_positive_rate: Share of unknown hashes reported as possibly stored.
+        """
+        self.store = store
+        self.filter_path = filter_path or store.db_path + ".bloom"
+        self.false_positive_rate = false_positive_rate
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        if not self._open():
+            self.rebuild()
+        self.sync()
+
+    def _open(self):
+        """Map an existing filter file, returns False if it is missing or unusable."""
+        try:
+            f = open(self.filter_path, "r+b")
+        except FileNotFoundError:
+            return False
+        try:
+            header = _HEADER.unpack(f.read(_HEADER.size))
+            magic, version, num_bits, _, _, _, _, rate = header
+            if (magic != _MAGIC or version != _VERSION or rate != self.false_positive_rate
+                    or os.fstat(f.fileno()).st_size < _BITS_OFFSET + (num_bits + 7) // 8):
+                f.close()
+                return False
+            self._map = mmap.mmap(f.fileno(), 0)
+        except (OSError, struct.error, ValueError):
+            f.close()
+            return False
+        self._file = f
+        (_, _, self.num_bits, self.num_hashes, self.capacity,
+         self.bits_set, self.last_seq, _) = header
+        return True
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def _positions(self, file_hash):
+        """Bit positions of a hash, by double hashing one 128-bit digest of it."""
+        digest = hashlib.blake2b(file_hash.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, file_hash):
+        """True if the hash may be stored, False if it certainly is not."""
+        bits = self._map
+        for position in self._positions(file_hash):
+            if not bits[_BITS_OFFSET + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, file_hash):
+        """Record a hash that was just added to the store."""
+        self.add_many([file_hash])
+
+    def add_many(self, file_hashes, last_seq=None):
+        """Record hashes added to the store, last_seq marks them as covered up to that sequence number."""
+        with self._lock:
+            for file_hash in file_hashes:
+                self._set(file_hash)
+            if last_seq is not None:
+                self.last_seq = max(self.last_seq, last_seq)
+            self._write_header()
+            over_capacity = self.estimated_count() > self.capacity
+        if over_capacity:
+            self.rebuild()
+
+    def _set(self, file_hash):
+        bits = self._map
+        for position in self._positions(file_hash):
+            index = _BITS_OFFSET + (position >> 3)
+            mask = 1 << (position & 7)
+            if not bits[index] & mask:
+                bits[index] = bits[index] | mask
+                self.bits_set += 1
+
+    def estimated_count(self):
+        """Number of distinct hashes in the filter, estimated from the bits set."""
+        if self.bits_set >= self.num_bits:
+            return float('inf')
+        return -self.num_bits / self.num_hashes * math.log(1 - self.bits_set / self.num_bits)
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.num_bits, self.num_hashes,
+                          self.capacity, self.bits_set, self.last_seq, self.false_positive_rate)
+
+    def sync(self, batch_size=10000):
+        """Add the store entries written since the filter last covered it, returns how many."""
+        added = 0
+        batch = []
+        for seq, file_hash in self.store.hashes_since(self.last_seq, batch_size):
+            batch.append(file_hash)
+            if len(batch) >= batch_size:
+                self.add_many(batch, seq)
+                added += len(batch)
+                batch = []
+        if batch:
+            self.add_many(batch, seq)
+            added += len(batch)
+        return added
+
+    def rebuild(self, capacity=None):
+        """
+        Write a fresh filter for every hash in the store and map it.
+
+        Args:
+            capacity: Hashes to size it for, defaults to twice the store size.
+        """
+        with self._lock:
+            capacity = max(capacity or 2 * len(self.store), MIN_CAPACITY)
+            num_bits, num_hashes = filter_size(capacity, self.false_positive_rate)
+            self._close_map()
+            temp_path = self.filter_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.truncate(_BITS_OFFSET + (num_bits + 7) // 8)
+            f = open(temp_path, "r+b")
+            self._file, self._map = f, mmap.mmap(f.fileno(), 0)
+            self.num_bits, self.num_hashes, self.capacity = num_bits, num_hashes, capacity
+            self.bits_set, self.last_seq = 0, -1
+            for seq, file_hash in self.store.hashes_since(-1):
+                self._set(file_hash)
+                self.last_seq = seq
+            self._write_header()
+            self._close_map()
+            os.replace(temp_path, self.filter_path)
+            if not self._open():
+                raise OSError(f"Could not map rebuilt filter {self.filter_path}")
+
+    def nbytes(self):
+        """Size of the mapped filter in bytes."""
+        return len(self._map)
+
+    def close(self):
+        with self._lock:
+            self._close_map()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the Bloom filter of a hash database.")
+    parser.add_argument("database", help="hash store database, e.g. file_hashes.db")
+    parser.add_argument("--rate", type=float, default=FALSE_POSITIVE_RATE,
+                        help="false positive rate (default: %(default)s)")
+    args = parser.parse_args()
+
+    hash_filter = HashFilter(HashStore(args.database), false_positive_rate=args.rate)
+    hash_filter.rebuild()
+    print(f"{hash_filter.filter_path}: ~{hash_filter.estimated_count():.0f} hashes, {hash_filter.nbytes() / 1024:.0f} KiB, "
+          f"{hash_filter.num_hashes} hash functions, sized for {hash_filter.capacity}")
+    hash_filter.close()
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import sqlite3
+import threading
+
+# Columns of an entry, in the order add_many tuples and _entry rows use
+COLUMNS = ('hash', 'name', 'location', 'timestamp', 'prefix', 'root', 'size')
+
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM hashes"
+_INSERT = (f"INSERT OR REPLACE INTO hashes ({', '.join(COLUMNS)}) "
+           f"VALUES ({', '.join('?' for _ in COLUMNS)})")
+
+class HashStore:
+    """SQLite (WAL mode) store of known file hashes.
+
+    Replaces rewriting file_hashes.txt / file_metadata.json on every change:
+    each insert or delete touches a single row, and entries can be looked up
+    by hash, by file name, by full path or by prefix fingerprint through
+    indexes. Entries written by the monitors also record the id of the
+    monitored root they were found under, and the size of the file when
+    it was hashed.
+
+    Every insert, by any connection, gives the row the next number of a
+    sequence kept in the database. Unlike the rowid, which SQLite hands
+    out again once the last row is deleted, the sequence never goes back,
+    so readers catching up with hashes_since() never skip a new row.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " hash TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " location TEXT,"
+            " timestamp TEXT,"
+            " prefix TEXT,"
+            " root TEXT,"
+            " seq INTEGER,"
+            " size INTEGER)"
+        )
+        # Databases created before prefix fingerprints, roots, sequence numbers and sizes were recorded
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(hashes)")]
+        for column in ('prefix', 'root'):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE hashes ADD COLUMN {column} TEXT")
+        if 'size' not in columns:
+            self._conn.execute("ALTER TABLE hashes ADD COLUMN size INTEGER")
+        if 'seq' not in columns:
+            self._conn.execute("ALTER TABLE hashes ADD COLUMN seq INTEGER")
+            self._conn.execute("UPDATE hashes SET seq = rowid")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS hash_sequence (last INTEGER NOT NULL)")
+        self._conn.execute(
+            "INSERT INTO hash_sequence (last) SELECT COALESCE(MAX(seq), 0) FROM hashes "
+            "WHERE NOT EXISTS (SELECT 1 FROM hash_sequence)"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS hashes_sequence AFTER INSERT ON hashes BEGIN"
+            " UPDATE hash_sequence SET last = last + 1;"
+            " UPDATE hashes SET seq = (SELECT last FROM hash_sequence) WHERE rowid = NEW.rowid;"
+            " END"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_seq ON hashes (seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_name ON hashes (name)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_location ON hashes (location)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_prefix ON hashes (prefix)")
+        self._conn.commit()
+
+    def add(self, file_hash, name, location=None, timestamp=None, prefix=None, root=None, size=None):
+        """Insert or replace the entry for a hash."""
+        with self._lock:
+            self._conn.execute(_INSERT, (file_hash, name, location, timestamp, prefix, root, size))
+            self._conn.commit()
+
+    def add_many(self, entries):
+        """Insert (hash, name, location, timestamp[, prefix[, root[, size]]]) tuples in one transaction."""
+        entries = [tuple(entry) + (None,) * (len(COLUMNS) - len(entry)) for entry in entries]
+        with self._lock:
+            self._conn.executemany(_INSERT, entries)
+            self._conn.commit()
+
+    def remove(self, file_hash):
+        """Delete the entry for a hash, returns True if it existed."""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM hashes WHERE hash = ?", (file_hash,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def get(self, file_hash):
+        """Return the entry for a hash as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(f"{_SELECT} WHERE hash = ?", (file_hash,)).fetchone()
+        return _entry(row) if row else None
+
+    def find_by_name(self, name):
+        """Return every entry stored under a file name."""
+        with self._lock:
+            rows = self._conn.execute(f"{_SELECT} WHERE name = ? ORDER BY rowid", (name,)).fetchall()
+        return [_entry(row) for row in rows]
+
+    def find_by_location(self, location):
+        """Return every entry stored for a full path."""
+        with self._lock:
+            rows = self._conn.execute(f"{_SELECT} WHERE location = ? ORDER BY rowid", (location,)).fetchall()
+        return [_entry(row) for row in rows]
+
+    def find_by_prefix(self, prefix):
+        """Return the most recent entry with a prefix fingerprint, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"{_SELECT} WHERE prefix = ? ORDER BY rowid DESC LIMIT 1", (prefix,)
+            ).fetchone()
+        return _entry(row) if row else None
+
+    def prefixes(self):
+        """Return a dict mapping each recorded prefix fingerprint to the hash of its file."""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT prefix, hash FROM hashes WHERE prefix IS NOT NULL ORDER BY rowid"
+            ).fetchall())
+
+    def items(self):
+        """Return all (hash, name) pairs in insertion order."""
+        with self._lock:
+            return self._conn.execute("SELECT hash, name FROM hashes ORDER BY rowid").fetchall()
+
+    def iter_entries(self, batch_size=10000):
+        """Yield every entry in insertion order, reading batch_size rows at a time."""
+        for _, entry in self.entries_since(-1, batch_size):
+            yield entry
+
+    def entries_since(self, seq, batch_size=10000):
+        """Yield (sequence number, entry) for the entries written after seq, oldest first."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT seq, {', '.join(COLUMNS)} FROM hashes WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (seq, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], _entry(row[1:])
+            seq = rows[-1][0]
+
+    def hashes_since(self, seq, batch_size=10000):
+        """Yield (sequence number, hash) for the entries written after seq, oldest first."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, hash FROM hashes WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (seq, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            seq = rows[-1][0]
+
+    def __contains__(self, file_hash):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM hashes WHERE hash = ?", (file_hash,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def compact(self):
+        """Fold the write-ahead log into the database and reclaim free pages."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _entry(row):
+    return dict(zip(COLUMNS, row))
+
+def migrate_hash_file(txt_path, store):
+    """Import a legacy "hash,filename" file_hashes.txt, returns the number of entries."""
+    entries = []
+    with open(txt_path, "r", encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            parts = line.strip().split(",", 1)
+            if len(parts) == 2:
+                file_hash, file_name = parts
+                entries.append((file_hash, file_name, None, None))
+            else:
+                print(f"Skipping malformed line: {line.strip()}")
+    store.add_many(entries)
+    return len(entries)
+
+def migrate_metadata_file(json_path, store):
+    """Import a legacy file_metadata.json (hash -> location/timestamp), returns the number of entries."""
+    with open(json_path, "r") as f:
+        metadata = json.load(f)
+    entries = []
+    for file_hash, info in metadata.items():
+        location = info.get('location', '')
+        # Locations were written with both separators, take the last component either way
+        name = location.replace('\\', '/').rsplit('/', 1)[-1]
+        entries.append((file_hash, name, location, info.get('timestamp')))
+    store.add_many(entries)
+    return len(entries)
+
+def open_hash_store(db_path, legacy_txt=None, legacy_json=None):
+    """
+    Open a hash store, migrating legacy files the first time it is created.
+
+    Args:
+        db_path: Database file to open or create.
+        legacy_txt: Optional file_hashes.txt to import into a new database.
+        legacy_json: Optional file_metadata.json to import into a new database.
+
+    Returns:
+        HashStore instance.
+    """
+    is_new = not os.path.exists(db_path)
+    store = HashStore(db_path)
+    if is_new:
+        if legacy_txt and os.path.exists(legacy_txt):
+            count = migrate_hash_file(legacy_txt, store)
+            print(f"Migrated {count} entries from {legacy_txt} to {db_path}")
+        if legacy_json and os.path.exists(legacy_json):
+            count = migrate_metadata_file(legacy_json, store)
+            print(f"Migrated {count} entries from {legacy_json} to {db_path}")
+    return store
+
+if __name__ == "__main__":
+    # One-shot migration: python hash_store.py <store.db> <file_hashes.txt|file_metadata.json>...
+    if len(sys.argv) < 3:
+        print("Usage: python hash_store.py <store.db> <file_hashes.txt|file_metadata.json>...")
+        sys.exit(1)
+    store = HashStore(sys.argv[1])
+    for legacy_path in sys.argv[2:]:
+        if legacy_path.endswith(".json"):
+            count = migrate_metadata_file(legacy_path, store)
+        else:
+            count = migrate_hash_file(legacy_path, store)
+        print(f"Migrated {count} entries from {legacy_path}")
+    store.compact()
+    store.close()
@@ -0,0 +1,427 @@
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import secrets
+import threading
+import socketserver
+from itertools import islice
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hash_store import HashStore
+
+# Stores served by default: the monitors' hash database (DDAS_HASH_DB) and
+# the metadata store `ddas check` keeps in the current directory
+DEFAULT_STORES = [
+    os.environ.get("DDAS_HASH_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_hashes.db")),
+    "file_metadata.db",
+]
+
+# Port on localhost, set DDAS_LOOKUP_PORT to use another one
+DEFAULT_PORT = int(os.environ.get("DDAS_LOOKUP_PORT", "8765"))
+
+# Secret every HTTP client sends in TOKEN_HEADER, created on the first start
+# (in the same directory as the scripts), set DDAS_LOOKUP_TOKEN_FILE to use another path
+TOKEN_FILE = os.environ.get(
+    "DDAS_LOOKUP_TOKEN_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookup_token.txt"),
+)
+TOKEN_HEADER = "X-DDAS-Token"
+
+# Seconds between reads of the entries written since the last one
+SYNC_INTERVAL = 1
+
+# Seconds between full reloads, which also drop deleted entries
+RELOAD_INTERVAL = 600
+
+# Entries returned per size or name query
+MAX_MATCHES = 20
+
+# Entry fields sent to clients
+FIELDS = ('hash', 'name', 'location', 'timestamp', 'root', 'size')
+
+class LookupIndex:
+    """In-memory index of hash stores answering "have I downloaded this before".
+
+    Every entry is held in a dict by hash, with name and size indexes next
+    to it, so a lookup is a few dict accesses and never touches the disk.
+    Sizes come from the stores, which record them when a file is hashed.
+    Entries written before that get one stat of their location, the first
+    time they are read, and keep that size across reloads (entries
+    imported by name only have none). New entries reach the index through
+    sync(), which reads the rows written since the last call, by the
+    stores' sequence numbers so none is skipped; reload()
+    rebuilds it from scratch, away from the lock, to also drop entries
+    deleted from the stores.
+    """
+
+    def __init__(self, stores):
+        """
+        Args:
+            stores: HashStores to serve, a hash in several of them is answered from the last.
+        """
+        self.stores = stores
+        self._lock = threading.Lock()
+        self._by_hash, self._by_name, self._by_size, self._last_seqs = self._build()
+        self.loaded = time.time()
+        self.lookups = 0
+
+    def _build(self, previous=None):
+        """Read every store into fresh indexes, reusing the sizes found in previous."""
+        by_hash, by_name, by_size = {}, {}, {}
+        last_seqs = [-1] * len(self.stores)
+        self._read_new(by_hash, by_name, by_size, last_seqs, previous or {})
+        return by_hash, by_name, by_size, last_seqs
+
+    def _read_new(self, by_hash, by_name, by_size, last_seqs, previous=None):
+        """Add the entries written after last_seqs to the indexes, returns how many."""
+        previous = by_hash if previous is None else previous
+        added = 0
+        for i, store in enumerate(self.stores):
+            for seq, entry in store.entries_since(last_seqs[i]):
+                _put(by_hash, by_name, by_size, _client_entry(entry, previous))
+                last_seqs[i] = seq
+                added += 1
+        return added
+
+    def sync(self):
+        """Pick up the entries written to the stores since the last sync, returns how many."""
+        with self._lock:
+            return self._read_new(self._by_hash, self._by_name, self._by_size, self._last_seqs)
+
+    def reload(self):
+        """Rebuild the indexes from the stores, lookups keep using the old ones meanwhile."""
+        # Only the refresh thread writes the indexes, the old one can be read without the lock
+        indexes = self._build(self._by_hash)
+        with self._lock:
+            self._by_hash, self._by_name, self._by_size, self._last_seqs = indexes
+            self.loaded = time.time()
+
+    def lookup(self, query):
+        """
+        Answer one query.
+
+        Args:
+            query: Dict with a 'hash', or a 'size' and/or 'name'. A hash is
+                matched exactly, otherwise entries must match every field given.
+
+        Returns:
+            {'known': bool, 'matches': [entry, ...]}, at most MAX_MATCHES entries.
+        """
+        file_hash = query.get('hash')
+        size = query.get('size')
+        name = query.get('name')
+        with self._lock:
+            self.lookups += 1
+            if file_hash is not None:
+                entry = self._by_hash.get(str(file_hash).lower())
+                matches = [entry] if entry is not None else []
+            else:
+                candidates = None
+                if name is not None:
+                    candidates = self._by_name.get(_name_key(name), set())
+                if size is not None:
+                    sized = self._by_size.get(int(size), set())
+                    candidates = sized if candidates is None else candidates & sized
+                if candidates is None:
+                    raise ValueError("a query needs a hash, a size or a name")
+                matches = [self._by_hash[h] for h in islice(candidates, MAX_MATCHES)]
+        return {'known': bool(matches), 'matches': matches}
+
+    def lookup_many(self, queries):
+        """Answer a batch of queries, an invalid one gets {'error': ...} instead of failing the batch."""
+        results = []
+        for query in queries:
+            try:
+                results.append(self.lookup(query))
+            except (AttributeError, TypeError, ValueError) as e:
+                results.append({'error': str(e)})
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._by_hash), 'names': len(self._by_name), 'sizes': len(self._by_size),
+                    'lookups': self.lookups, 'loaded': self.loaded,
+                    'stores': [store.db_path for store in self.stores]}
+
+    def __len__(self):
+        return len(self._by_hash)
+
+def _name_key(name):
+    return os.path.normcase(os.path.basename(str(name)))
+
+def _client_entry(entry, previous):
+    """
+    Entry as sent to clients. Without a stored size, the size indexed for
+    the same hash and location in previous is kept, else the file at the
+    location is stat'ed if it still exists.
+    """
+    entry = {field: entry.get(field) for field in FIELDS}
+    if entry['size'] is None and entry['location']:
+        old = previous.get(entry['hash'])
+        if old is not None and old['location'] == entry['location']:
+            entry['size'] = old['size']
+        else:
+            try:
+                entry['size'] = os.stat(entry['location']).st_size
+            except OSError:
+                pass
+    return entry
+
+def _put(by_hash, by_name, by_size, entry):
+    """Index an entry, replacing the previous one for its hash."""
+    old = by_hash.pop(entry['hash'], None)
+    if old is not None:
+        by_name.get(_name_key(old['name']), set()).discard(old['hash'])
+        if old['size'] is not None:
+            by_size.get(old['size'], set()).discard(old['hash'])
+    by_hash[entry['hash']] = entry
+    by_name.setdefault(_name_key(entry['name']), set()).add(entry['hash'])
+    if entry['size'] is not None:
+        by_size.setdefault(entry['size'], set()).add(entry['hash'])
+
+def start_refreshing(index, sync_interval=SYNC_INTERVAL, reload_interval=RELOAD_INTERVAL):
+    """
+    Keep an index up to date on a daemon thread.
+
+    Returns:
+        threading.Event, set it to stop refreshing.
+    """
+    stop = threading.Event()
+
+    def run():
+        last_reload = time.monotonic()
+        while not stop.wait(sync_interval):
+            try:
+                if time.monotonic() - last_reload >= reload_interval:
+                    index.reload()
+                    last_reload = time.monotonic()
+                else:
+                    index.sync()
+            except Exception as e:
+                print(f"Could not refresh the lookup index: {e}")
+
+    threading.Thread(target=run, name="lookup-refresh", daemon=True).start()
+    return stop
+
+def handle_request(index, request):
+    """Answer a decoded request: one query, or {'queries': [...]} for a batch."""
+    if not isinstance(request, dict):
+        raise ValueError("a request is a JSON object")
+    if 'queries' in request:
+        return {'results': index.lookup_many(request['queries'])}
+    return index.lookup(request)
+
+def check_download(downloads, request):
+    """Answer a /downloads/check request from the extension."""
+    return downloads.check(request.get('url'), request.get('final_url'), request.get('etag'),
+                           request.get('content_length'), request.get('name'))
+
+def record_download(downloads, request):
+    """Store a /downloads/record request from the extension."""
+    if not request.get('path'):
+        raise ValueError("a record needs the path of the download")
+    downloads.record(request['path'], request.get('url'), request.get('final_url'), request.get('etag'),
+                     request.get('content_length'))
+    return {'recorded': request['path']}
+
+# HTTP paths of the download index and the functions answering them
+DOWNLOAD_ROUTES = {
+    '/downloads/check': check_download,
+    '/downloads/record': record_download,
+}
+
+class LookupHTTPServer(ThreadingHTTPServer):
+    """Lookups over HTTP on localhost.
+
+    GET /lookup?hash=... (or size=...&name=...) answers one query, POST
+    /lookup takes a JSON query or {"queries": [...]} for a batch, and GET
+    /stats describes the index.
+
+    With a DownloadIndex, the browser extension also posts to
+    /downloads/check a download about to start ({"url", "final_url",
+    "etag", "content_length", "name"}, see DownloadIndex.check), and to
+    /downloads/record one that completed (the same fields and "path").
+
+    Any web page can make the browser send requests to localhost, so a
+    request is refused unless its Host is this server (no DNS rebinding),
+    its Origin is missing or an allowed extension, it carries the token
+    in TOKEN_HEADER, and a POST body is declared application/json (pages
+    can only send that after a CORS preflight, which is never answered).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, index, port=DEFAULT_PORT, host="127.0.0.1", downloads=None, token=None,
+                 extension_ids=()):
+        """
+        Args:
+            token: Secret clients must send, None to accept requests without one.
+            extension_ids: Browser extensions allowed as Origin, any extension if empty.
+        """
+        self.index = index
+        self.downloads = downloads
+        self.token = token
+        self.extension_ids = set(extension_ids)
+        super().__init__((host, port), _LookupRequestHandler)
+
+    def allowed_hosts(self):
+        port = self.server_address[1]
+        hosts = {f"127.0.0.1:{port}", f"localhost:{port}"}
+        if port == 80:
+            hosts.update(("127.0.0.1", "localhost"))
+        return hosts
+
+    def allows_origin(self, origin):
+        scheme, _, extension_id = origin.partition("://")
+        if scheme not in ("chrome-extension", "moz-extension"):
+            return False
+        return not self.extension_ids or extension_id.rstrip("/") in self.extension_ids
+
+class _LookupRequestHandler(BaseHTTPRequestHandler):
+    def _refusal(self, post=False):
+        """Reason to refuse the request, None if it may be answered."""
+        if self.headers.get("Host", "").lower() not in self.server.allowed_hosts():
+            return 403, "unexpected Host"
+        origin = self.headers.get("Origin")
+        if origin is not None and not self.server.allows_origin(origin):
+            return 403, "origin not allowed"
+        token = self.server.token
+        if token is not None and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode(),
+                                                         token.encode()):
+            return 403, f"missing or wrong {TOKEN_HEADER}"
+        if post and self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            return 415, "requests must be application/json"
+        return None
+
+    def do_GET(self):
+        refusal = self._refusal()
+        if refusal is not None:
+            self._reply(refusal[0], {'error': refusal[1]})
+            return
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self._reply(200, self.server.index.stats())
+        elif url.path == "/lookup":
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            self._answer(query)
+        else:
+            self._reply(404, {'error': "not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == "/lookup":
+            handler = handle_request
+        elif path in DOWNLOAD_ROUTES and self.server.downloads is not None:
+            handler = DOWNLOAD_ROUTES[path]
+        else:
+            self._reply(404, {'error': "not found"})
+            return
+        refusal = self._refusal(post=True)
+        if refusal is not None:
+            self._reply(refusal[0], {'error': refusal[1]})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError as e:
+            self._reply(400, {'error': f"invalid JSON: {e}"})
+            return
+        self._answer(request, handler)
+
+    def _answer(self, request, handler=handle_request):
+        target = self.server.index if handler is handle_request else self.server.downloads
+        try:
+            self._reply(200, handler(target, request))
+        except (AttributeError, TypeError, ValueError) as e:
+            self._reply(400, {'error': str(e)})
+
+    def _reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per lookup would drown the service output
+
+if hasattr(socket, "AF_UNIX"):
+    class LookupUnixServer(socketserver.ThreadingUnixStreamServer):
+        """Lookups over a UNIX socket: one JSON request per line, answered by one JSON line."""
+
+        daemon_threads = True
+
+        def __init__(self, index, socket_path):
+            self.index = index
+            if os.path.exists(socket_path):
+                os.remove(socket_path)  # Left over from a previous run
+            super().__init__(socket_path, _LookupStreamHandler)
+
+    class _LookupStreamHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    response = handle_request(self.server.index, json.loads(line))
+                except (AttributeError, TypeError, ValueError) as e:
+                    response = {'error': str(e)}
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+
+def load_token(path=TOKEN_FILE, create=True):
+    """Read the service token, creating a random one readable only by its owner if create is set, else None."""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+    token = secrets.token_urlsafe(24)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process created it meanwhile
+        return load_token(path, create=False)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+def query_service(queries, port=DEFAULT_PORT, timeout=2, token_file=TOKEN_FILE):
+    """
+    Send a batch of queries to a running service.
+
+    Returns:
+        One result per query as from LookupIndex.lookup, or None if the
+        service isn't running, so callers can fall back to their own lookup.
+    """
+    headers = {"Content-Type": "application/json"}
+    token = load_token(token_file, create=False)
+    if token is not None:
+        headers[TOKEN_HEADER] = token
+    request = Request(f"http://127.0.0.1:{port}/lookup", data=json.dumps({'queries': list(queries)}).encode(),
+                      headers=headers)
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.load(response)['results']
+    except OSError:
+        return None
+
+def open_stores(paths):
+    """Open the stores that exist among paths, a missing one is skipped rather than created."""
+    stores = []
+    for path in paths:
+        if os.path.exists(path):
+            stores.append(HashStore(path))
+        else:
+            print(f"Hash store not found, skipped: {path}")
+    return stores
+
+if __name__ == "__main__":
+    # Same as `python -m ddas serve`
+    from ddas.cli import main
+    sys.exit(main(["serve"] + sys.argv[1:]))
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets, slower samples go in a last open bucket
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Seconds between JSON dumps
+DUMP_INTERVAL = 10
+
+# Stages of a file traced through a monitor, each timed from the previous one
+STAGES = ('received', 'stable', 'hashed', 'checked', 'alerted')
+
+# Per-file traces kept for snapshots
+RECENT_TRACES = 50
+
+class Histogram:
+    """Fixed-bucket latency histogram, an observation costs one bisect and a few additions."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, the maximum for the last bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'max': round(self.max, 6),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.bounds + ("+Inf",), self.counts)},
+        }
+
+class Metrics:
+    """Counters, latency histograms and gauges of a long-running monitor.
+
+    Counters and histograms are updated in place on the hot path, under a
+    lock that is only contended while a snapshot is taken. Gauges are
+    functions evaluated at snapshot time, for values another object
+    already tracks (index size, Bloom filter answers, pending files).
+    snapshot() returns plain JSON-serialisable data for dump_metrics and
+    MetricsServer.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.recent = deque(maxlen=RECENT_TRACES)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def register(self, *names):
+        """Create counters at zero, so they are reported before their first event."""
+        with self._lock:
+            for name in names:
+                self.counters.setdefault(name, 0)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counter(self, name):
+        """Current value of a counter, 0 if it never counted."""
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def _histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds):
+        """Record a latency in the histogram called name."""
+        with self._lock:
+            self._histogram(name).observe(seconds)
+
+    def record(self, file_path, trace, outcome):
+        """
+        Record a finished FileTrace: one histogram per stage reached, named
+        after it ("stable" is the time from received to stable), plus "total".
+        """
+        durations = trace.durations()
+        with self._lock:
+            for name, seconds in durations.items():
+                self._histogram(name).observe(seconds)
+            self.recent.append({'path': file_path, 'outcome': outcome,
+                                'seconds': {name: round(seconds, 6) for name, seconds in durations.items()}})
+
+    def gauge(self, name, func):
+        """Report func() as name in every snapshot."""
+        self._gauges[name] = func
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+            recent = list(self.recent)
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {
+            'time': time.time(),
+            'uptime': round(time.time() - self.started, 3),
+            'counters': counters,
+            'gauges': gauges,
+            'latency_seconds': histograms,
+            'recent_files': recent,
+        }
+
+    def format_summary(self):
+        """One line per latency histogram for display."""
+        lines = []
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                if histogram.count:
+                    lines.append(f"{name}: {histogram.count} samples, mean {histogram.total / histogram.count * 1000:.1f} ms, "
+                                 f"p90 <= {histogram.quantile(0.9) * 1000:.1f} ms, max {histogram.max * 1000:.1f} ms")
+        return "\n".join(lines)
+
+class FileTrace:
+    """perf_counter timestamps of one file's way through a monitor, one per stage in STAGES."""
+
+    __slots__ = STAGES
+
+    def __init__(self):
+        self.received = time.perf_counter()
+        self.stable = self.hashed = self.checked = self.alerted = None
+
+    def mark(self, stage):
+        setattr(self, stage, time.perf_counter())
+
+    def durations(self):
+        """Seconds spent reaching each stage from the previous one reached, and in total."""
+        durations = {}
+        previous = self.received
+        for stage in STAGES[1:]:
+            timestamp = getattr(self, stage)
+            if timestamp is not None:
+                durations[stage] = timestamp - previous
+                previous = timestamp
+        durations['total'] = previous - self.received
+        return durations
+
+_dump_lock = threading.Lock()
+
+def dump_metrics(metrics, path):
+    """Write a snapshot to path, replacing the previous one atomically."""
+    tmp_path = f"{path}.tmp"
+    with _dump_lock:
+        with open(tmp_path, "w") as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+def start_dumping(metrics, path, interval=DUMP_INTERVAL):
+    """
+    Dump snapshots to path every interval seconds on a daemon thread.
+
+    Returns:
+        threading.Event, set it to stop dumping.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                dump_metrics(metrics, path)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+
+    threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+    return stop
+
+class MetricsServer(ThreadingHTTPServer):
+    """HTTP endpoint serving snapshots as JSON at /metrics, on localhost by default."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        self.metrics = metrics
+        super().__init__((host, port), _MetricsRequestHandler)
+
+    def start(self):
+        """Serve on a daemon thread, stop with shutdown()."""
+        threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True).start()
+        return self
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.metrics.snapshot()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Polled every few seconds, keep the monitor output readable
+
+def add_metrics_arguments(parser):
+    """Add the --metrics-port, --metrics-file and --metrics-interval options to an argparse parser."""
+    parser.add_argument("--metrics-port", type=int, help="serve metrics as JSON on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", help="dump metrics as JSON to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=DUMP_INTERVAL,
+                        help="seconds between metrics dumps (default: %(default)s)")
+
+def start_exporters(metrics, args):
+    """
+    Start the exporters asked for with add_metrics_arguments options.
+
+    Returns:
+        Function stopping them, writing a last dump.
+    """
+    stoppers = []
+    if args.metrics_port is not None:
+        server = MetricsServer(metrics, args.metrics_port).start()
+        print(f"Metrics: http://127.0.0.1:{server.server_address[1]}/metrics")
+        stoppers.append(server.shutdown)
+    if args.metrics_file:
+        stop = start_dumping(metrics, args.metrics_file, args.metrics_interval)
+        print(f"Metrics: {args.metrics_file} every {args.metrics_interval:g} s")
+        stoppers.append(stop.set)
+
+    def stop_all():
+        for stopper in stoppers:
+            stopper()
+        if args.metrics_file:
+            dump_metrics(metrics, args.metrics_file)
+    return stop_all
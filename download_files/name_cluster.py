@@ -0,0 +1,195 @@
+import os
+import sys
+import math
+import itertools
+from difflib import SequenceMatcher
+
+# Rarest trigrams of each name used as blocking keys by approximate clustering
+BLOCKING_TRIGRAMS = 5
+
+def name_similarity(name1, name2):
+    """Calculate similarity ratio between two filenames (without extension)."""
+    name1_base = os.path.splitext(name1)[0]
+    name2_base = os.path.splitext(name2)[0]
+    return SequenceMatcher(None, name1_base, name2_base).ratio()
+
+def bigram_tokens(text):
+    """Character bigrams of a string, numbered per occurrence so repeats stay distinct."""
+    counts = {}
+    tokens = []
+    for i in range(len(text) - 1):
+        gram = text[i:i + 2]
+        counts[gram] = counts.get(gram, 0) + 1
+        tokens.append((gram, counts[gram]))
+    return tokens
+
+def cluster_similar_names(paths, threshold=0.8, exact=True):
+    """
+    Group paths whose file names have a similarity ratio >= threshold.
+
+    Groups are built like comparing every pair in order: each path not yet
+    grouped starts a group and takes every later ungrouped path whose name
+    reaches the threshold against its own. Only plausible pairs are compared
+    though, and every comparison uses the same SequenceMatcher ratio as
+    name_similarity.
+
+    In exact mode the result is identical to comparing all pairs. SequenceMatcher's
+    ratio is 2 * M / T, with M matched characters and T the combined length.
+    Matches form blocks separated by at least one unmatched character, so two
+    names reaching the threshold share at least (1.5 * threshold - 1) * T - 1
+    bigrams. Above a threshold of 2/3 that bound is positive except for very
+    short pairs, and a prefix filter on bigrams ordered rarest first finds
+    every pair that can reach it. At lower thresholds names are only
+    filtered by length, since the ratio can't exceed 2 * min(len1, len2) / T.
+
+    With exact=False, candidates are only names sharing a pair of their rarest
+    trigrams. This scales to directories with 100k+ files, at the cost of
+    occasionally missing a pair with few trigrams in common.
+
+    Args:
+        paths: File paths, compared by base name without extension.
+        threshold: Minimum SequenceMatcher ratio (0-1), as name_similarity_threshold.
+        exact: Find every matching pair (True) or use rare trigram candidates (False).
+
+    Returns:
+        List of groups (lists of paths) with more than one path, in order.
+    """
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    token_sets = [frozenset(bigram_tokens(stem)) for stem in stems]
+
+    # Pairs this short can reach the threshold without sharing any bigram
+    short_limit = 2 / (3 * threshold - 2) + 1e-9 if threshold > 2 / 3 else math.inf
+    if exact:
+        candidates_for = _prefix_candidates(stems, token_sets, threshold, short_limit)
+    else:
+        candidates_for = _rare_trigram_candidates(stems, short_limit)
+
+    processed = [False] * len(paths)
+    groups = []
+    for i, stem in enumerate(stems):
+        if processed[i]:
+            continue
+        processed[i] = True
+
+        current_group = [paths[i]]
+        for j in sorted(candidates_for(i)):
+            if processed[j] or _length_bound(len(stem), len(stems[j])) < threshold:
+                continue
+            total_length = len(stem) + len(stems[j])
+            # Not enough shared bigrams for this pair to reach the threshold
+            if total_length > short_limit and \
+                    len(token_sets[i] & token_sets[j]) < _pair_overlap(total_length, threshold):
+                continue
+            if SequenceMatcher(None, stem, stems[j]).ratio() >= threshold:
+                current_group.append(paths[j])
+                processed[j] = True
+
+        if len(current_group) > 1:
+            groups.append(current_group)
+
+    return groups
+
+def _prefix_candidates(stems, token_sets, threshold, short_limit):
+    """Candidate function finding every later name that can reach the threshold."""
+    if short_limit == math.inf:
+        by_length = {}
+        for i, stem in enumerate(stems):
+            by_length.setdefault(len(stem), []).append(i)
+
+        def candidates_for(i):
+            # Every length that could still reach the threshold
+            return {j for length, indices in by_length.items()
+                    if _length_bound(len(stems[i]), length) >= threshold
+                    for j in indices if j > i}
+        return candidates_for
+
+    frequency = {}
+    for tokens in token_sets:
+        for token in tokens:
+            frequency[token] = frequency.get(token, 0) + 1
+
+    prefixes = []
+    postings = {}
+    for i, tokens in enumerate(token_sets):
+        ordered = sorted(tokens, key=lambda token: (frequency[token], token))
+        prefix = ordered[:max(0, len(ordered) - _min_overlap(len(stems[i]), threshold) + 1)]
+        prefixes.append(prefix)
+        for token in prefix:
+            postings.setdefault(token, []).append(i)
+
+    short_for = _short_candidates(stems, short_limit)
+
+    def candidates_for(i):
+        found = {j for token in prefixes[i] for j in postings[token] if j > i}
+        found.update(short_for(i))
+        return found
+    return candidates_for
+
+def _rare_trigram_candidates(stems, short_limit):
+    """Candidate function returning later names sharing two of their rarest trigrams."""
+    trigram_sets = [{stem[k:k + 3] for k in range(len(stem) - 2)} for stem in stems]
+    frequency = {}
+    for trigrams in trigram_sets:
+        for gram in trigrams:
+            frequency[gram] = frequency.get(gram, 0) + 1
+
+    keys = []
+    postings = {}
+    for i, trigrams in enumerate(trigram_sets):
+        rarest = sorted(trigrams, key=lambda gram: (frequency[gram], gram))[:BLOCKING_TRIGRAMS]
+        # Pairs of rare trigrams are far more selective than single ones
+        name_keys = list(itertools.combinations(sorted(rarest), 2)) or [tuple(rarest)]
+        keys.append(name_keys)
+        for key in name_keys:
+            postings.setdefault(key, []).append(i)
+
+    # Names this short have no trigram to block on, compare them among themselves
+    short_for = _short_candidates(stems, 4)
+
+    def candidates_for(i):
+        found = {j for key in keys[i] for j in postings[key] if j > i}
+        found.update(short_for(i))
+        return found
+    return candidates_for
+
+def _short_candidates(stems, pair_limit):
+    """Candidate function returning later names whose combined length is at most pair_limit."""
+    short = [i for i, stem in enumerate(stems) if len(stem) <= pair_limit]
+    short_set = set(short)
+
+    def candidates_for(i):
+        if i not in short_set:
+            return ()
+        return [j for j in short if j > i and len(stems[i]) + len(stems[j]) <= pair_limit]
+    return candidates_for
+
+def _length_bound(len1, len2):
+    """Highest ratio two strings of these lengths can reach."""
+    if len1 + len2 == 0:
+        return 1.0
+    return 2.0 * min(len1, len2) / (len1 + len2)
+
+def _pair_overlap(total_length, threshold):
+    """Fewest bigrams two names of this combined length share when their ratio reaches threshold."""
+    return math.ceil((1.5 * threshold - 1) * total_length - 1 - 1e-9)
+
+def _min_overlap(length, threshold):
+    """Fewest bigrams a name of this length shares with any name it can match, at least 1."""
+    # Rounded down slightly so float error never makes the filter too strict
+    shortest_partner = math.ceil(length * threshold / (2 - threshold) - 1e-9)
+    return max(1, _pair_overlap(length + shortest_partner, threshold))
+
+def cluster_directory(directory, threshold=0.8, exact=False):
+    """Cluster every file under a directory by name similarity."""
+    paths = [os.path.join(root, file_name) for root, _, files in os.walk(directory) for file_name in files]
+    return cluster_similar_names(paths, threshold, exact)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python name_cluster.py <directory> [threshold]")
+        sys.exit(1)
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
+    for group_num, group in enumerate(cluster_directory(sys.argv[1], threshold), 1):
+        print(f"\nGroup {group_num} (similar names):")
+        for file_path in group:
+            print(f"  {file_path}")
@@ -0,0 +1,397 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# Suffixes added to re-downloaded or copied files, applied in this order
+DUPLICATE_PATTERNS = [re.compile(pattern) for pattern in (
+    r'\s*\(\d+\)$',           # (1), (2), etc.
+    r'\s*-\s*copy$',          # -copy, - copy
+    r'\s*_copy$',             # _copy
+    r'\s*-\s*v\d+$',          # -v1, -v2, - v1
+    r'\s*_v\d+$',             # _v1, _v2
+    r'\s*-\s*\d+$',           # -1, -2, - 1
+    r'\s*_\d+$',              # _1, _2
+    r'\s*-\s*duplicate$',     # -duplicate
+    r'\s*_duplicate$',        # _duplicate
+    r'\s*\s+copy$',           # space copy
+)]
+
+# Trailing numbers like text1, text_1, text-v1, tried in this order
+NUMBERED_PATTERNS = [re.compile(pattern) for pattern in (
+    r'^(.+?)v?[-_\s]*(\d+)$',
+    r'^(.+?)[-_\s]*v[-_\s]*(\d+)$',
+)]
+
+SEPARATORS = re.compile(r'[-_\s]+')
+
+class NameSignature:
+    """Everything is_similar_filename needs from one name, computed once."""
+
+    __slots__ = ('ext', 'base', 'clean', 'number_base', 'number', 'normalized')
+
+    def __init__(self, file_name):
+        name, ext = os.path.splitext(file_name)
+        self.ext = ext.lower()
+        self.base = name.lower().strip()
+
+        clean = self.base
+        for pattern in DUPLICATE_PATTERNS:
+            clean = pattern.sub('', clean).strip()
+        self.clean = clean
+
+        self.number_base, self.number = clean, None
+        for pattern in NUMBERED_PATTERNS:
+            match = pattern.match(clean.strip())
+            if match:
+                self.number_base = match.group(1).strip().rstrip('_-')
+                self.number = match.group(2)
+                break
+
+        self.normalized = SEPARATORS.sub('', clean)
+
+    # Stored with a name so it needn't be parsed again, in this order
+    FIELDS = ('ext', 'base', 'clean', 'number_base', 'number', 'normalized')
+
+    def fields(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    @classmethod
+    def from_fields(cls, values):
+        sig = cls.__new__(cls)
+        for field, value in zip(cls.FIELDS, values):
+            setattr(sig, field, value)
+        return sig
+
+def signatures_similar(sig1, sig2):
+    """Same decision as is_similar_filename, on precomputed signatures."""
+    # Must have same extension to be considered similar
+    if sig1.ext != sig2.ext:
+        return False
+
+    if sig1.base == sig2.base:
+        return True
+
+    # Same name once duplicate suffixes are removed
+    clean1, clean2 = sig1.clean, sig2.clean
+    if clean1 == clean2 and len(clean1) > 0:
+        return True
+
+    # Numbered sequences like "text1" vs "text2", "document_v1" vs "document_v2"
+    if sig1.number and sig2.number and sig1.number_base == sig2.number_base:
+        if len(sig1.number_base) >= 2:
+            return True
+
+    # 90% of characters match position by position, for longer names of close length
+    if len(clean1) >= 5 and len(clean2) >= 5 and abs(len(clean1) - len(clean2)) <= 2:
+        shorter_len = min(len(clean1), len(clean2))
+        matches = sum(1 for a, b in zip(clean1, clean2) if a == b)
+        if matches / shorter_len >= 0.9:
+            return True
+
+    # One is contained in the other with minimal differences
+    if len(clean1) >= 4 and len(clean2) >= 4:
+        normalized1, normalized2 = sig1.normalized, sig2.normalized
+        if normalized1 in normalized2 or normalized2 in normalized1:
+            shorter = min(len(normalized1), len(normalized2))
+            longer = max(len(normalized1), len(normalized2))
+            if (longer - shorter) <= max(2, shorter * 0.2):
+                return True
+
+    return False
+
+def is_similar_filename(file1, file2):
+    """Check if two filenames are similar - improved logic for better detection"""
+    return signatures_similar(NameSignature(file1), NameSignature(file2))
+
+def allowed_mismatches(length):
+    """Most differing positions the 90% rule accepts between names of this shorter length."""
+    mismatches = 0
+    while (length - mismatches - 1) / length >= 0.9:
+        mismatches += 1
+    return mismatches
+
+def contained_close(longer, shorter):
+    """True if a name of length shorter contained in one of length longer is similar to it."""
+    return (longer - shorter) <= max(2, shorter * 0.2)
+
+def close_substrings(text):
+    """Substrings of text whose containment in it is close enough to be similar."""
+    return {text[start:start + length]
+            for length in range(len(text) + 1) if contained_close(len(text), length)
+            for start in range(len(text) - length + 1)}
+
+def index_keys(sig):
+    """
+    Blocking keys stored for a name.
+
+    Exact keys cover equal, cleaned and numbered names, one key per
+    character position covers the 90% rule, and every close substring of
+    the separator-free name covers the containment rule.
+    """
+    keys = [('base', sig.ext, sig.base)]
+    if sig.clean:
+        keys.append(('clean', sig.ext, sig.clean))
+    if sig.number and len(sig.number_base) >= 2:
+        keys.append(('number', sig.ext, sig.number_base))
+    if len(sig.clean) >= 5:
+        keys.extend(('position', sig.ext, str(i), char) for i, char in enumerate(sig.clean))
+    if len(sig.clean) >= 4:
+        keys.append(('normalized', sig.ext, sig.normalized))
+        keys.extend(('within', sig.ext, text) for text in close_substrings(sig.normalized))
+    return keys
+
+def query_keys(sig):
+    """Keys to look up for a new name, a stored name is a candidate if it has any of them."""
+    keys = [key for key in index_keys(sig) if key[0] in ('base', 'clean', 'number')]
+    if len(sig.clean) >= 4:
+        # Stored names containing this one, then stored names it contains
+        keys.append(('within', sig.ext, sig.normalized))
+        keys.extend(('normalized', sig.ext, text) for text in close_substrings(sig.normalized))
+    return keys
+
+def position_keys(sig):
+    """Position keys of the characters every stored name of close length is compared on."""
+    if len(sig.clean) < 5:
+        return []
+    return [('position', sig.ext, str(i), char) for i, char in enumerate(sig.clean[:len(sig.clean) - 2])]
+
+def rarest_positions(sig, frequency):
+    """
+    Position keys to look up for a new name, and how many of them a similar name has.
+
+    A name the 90% rule accepts differs in at most allowed_mismatches
+    positions, so it has all but that many of any position keys. Looking
+    up twice the mismatches allowed plus one, rarest first, keeps out the
+    names that only share the shape of this one ("Screenshot 2024-...").
+
+    Args:
+        sig: NameSignature of the new name.
+        frequency: Function giving the number of names stored under a key.
+    """
+    mismatches = allowed_mismatches(len(sig.clean)) if sig.clean else 0
+    keys = sorted(position_keys(sig), key=frequency)[:2 * (mismatches + 1)]
+    return keys, len(keys) - mismatches
+
+class SimilarNameIndex:
+    """Finds stored names similar to a new one without comparing against all of them.
+
+    Candidates are blocked per extension: stored names with one of the
+    exact or containment keys of the new name, and stored names with
+    enough of its rarest position keys. Any pair is_similar_filename
+    accepts is a candidate, while thousands of names of the same shape
+    don't all become candidates of each other.
+    """
+
+    def __init__(self):
+        self._signatures = {}
+        self._order = {}
+        self._next = 0
+        self._keys = {}
+
+    def __contains__(self, file_name):
+        return file_name in self._signatures
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, file_name):
+        if file_name in self._signatures:
+            return
+        sig = NameSignature(file_name)
+        self._signatures[file_name] = sig
+        self._order[file_name] = self._next
+        self._next += 1
+        for key in index_keys(sig):
+            self._keys.setdefault(key, set()).add(file_name)
+
+    def remove(self, file_name):
+        sig = self._signatures.pop(file_name, None)
+        if sig is None:
+            return
+        del self._order[file_name]
+        for key in index_keys(sig):
+            bucket = self._keys.get(key)
+            if bucket is not None:
+                bucket.discard(file_name)
+                if not bucket:
+                    del self._keys[key]
+
+    def candidates(self, file_name):
+        """Stored names sharing a blocking key with file_name, oldest first."""
+        sig = NameSignature(file_name)
+        found = set()
+        for key in query_keys(sig):
+            found.update(self._keys.get(key, ()))
+        positions, required = rarest_positions(sig, lambda key: len(self._keys.get(key, ())))
+        counts = Counter()
+        for key in positions:
+            counts.update(self._keys.get(key, ()))
+        found.update(name for name, count in counts.items() if count >= required)
+        found.discard(file_name)
+        return sig, sorted(found, key=self._order.get)
+
+    def find_similar(self, file_name):
+        """Return the oldest stored name similar to file_name (other than itself), or None."""
+        sig, candidates = self.candidates(file_name)
+        for existing_name in candidates:
+            if signatures_similar(sig, self._signatures[existing_name]):
+                return existing_name
+        return None
+
+class StoredNameIndex:
+    """SimilarNameIndex kept in SQLite, so memory stays bounded with millions of names.
+
+    Uses the same blocking keys and returns the same answers. Names are
+    reference counted, since the same name can be stored under several
+    paths, and leave the index when the last one is removed. Each name is
+    stored with its signature, so candidates are compared without parsing
+    them again.
+    """
+
+    # Keys per query, below SQLite's bound variable limit
+    QUERY_KEYS = 500
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Indexes built before names were stored with their signature have other keys too
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(similar_names)")]
+        names = []
+        if columns and 'normalized' not in columns:
+            names = self._conn.execute("SELECT name, refs FROM similar_names ORDER BY rowid").fetchall()
+            self._conn.execute("DROP TABLE similar_names")
+            self._conn.execute("DROP TABLE IF EXISTS similar_keys")
+            self._conn.execute("DROP TABLE IF EXISTS similar_key_counts")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS similar_names ("
+            " name TEXT NOT NULL UNIQUE,"
+            " refs INTEGER NOT NULL,"
+            " ext TEXT NOT NULL,"
+            " base TEXT NOT NULL,"
+            " clean TEXT NOT NULL,"
+            " number_base TEXT NOT NULL,"
+            " number TEXT,"
+            " normalized TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS similar_keys ("
+            " key TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " PRIMARY KEY (key, name)) WITHOUT ROWID"
+        )
+        # Names per position key, to look up the rarest ones
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS similar_key_counts ("
+            " key TEXT PRIMARY KEY,"
+            " names INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        for file_name, refs in names:
+            self._insert(file_name, refs)
+        self._conn.commit()
+
+    def _insert(self, file_name, refs):
+        sig = NameSignature(file_name)
+        self._conn.execute("INSERT INTO similar_names VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (file_name, refs) + sig.fields())
+        keys = [_key_text(key) for key in index_keys(sig)]
+        self._conn.executemany("INSERT OR IGNORE INTO similar_keys VALUES (?, ?)",
+                               ((key, file_name) for key in keys))
+        self._conn.executemany(
+            "INSERT INTO similar_key_counts VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET names = names + 1",
+            ((key,) for key in set(keys) if key.startswith('position')),
+        )
+
+    def __contains__(self, file_name):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM similar_names WHERE name = ?", (file_name,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM similar_names").fetchone()[0]
+
+    def add(self, file_name):
+        self.add_many([file_name])
+
+    def add_many(self, file_names):
+        """Add names (or another reference to them) in one transaction."""
+        with self._lock:
+            for file_name in file_names:
+                updated = self._conn.execute(
+                    "UPDATE similar_names SET refs = refs + 1 WHERE name = ?", (file_name,)
+                ).rowcount
+                if not updated:
+                    self._insert(file_name, 1)
+            self._conn.commit()
+
+    def remove(self, file_name):
+        """Drop one reference to a name, the name leaves the index with its last one."""
+        with self._lock:
+            row = self._conn.execute("SELECT refs FROM similar_names WHERE name = ?", (file_name,)).fetchone()
+            if row is None:
+                return
+            if row[0] > 1:
+                self._conn.execute("UPDATE similar_names SET refs = refs - 1 WHERE name = ?", (file_name,))
+            else:
+                self._conn.execute("DELETE FROM similar_names WHERE name = ?", (file_name,))
+                keys = {_key_text(key) for key in index_keys(NameSignature(file_name))}
+                self._conn.executemany("DELETE FROM similar_keys WHERE key = ? AND name = ?",
+                                       ((key, file_name) for key in keys))
+                self._conn.executemany("UPDATE similar_key_counts SET names = names - 1 WHERE key = ?",
+                                       ((key,) for key in keys if key.startswith('position')))
+            self._conn.commit()
+
+    def candidates(self, file_name):
+        """Stored names that could be similar to file_name with their signatures, oldest first."""
+        sig = NameSignature(file_name)
+        columns = f"rowid, name, {', '.join(NameSignature.FIELDS)}"
+        found = {}
+        with self._lock:
+            keys = sorted({_key_text(key) for key in query_keys(sig)})
+            for start in range(0, len(keys), self.QUERY_KEYS):
+                batch = keys[start:start + self.QUERY_KEYS]
+                for row in self._conn.execute(
+                    f"SELECT {columns} FROM similar_names WHERE name IN"
+                    f" (SELECT name FROM similar_keys WHERE key IN ({', '.join('?' for _ in batch)}))",
+                    batch,
+                ):
+                    found[row[1]] = row
+
+            positions = [_key_text(key) for key in position_keys(sig)]
+            frequency = dict(self._conn.execute(
+                f"SELECT key, names FROM similar_key_counts WHERE key IN ({', '.join('?' for _ in positions)})",
+                positions,
+            ).fetchall())
+            positions, required = rarest_positions(sig, lambda key: frequency.get(_key_text(key), 0))
+            if positions:
+                for row in self._conn.execute(
+                    f"SELECT {columns} FROM similar_names WHERE name IN"
+                    f" (SELECT name FROM similar_keys WHERE key IN ({', '.join('?' for _ in positions)})"
+                    " GROUP BY name HAVING COUNT(*) >= ?)",
+                    [_key_text(key) for key in positions] + [required],
+                ):
+                    found[row[1]] = row
+        found.pop(file_name, None)
+        return sig, [(row[1], NameSignature.from_fields(row[2:])) for row in sorted(found.values())]
+
+    def find_similar(self, file_name):
+        """Return the oldest stored name similar to file_name (other than itself), or None."""
+        sig, candidates = self.candidates(file_name)
+        for existing_name, existing_sig in candidates:
+            if signatures_similar(sig, existing_sig):
+                return existing_name
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _key_text(key):
+    """Flatten a blocking key tuple for storage."""
+    return '\x1f'.join(key)
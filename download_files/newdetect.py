@@ -1,152 +1,43 @@
 import os
-import hashlib
+import sys
 import time
-import re
+import asyncio
+import sqlite3
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from hash_store import open_hash_store
+from file_hashing import hash_file
+from download_pipeline import DownloadPipeline, is_partial_download, is_temporary
+from tail_hash import PREFIX_SIZE, hash_with_prefix
+from root_index import RootIndex
+from hash_filter import HashFilter
+from download_index import DownloadIndex
+from metrics import FileTrace, Metrics, start_exporters
 
-DOWNLOAD_DIR = r"C:\Users\Manoj\Downloads"
+# DDAS_DOWNLOAD_DIR and DDAS_HASH_DB override the monitored folder and the hash database
+DOWNLOAD_DIR = os.environ.get("DDAS_DOWNLOAD_DIR", r"C:\Users\Manoj\Downloads")
 HASH_STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_hashes.txt")
+HASH_DB_FILE = os.environ.get("DDAS_HASH_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "file_hashes.db"))
+
+# Root id -> directory, every root is watched recursively and shares one index
+MONITORED_ROOTS = {"downloads": DOWNLOAD_DIR}
+
+_hash_store = None
 
 def calculate_hash(file_path):
     """Calculate MD5 hash of a file"""
-    hasher = hashlib.md5()
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(file_path, "md5")
     except Exception as e:
         print(f"Error calculating hash for {file_path}: {e}")
         return None
 
-def load_existing_hashes():
-    """Load existing file hashes from storage"""
-    if not os.path.exists(HASH_STORE_FILE):
-        return {}
-    
-    file_hashes = {}
-    try:
-        with open(HASH_STORE_FILE, "r", encoding='utf-8') as file:
-            for line in file.readlines():
-                if line.strip():
-                    parts = line.strip().split(",", 1)
-                    if len(parts) == 2:
-                        file_hash, file_name = parts
-                        file_hashes[file_hash] = file_name
-    except Exception as e:
-        print(f"Error loading hashes: {e}")
-    return file_hashes
-
-def save_hashes(hash_dict):
-    """Save file hashes to storage"""
-    try:
-        with open(HASH_STORE_FILE, "w", encoding='utf-8') as file:
-            for file_hash, file_name in hash_dict.items():
-                file.write(f"{file_hash},{file_name}\n")
-    except Exception as e:
-        print(f"Error saving hashes: {e}")
-
-def is_similar_filename(file1, file2):
-    """Check if two filenames are similar - improved logic for better detection"""
-    # Get extensions
-    name1, ext1 = os.path.splitext(file1)
-    name2, ext2 = os.path.splitext(file2)
-    
-    # Must have same extension to be considered similar
-    if ext1.lower() != ext2.lower():
-        return False
-    
-    # Convert to lowercase for comparison
-    base1 = name1.lower().strip()
-    base2 = name2.lower().strip()
-    
-    # If base names are exactly the same, they're similar
-    if base1 == base2:
-        return True
-    
-    # Remove common duplicate patterns
-    duplicate_patterns = [
-        r'\s*\(\d+\)$',           # (1), (2), etc.
-        r'\s*-\s*copy$',          # -copy, - copy
-        r'\s*_copy$',             # _copy
-        r'\s*-\s*v\d+$',          # -v1, -v2, - v1
-        r'\s*_v\d+$',             # _v1, _v2
-        r'\s*-\s*\d+$',           # -1, -2, - 1
-        r'\s*_\d+$',              # _1, _2
-        r'\s*-\s*duplicate$',     # -duplicate
-        r'\s*_duplicate$',        # _duplicate
-        r'\s*\s+copy$',           # space copy
-    ]
-    
-    clean1 = base1
-    clean2 = base2
-    
-    # Remove duplicate patterns from both filenames
-    for pattern in duplicate_patterns:
-        clean1 = re.sub(pattern, '', clean1).strip()
-        clean2 = re.sub(pattern, '', clean2).strip()
-    
-    # If cleaned names are the same, they're similar
-    if clean1 == clean2 and len(clean1) > 0:
-        return True
-    
-    # Check for numbered sequences like "text1" vs "text2", "document_v1" vs "document_v2"
-    def extract_base_and_number(text):
-        """Extract base text and trailing number"""
-        # Match patterns like: text1, text_1, text-1, text 1, textv1, text_v1, text-v1
-        patterns = [
-            r'^(.+?)v?[-_\s]*(\d+)$',      # Matches: text1, text_1, text-1, text 1, textv1, text_v1, text-v1
-            r'^(.+?)[-_\s]*v[-_\s]*(\d+)$', # Matches: text-v1, text_v1, text v1
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, text.strip())
-            if match:
-                base_part = match.group(1).strip().rstrip('_-')
-                number_part = match.group(2)
-                return base_part, number_part
-        
-        return text, None
-    
-    # Extract base and numbers
-    base1_clean, num1 = extract_base_and_number(clean1)
-    base2_clean, num2 = extract_base_and_number(clean2)
-    
-    # If both have numbers and same base, they're similar
-    if num1 and num2 and base1_clean == base2_clean:
-        # Must have meaningful base (at least 2 characters)
-        if len(base1_clean) >= 2:
-            return True
-    
-    # Check for very similar bases with small differences
-    # Only for longer filenames to avoid false positives
-    if len(clean1) >= 5 and len(clean2) >= 5:
-        # Calculate similarity for very close matches
-        if abs(len(clean1) - len(clean2)) <= 2:  # Length difference <= 2
-            # Check how many characters are the same from the beginning
-            shorter_len = min(len(clean1), len(clean2))
-            matches = sum(1 for i in range(shorter_len) if i < len(clean1) and i < len(clean2) and clean1[i] == clean2[i])
-            
-            # If 90% of characters match from the beginning, consider similar
-            if matches / shorter_len >= 0.9 and shorter_len >= 5:
-                return True
-    
-    # Special case: Check if one is a subset of another with minimal differences
-    if len(clean1) >= 4 and len(clean2) >= 4:
-        # Remove common separators and spaces for comparison
-        normalized1 = re.sub(r'[-_\s]+', '', clean1)
-        normalized2 = re.sub(r'[-_\s]+', '', clean2)
-        
-        # If one is contained in another and they're similar length
-        if (normalized1 in normalized2 or normalized2 in normalized1):
-            shorter = min(len(normalized1), len(normalized2))
-            longer = max(len(normalized1), len(normalized2))
-            # Only if the difference is small relative to the shorter string
-            if (longer - shorter) <= max(2, shorter * 0.2):  # Max 20% difference or 2 chars
-                return True
-    
-    return False
+def get_hash_store():
+    """Open the hash database, importing file_hashes.txt the first time"""
+    global _hash_store
+    if _hash_store is None:
+        _hash_store = open_hash_store(HASH_DB_FILE, legacy_txt=HASH_STORE_FILE)
+    return _hash_store
 
 def show_alert(message, is_error=False, is_modified=False):
     """Show alert in VS Code output"""
@@ -158,52 +49,67 @@ def show_alert(message, is_error=False, is_modified=False):
     else:
         print(f"\n[{timestamp}] [NEW FILE DETECTED] {message}")
 
-def populate_initial_hashes():
-    """Populate hash store with existing files in download directory"""
-    if not os.path.exists(DOWNLOAD_DIR):
-        print(f"Download directory {DOWNLOAD_DIR} does not exist!")
-        return {}
-    
-    file_hashes = {}
-    print("Scanning existing files in download directory...")
-    
-    try:
-        for filename in os.listdir(DOWNLOAD_DIR):
-            file_path = os.path.join(DOWNLOAD_DIR, filename)
-            if os.path.isfile(file_path):
-                file_hash = calculate_hash(file_path)
-                if file_hash:
-                    file_hashes[file_hash] = filename
-                    print(f"Added to database: {filename}")
-    except Exception as e:
-        print(f"Error scanning directory: {e}")
-    
-    save_hashes(file_hashes)
-    print(f"Initial scan complete. Found {len(file_hashes)} files.")
-    return file_hashes
+def populate_initial_hashes(file_hashes, roots, batch_size=500):
+    """Populate the hash index with the existing files under every monitored root"""
+    count = 0
+    batch = []
+    for root_id, directory in roots.items():
+        if not os.path.exists(directory):
+            print(f"Directory {directory} ({root_id}) does not exist!")
+            continue
+        print(f"Scanning existing files in {root_id}: {directory}...")
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not is_ignored_name(name)]
+            for filename in filenames:
+                if is_ignored_name(filename) or is_temporary(filename):
+                    continue
+                file_path = os.path.join(dirpath, filename)
+                try:
+                    # Fingerprint the start of the file in the same read
+                    file_hash, prefix = hash_with_prefix(file_path, "md5")
+                except OSError as e:
+                    print(f"Error calculating hash for {file_path}: {e}")
+                    continue
+                batch.append((file_hash, file_path, prefix))
+                count += 1
+                print(f"Added to database: {file_path}")
+                if len(batch) >= batch_size:
+                    file_hashes.add_many(batch)
+                    batch = []
+    if batch:
+        file_hashes.add_many(batch)
+    print(f"Initial scan complete. Found {count} files.")
+    return count
 
-def remove_old_hash_entry(hash_dict, filename):
-    """Remove old hash entry for a file that has been modified"""
-    hash_to_remove = None
-    for file_hash, stored_filename in hash_dict.items():
-        if stored_filename == filename:
-            hash_to_remove = file_hash
-            break
-    
-    if hash_to_remove:
-        del hash_dict[hash_to_remove]
-        return True
-    return False
+def is_ignored_name(file_name):
+    """Check for system and editor lock files that are never processed"""
+    return file_name.startswith('~') or file_name.startswith('.')
 
 class DownloadHandler(FileSystemEventHandler):
-    def __init__(self):
-        # Load existing hashes or create initial database
-        self.file_hashes = load_existing_hashes()
-        if not self.file_hashes:
-            self.file_hashes = populate_initial_hashes()
+    def __init__(self, roots=None, metrics=None):
+        self.roots = roots or MONITORED_ROOTS
+        # Outcome counters, latencies of every stage and index gauges, see metrics.py
+        self.metrics = metrics or Metrics()
+        self.metrics.register('content_duplicates', 'name_duplicates', 'prefix_matches',
+                              'unique_files', 'modified_files')
+        # Entries of every root are kept by full path in the hash database,
+        # lookups go to its indexes instead of an in-memory copy
+        store = get_hash_store()
+        # Most downloads are new, the Bloom filter answers those without a query
+        self.file_hashes = RootIndex(store, self.roots, HashFilter(store))
+        if len(self.file_hashes) == 0:
+            populate_initial_hashes(self.file_hashes, self.roots)
+        self.metrics.gauge('indexed_files', lambda: len(self.file_hashes))
+        self.metrics.gauge('index_lookups', lambda: self.file_hashes.lookups)
+        self.metrics.gauge('filter_hits', lambda: self.file_hashes.filter_hits)
+        # Size and hash of every new file, joined by path with the URL and ETag
+        # the browser extension records, so re-downloads are caught before they start
+        self.downloads = DownloadIndex()
         
-        self.processing_files = set()  # Track files being processed
-        self.file_modification_times = {}  # Track file modification times
+        # Events are coalesced per file, then hashed while downloading and
+        # checked on the pipeline, not on the observer thread
+        self.pipeline = DownloadPipeline(self.process_file, algorithm="md5", on_prefix=self.check_prefix,
+                                         metrics=self.metrics)
         super().__init__()
 
     def on_created(self, event):
@@ -214,25 +120,19 @@ class DownloadHandler(FileSystemEventHandler):
             
             print(f"File created: {file_name}")
             
-            # Skip temporary download files and system files
-            if (file_name.startswith('~') or 
-                file_name.startswith('.') or
-                file_name.endswith('.tmp') or 
-                file_name.endswith('.crdownload') or
-                file_name.endswith('.part') or
-                file_name.endswith('.download')):
-                print(f"Skipping temporary file: {file_name}")
+            # Skip system files
+            if is_ignored_name(file_name):
                 return
             
-            # Avoid processing the same file multiple times
-            if file_path in self.processing_files:
+            # Downloads are held until renamed to their final name, other temporary files are skipped
+            if is_partial_download(file_name):
+                print(f"Waiting for download to finish: {file_name}")
+            elif is_temporary(file_name):
+                print(f"Skipping temporary file: {file_name}")
                 return
             
-            self.processing_files.add(file_path)
-            
-            # Wait for file to be fully written
-            time.sleep(2)
-            self.monitor_and_process_file(file_path, is_new_file=True)
+            # Give the file 2 seconds without events to be fully written
+            self.pipeline.submit(file_path, is_new_file=True, delay=2)
 
     def on_moved(self, event):
         """Handle file move events (like browser completing download)"""
@@ -242,21 +142,13 @@ class DownloadHandler(FileSystemEventHandler):
             
             print(f"File moved to: {file_name}")
             
-            # Skip if it's a temporary file being moved
-            if (file_name.startswith('~') or 
-                file_name.startswith('.') or
-                file_name.endswith('.tmp')):
-                return
-            
-            # Avoid processing the same file multiple times
-            if dest_path in self.processing_files:
+            # Skip if it's a system or temporary file being moved
+            if is_ignored_name(file_name) or (is_temporary(file_name) and not is_partial_download(file_name)):
+                self.pipeline.discard(event.src_path)
                 return
-                
-            self.processing_files.add(dest_path)
             
-            # Wait for file to be fully written
-            time.sleep(2)
-            self.monitor_and_process_file(dest_path, is_new_file=True)
+            # Events seen under the old (e.g. .crdownload) name carry over to the new one
+            self.pipeline.move(event.src_path, dest_path, delay=2)
 
     def on_modified(self, event):
         """Handle file modification events"""
@@ -264,13 +156,13 @@ class DownloadHandler(FileSystemEventHandler):
             file_path = event.src_path
             file_name = os.path.basename(file_path)
             
-            # Skip temporary files and system files
-            if (file_name.startswith('~') or 
-                file_name.startswith('.') or
-                file_name.endswith('.tmp') or 
-                file_name.endswith('.crdownload') or
-                file_name.endswith('.part') or
-                file_name.endswith('.download')):
+            # Skip system and temporary files
+            if is_ignored_name(file_name) or (is_temporary(file_name) and not is_partial_download(file_name)):
+                return
+            
+            # Writes to a file that is already pending just push its processing back
+            if is_partial_download(file_name) or self.pipeline.is_pending(file_path):
+                self.pipeline.submit(file_path, is_new_file=False, delay=3)
                 return
             
             # Check if this is a text file that might have been edited
@@ -283,167 +175,148 @@ class DownloadHandler(FileSystemEventHandler):
             
             print(f"File modified: {file_name}")
             
-            # Avoid processing the same file multiple times rapidly
-            if file_path in self.processing_files:
-                return
-            
-            # Check if file was recently modified (debounce)
-            current_time = time.time()
-            if file_path in self.file_modification_times:
-                last_mod_time = self.file_modification_times[file_path]
-                if current_time - last_mod_time < 5:  # Wait 5 seconds between processing
-                    return
-            
-            self.file_modification_times[file_path] = current_time
-            self.processing_files.add(file_path)
-            
             # Wait a bit for file operations to complete
-            time.sleep(3)
-            self.monitor_and_process_file(file_path, is_new_file=False)
+            self.pipeline.submit(file_path, is_new_file=False, delay=3)
 
-    def monitor_and_process_file(self, file_path, is_new_file=True):
-        """Monitor a file until it's stable, then process it"""
+    def on_deleted(self, event):
+        """Handle file deletion events (like a cancelled download)"""
+        if not event.is_directory:
+            self.pipeline.discard(event.src_path)
+
+    def check_prefix(self, file_path, prefix):
+        """Flag a download whose first bytes match a stored file, runs on the pipeline loop"""
+        file_name = os.path.basename(file_path)
+        original = self.file_hashes.find_prefix(prefix)
+        if original is not None and original not in (file_path, file_name):
+            self.metrics.incr('prefix_matches')
+            show_alert(f"Likely duplicate: first {PREFIX_SIZE // (1024 * 1024)} MB of '{file_path}' "
+                       f"match '{original}' (still downloading)", is_error=True)
+
+    def process_file(self, file_path, file_hash, is_new_file=True, prefix=None, trace=None):
+        """Check a hashed file against the database, runs on the pipeline loop, returns the outcome"""
         file_name = os.path.basename(file_path)
+        print(f"Processing file: {file_name} ({'new' if is_new_file else 'modified'})")
+        if file_hash is None:
+            print(f"Could not calculate hash for: {file_name}")
+            return "unreadable"
         
+        # Check for duplicates
+        trace = trace or FileTrace()
+        if is_new_file:
+            outcome = self.check_for_duplicates(file_path, file_hash, prefix, trace)
+            self.record_download(file_path, file_hash)
+            return outcome
+        self.metrics.incr('modified_files')
+        return self.handle_modified_file(file_path, file_hash, prefix, trace)
+
+    def record_download(self, file_path, file_hash):
+        """Add a new file to the download index checked by the browser extension"""
         try:
-            # Wait for file to be stable (not changing size)
-            if not self.wait_for_stable_file(file_path):
-                return
-            
-            print(f"Processing file: {file_name} ({'new' if is_new_file else 'modified'})")
-            
-            # Calculate hash
-            file_hash = calculate_hash(file_path)
-            if file_hash is None:
-                print(f"Could not calculate hash for: {file_name}")
-                return
-            
-            # Check for duplicates
-            if is_new_file:
-                self.check_for_duplicates(file_name, file_hash)
-            else:
-                self.handle_modified_file(file_name, file_hash)
-            
-        except Exception as e:
-            print(f"Error processing {file_name}: {e}")
-        finally:
-            # Remove from processing set
-            self.processing_files.discard(file_path)
+            self.downloads.record_file(file_path, file_hash)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error recording download: {e}")
 
-    def wait_for_stable_file(self, file_path, max_wait=30):
-        """Wait for file to be stable (not changing size)"""
-        stable_count = 0
-        required_stable_checks = 3
-        wait_count = 0
-        
-        while stable_count < required_stable_checks and wait_count < max_wait:
-            try:
-                if not os.path.exists(file_path):
-                    return False
-                
-                current_size = os.path.getsize(file_path)
-                time.sleep(1)
-                wait_count += 1
-                
-                if not os.path.exists(file_path):
-                    return False
-                    
-                new_size = os.path.getsize(file_path)
-                
-                if current_size == new_size and current_size > 0:
-                    stable_count += 1
-                else:
-                    stable_count = 0
-                    
-            except Exception as e:
-                print(f"Error waiting for stable file: {e}")
-                time.sleep(1)
-                wait_count += 1
-        
-        return stable_count >= required_stable_checks
+    def remember_file(self, file_hash, file_path, prefix=None):
+        """Add a unique file to the hash database under its full path"""
+        try:
+            self.file_hashes.add(file_hash, file_path, prefix)
+        except Exception as e:
+            print(f"Error saving hashes: {e}")
 
-    def check_for_duplicates(self, file_name, file_hash):
-        """Check for content and filename duplicates for new files"""
-        content_duplicate = False
-        filename_duplicate = False
+    def check_for_duplicates(self, file_path, file_hash, prefix=None, trace=None):
+        """Check for content and filename duplicates for new files, returns the outcome"""
+        file_name = os.path.basename(file_path)
+        trace = trace or FileTrace()
         
-        # Check for content duplicates (same hash)
-        if file_hash in self.file_hashes:
-            original_name = self.file_hashes[file_hash]
-            if original_name != file_name:  # Don't compare with itself
-                show_alert(f"Content duplicate: '{file_name}' matches '{original_name}'", is_error=True)
-                content_duplicate = True
+        # Check for content duplicates (same hash), in any monitored root
+        original = self.file_hashes[file_hash] if file_hash in self.file_hashes else None
+        if original is not None and original not in (file_path, file_name):  # Don't compare with itself
+            trace.mark('checked')
+            self.metrics.incr('content_duplicates')
+            show_alert(f"Content duplicate: '{file_path}' matches '{original}'", is_error=True)
+            trace.mark('alerted')
+            return "content duplicate"
         
         # Check for similar filenames (even if content is different)
-        if not content_duplicate:  # Only check filename similarity if not content duplicate
-            for existing_hash, existing_name in self.file_hashes.items():
-                if existing_name != file_name and is_similar_filename(file_name, existing_name):
-                    show_alert(f"Similar filename: '{file_name}' resembles '{existing_name}'", is_error=True)
-                    filename_duplicate = True
-                    break
+        # The same name in another folder, or a name sharing a blocking key with this one
+        existing = self.file_hashes.find_similar_name(file_path)
+        trace.mark('checked')
+        if existing is not None:
+            self.metrics.incr('name_duplicates')
+            show_alert(f"Similar filename: '{file_path}' resembles '{existing}'", is_error=True)
+            trace.mark('alerted')
+            return "similar name"
         
         # If no duplicates found, it's a new file
-        if not content_duplicate and not filename_duplicate:
-            show_alert(f"New unique file: {file_name}")
-            # Add to hash database
-            self.file_hashes[file_hash] = file_name
-            save_hashes(self.file_hashes)
-            print(f"Added {file_name} to database")
+        self.metrics.incr('unique_files')
+        show_alert(f"New unique file: {file_name}")
+        trace.mark('alerted')
+        # Add to hash database
+        self.remember_file(file_hash, file_path, prefix)
+        print(f"Added {file_path} to database")
+        return "unique"
 
-    def handle_modified_file(self, file_name, new_file_hash):
-        """Handle modified files - check if content changed"""
-        # Check if this file already exists in our database with a different hash
-        old_hash_found = False
+    def handle_modified_file(self, file_path, new_file_hash, prefix=None, trace=None):
+        """Handle modified files - check if content changed, returns the outcome"""
+        file_name = os.path.basename(file_path)
+        trace = trace or FileTrace()
         
-        # Find the old hash for this filename
-        for existing_hash, existing_name in list(self.file_hashes.items()):
-            if existing_name == file_name:
-                if existing_hash != new_file_hash:
-                    # Content has changed!
-                    show_alert(f"Content modified: '{file_name}' - content changed from duplicate to unique", is_modified=True)
-                    
-                    # Remove old hash entry
-                    del self.file_hashes[existing_hash]
-                    
-                    # Check if new hash creates any duplicates
-                    if new_file_hash in self.file_hashes:
-                        original_name = self.file_hashes[new_file_hash]
-                        show_alert(f"Modified file now duplicates: '{file_name}' now matches '{original_name}'", is_error=True)
-                    else:
-                        # Add new hash
-                        self.file_hashes[new_file_hash] = file_name
-                        show_alert(f"File is now unique: '{file_name}' has unique content after modification")
-                    
-                    save_hashes(self.file_hashes)
-                    old_hash_found = True
-                    break
-                else:
-                    # Same hash, no content change
-                    print(f"File {file_name} modified but content unchanged")
-                    old_hash_found = True
-                    break
+        # Find the old hash for this path
+        existing_hash = self.file_hashes.hash_for(file_path)
         
         # If file not found in database, treat as new file
-        if not old_hash_found:
+        if existing_hash is None:
             print(f"Modified file {file_name} not in database, treating as new")
-            self.check_for_duplicates(file_name, new_file_hash)
+            return self.check_for_duplicates(file_path, new_file_hash, prefix, trace)
+        
+        if existing_hash == new_file_hash:
+            # Same hash, no content change
+            trace.mark('checked')
+            print(f"File {file_name} modified but content unchanged")
+            return "unchanged"
+        
+        # Content has changed!
+        show_alert(f"Content modified: '{file_name}' - content changed from duplicate to unique", is_modified=True)
+        
+        # Remove old hash entry
+        self.file_hashes.remove(existing_hash)
+        
+        # Check if new hash creates any duplicates
+        if new_file_hash in self.file_hashes:
+            original = self.file_hashes[new_file_hash]
+            trace.mark('checked')
+            self.metrics.incr('content_duplicates')
+            show_alert(f"Modified file now duplicates: '{file_name}' now matches '{original}'", is_error=True)
+            trace.mark('alerted')
+            return "content duplicate"
+        
+        # Add new hash
+        trace.mark('checked')
+        self.remember_file(new_file_hash, file_path, prefix)
+        show_alert(f"File is now unique: '{file_name}' has unique content after modification")
+        trace.mark('alerted')
+        return "unique"
 
-def start_monitoring():
-    """Start monitoring the download directory"""
+def start_monitoring(roots=None, metrics_args=None):
+    """Start monitoring every root directory, including subfolders, exporting metrics as metrics_args ask"""
+    roots = roots or MONITORED_ROOTS
     print("=" * 60)
     print("DOWNLOAD MONITOR STARTING")
     print("=" * 60)
     
-    if not os.path.exists(DOWNLOAD_DIR):
-        print(f"Error: Download directory {DOWNLOAD_DIR} does not exist!")
+    missing = [directory for directory in roots.values() if not os.path.exists(directory)]
+    if missing:
+        print(f"Error: Directory {missing[0]} does not exist!")
         return
     
-    event_handler = DownloadHandler()
+    event_handler = DownloadHandler(roots)
+    stop_exporters = start_exporters(event_handler.metrics, metrics_args) if metrics_args is not None else None
     observer = Observer()
-    observer.schedule(event_handler, DOWNLOAD_DIR, recursive=False)
+    for root_id, directory in roots.items():
+        observer.schedule(event_handler, directory, recursive=True)
+        print(f"Monitoring {root_id}: {directory}")
     
-    print(f"Monitoring downloads in: {DOWNLOAD_DIR}")
-    print(f"Hash database: {HASH_STORE_FILE}")
+    print(f"Hash database: {HASH_DB_FILE}")
     print(f"Loaded {len(event_handler.file_hashes)} existing files")
     print("Monitoring for: New files, File modifications, Duplicates")
     print("Press Ctrl+C to stop monitoring...")
@@ -452,13 +325,34 @@ def start_monitoring():
     observer.start()
     
     try:
-        while True:
-            time.sleep(1)
+        # Events are queued by the observer thread and processed concurrently here
+        asyncio.run(event_handler.pipeline.run())
     except KeyboardInterrupt:
         print("\nStopping monitor...")
+        print(f"Event pipeline: {event_handler.pipeline.format_stats()}")
+        print(event_handler.metrics.format_summary())
+        if stop_exporters is not None:
+            stop_exporters()
         observer.stop()
     observer.join()
     print("Monitor stopped.")
 
+def parse_roots(specs):
+    """Turn id=path or path arguments into a root id -> directory dict"""
+    roots = {}
+    for spec in specs:
+        root_id, sep, directory = spec.partition("=")
+        if not sep:
+            directory = spec
+            root_id = os.path.basename(os.path.normpath(directory)) or directory
+        base_id, n = root_id, 2
+        while root_id in roots:
+            root_id = f"{base_id}-{n}"
+            n += 1
+        roots[root_id] = directory
+    return roots
+
 if __name__ == "__main__":
-    start_monitoring()
\ No newline at end of file
+    # Same as `python -m ddas watch`
+    from ddas.cli import main
+    sys.exit(main(["watch"] + sys.argv[1:]))
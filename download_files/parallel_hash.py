@@ -0,0 +1,107 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+# Default pool size, hashlib releases the GIL so threads scale on fast disks
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Jobs queued per worker ahead of the one being consumed
+QUEUE_DEPTH = 4
+
+def worker_pool(workers=DEFAULT_WORKERS, use_processes=False):
+    """Return an executor to share between hash_files calls, None if workers <= 1."""
+    if workers <= 1:
+        return None
+    if use_processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+def hash_files(jobs, hash_func, workers=DEFAULT_WORKERS, use_processes=False, queue_depth=QUEUE_DEPTH,
+                cache=None, algorithm="sha256", executor=None):
+    """
+    Run hash_func(*job) for every job on a worker pool.
+
+    Jobs are pulled lazily from the iterable, so a directory walker can feed
+    the pool directly while at most workers * queue_depth jobs are in flight.
+    When a cache is given, lookups and stores happen in the calling thread
+    and only cache misses are handed to the workers.
+
+    Args:
+        jobs: Iterable of argument tuples, the first item being the file path.
+        hash_func: Function returning a digest. Must be a module-level
+            function when use_processes is True.
+        workers: Number of workers, 1 hashes in the calling thread.
+        use_processes: Use a process pool instead of threads.
+        queue_depth: Jobs queued per worker.
+        cache: Optional HashCache to serve unchanged files from.
+        algorithm: Name the digests are cached under.
+        executor: Optional pool from worker_pool, left running for the
+            next call. A new one is started and shut down otherwise, which
+            for processes costs more than hashing a few small files.
+
+    Yields:
+        (job, digest, from_cache) in the same order as the jobs, digest is
+        None if the file could not be read.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = worker_pool(workers, use_processes)
+
+    pending = deque()
+    try:
+        for job in jobs:
+            signature = None
+            if cache is not None:
+                try:
+                    signature = os.stat(job[0])
+                except OSError:
+                    pending.append((job, None, _done(None), False))
+                    continue
+                digest = cache.lookup(job[0], signature, algorithm)
+                if digest is not None:
+                    pending.append((job, None, _done(digest), True))
+                    continue
+
+            if executor is None:
+                try:
+                    future = _done(hash_func(*job))
+                except OSError:
+                    future = _done(None)
+            else:
+                future = executor.submit(hash_func, *job)
+            pending.append((job, signature, future, False))
+
+            while len(pending) >= workers * queue_depth:
+                yield _result(cache, algorithm, *pending.popleft())
+        while pending:
+            yield _result(cache, algorithm, *pending.popleft())
+    finally:
+        if own_executor and executor is not None:
+            executor.shutdown(cancel_futures=True)
+        else:
+            # Stopped early, drop the jobs queued on the shared pool
+            for _, _, future, _ in pending:
+                future.cancel()
+
+def _done(digest):
+    """Wrap an already known digest in a completed future."""
+    future = Future()
+    future.set_result(digest)
+    return future
+
+def _result(cache, algorithm, job, signature, future, from_cache):
+    """Collect a finished job, storing fresh digests in the cache."""
+    try:
+        digest = future.result()
+    except OSError:
+        return job, None, False
+    if signature is not None and digest is not None:
+        cache.store(job[0], signature, digest, algorithm)
+    return job, digest, from_cache
+
+def add_worker_arguments(parser):
+    """Add the --workers and --processes options to an argparse parser."""
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"number of hashing workers (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--processes", action="store_true",
+                        help="hash in worker processes instead of threads")
@@ -0,0 +1,140 @@
+import os
+from name_index import StoredNameIndex
+
+class RootIndex:
+    """Hash index shared by every monitored root, keyed by full path.
+
+    Entries are kept in a HashStore with their full path and the id of the
+    root they were found under, so files with the same name in different
+    folders no longer overwrite each other. Nothing is loaded into memory:
+    "is this hash anywhere I track" is a primary key lookup, path and
+    prefix lookups use the store's indexes, and name similarity uses a
+    StoredNameIndex in the same database. Memory use therefore stays flat
+    however many files the roots hold.
+
+    Entries imported from file_hashes.txt only know a file name; they are
+    returned by name and matched by name where a path is asked for.
+
+    With a HashFilter, hashes it rules out are reported missing without
+    querying the store. lookups and filter_hits count membership checks
+    and those the filter answered.
+    """
+
+    def __init__(self, store, roots, hash_filter=None):
+        """
+        Args:
+            store: HashStore holding the entries.
+            roots: Dict mapping root id to the directory monitored under it.
+            hash_filter: Optional HashFilter over store, kept up to date by add().
+        """
+        self.store = store
+        self.hash_filter = hash_filter
+        self.roots = {root_id: os.path.abspath(directory) for root_id, directory in roots.items()}
+        self.lookups = 0
+        self.filter_hits = 0
+        self._names = StoredNameIndex(store.db_path)
+        if len(self._names) == 0 and len(store):
+            # Stores written before names were indexed on disk
+            self._names.add_many(entry['name'] for entry in store.iter_entries())
+
+    def root_of(self, file_path):
+        """Return the id of the innermost root containing a path, or None."""
+        file_path = os.path.normcase(os.path.abspath(file_path))
+        best_id, best_length = None, -1
+        for root_id, directory in self.roots.items():
+            directory = os.path.normcase(directory)
+            if (file_path == directory or file_path.startswith(directory.rstrip(os.sep) + os.sep)) \
+                    and len(directory) > best_length:
+                best_id, best_length = root_id, len(directory)
+        return best_id
+
+    def __contains__(self, file_hash):
+        self.lookups += 1
+        if self.hash_filter is not None and file_hash not in self.hash_filter:
+            self.filter_hits += 1
+            return False
+        return file_hash in self.store
+
+    def __len__(self):
+        return len(self.store)
+
+    def get(self, file_hash, default=None):
+        """Return the path stored for a hash (the name for imported entries), or default."""
+        entry = self.store.get(file_hash)
+        return _path_of(entry) if entry is not None else default
+
+    def __getitem__(self, file_hash):
+        file_path = self.get(file_hash)
+        if file_path is None:
+            raise KeyError(file_hash)
+        return file_path
+
+    def add(self, file_hash, file_path, prefix=None):
+        """Store the hash of a file under its full path."""
+        self.add_many([(file_hash, file_path, prefix)])
+
+    def add_many(self, entries):
+        """Store (hash, full path, prefix fingerprint) tuples in one transaction."""
+        # Later entries for the same hash win, as they would one add at a time
+        entries = list({entry[0]: entry for entry in entries}.values())
+        for file_hash, _, _ in entries:
+            # A hash keeps a single entry, the replaced one leaves the name index
+            self._forget_name(file_hash)
+        self.store.add_many([
+            (file_hash, os.path.basename(file_path), file_path, None, prefix, self.root_of(file_path),
+             _size_of(file_path))
+            for file_hash, file_path, prefix in entries
+        ])
+        self._names.add_many(os.path.basename(file_path) for _, file_path, _ in entries)
+        if self.hash_filter is not None:
+            self.hash_filter.add_many(file_hash for file_hash, _, _ in entries)
+
+    def remove(self, file_hash):
+        """Forget a hash, returns True if it was stored."""
+        self._forget_name(file_hash)
+        return self.store.remove(file_hash)
+
+    def _forget_name(self, file_hash):
+        entry = self.store.get(file_hash)
+        if entry is not None:
+            self._names.remove(entry['name'])
+
+    def hash_for(self, file_path):
+        """Return the stored hash of a path, or None."""
+        entries = self.store.find_by_location(file_path)
+        if not entries:
+            # Imported entries only know the file name
+            entries = [entry for entry in self.store.find_by_name(os.path.basename(file_path))
+                       if entry['location'] is None]
+        return entries[0]['hash'] if entries else None
+
+    def find_prefix(self, prefix):
+        """Return the path of a stored file with this prefix fingerprint, or None."""
+        entry = self.store.find_by_prefix(prefix)
+        return _path_of(entry) if entry is not None else None
+
+    def find_similar_name(self, file_path):
+        """
+        Return the path of a stored file whose name matches file_path, or None.
+
+        A file with the very same name in another folder or root matches
+        first, then the oldest similar name.
+        """
+        file_name = os.path.basename(file_path)
+        for entry in self.store.find_by_name(file_name):
+            if entry['location'] is not None and entry['location'] != file_path:
+                return entry['location']
+        similar_name = self._names.find_similar(file_name)
+        if similar_name is None:
+            return None
+        entries = self.store.find_by_name(similar_name)
+        return _path_of(entries[0]) if entries else similar_name
+
+def _path_of(entry):
+    return entry['location'] or entry['name']
+
+def _size_of(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return None
@@ -2,16 +2,17 @@ document.addEventListener("DOMContentLoaded", () => {
     
     // Wait for the DOM to fully load before accessing elements
     let inputField = document.getElementById("ignoredExtensions");
+    let tokenField = document.getElementById("serviceToken");
     let saveButton = document.getElementById("saveSettings");
 
     // Check if the elements exist
-    if (!inputField || !saveButton) {
+    if (!inputField || !tokenField || !saveButton) {
         console.error("Settings elements not found.");
         return;
     }
 
     // Load saved settings
-    chrome.storage.local.get("ignoredExtensions", (data) => {
+    chrome.storage.local.get(["ignoredExtensions", "serviceToken"], (data) => {
         if (chrome.runtime.lastError) {
             console.error("Error loading storage:", chrome.runtime.lastError);
             return;
@@ -19,6 +20,7 @@ document.addEventListener("DOMContentLoaded", () => {
         if (data.ignoredExtensions) {
             inputField.value = data.ignoredExtensions.join(", ");
         }
+        tokenField.value = data.serviceToken || "";
     });
 
     // Save settings when the button is clicked
@@ -26,7 +28,7 @@ document.addEventListener("DOMContentLoaded", () => {
         let input = inputField.value;
         let extensions = input.split(",").map(ext => ext.trim().toLowerCase());
 
-        chrome.storage.local.set({ "ignoredExtensions": extensions }, () => {
+        chrome.storage.local.set({ "ignoredExtensions": extensions, "serviceToken": tokenField.value.trim() }, () => {
             if (chrome.runtime.lastError) {
                 console.error("Error saving settings:", chrome.runtime.lastError);
             } else {
@@ -0,0 +1,72 @@
+import os
+import time
+from download_pipeline import is_temporary
+
+# Seconds between polls while files are pending or the directory just changed
+MIN_INTERVAL = 2
+
+# Longest wait between polls of an idle directory
+MAX_INTERVAL = 30
+
+def take_snapshot(directory):
+    """Return {file name: (inode, size, mtime_ns)} for the regular files of a directory."""
+    snapshot = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    snapshot[entry.name] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue  # Removed while scanning
+    return snapshot
+
+class SnapshotPoller:
+    """Polling fallback for directories watchdog can't observe (network shares).
+
+    Each poll takes one os.scandir snapshot and diffs it against the
+    previous one by (inode, size, mtime). New or changed files become
+    pending, and a pending file settles once a whole poll interval passes
+    without its signature changing, so any number of files are checked for
+    stability in the same pass. While nothing is pending and nothing
+    changes, the interval doubles up to max_interval.
+    """
+
+    def __init__(self, directory, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+        self.directory = directory
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._previous = {}
+        self._pending = set()
+
+    def poll(self):
+        """
+        Take a snapshot and return the names of files that settled since the last poll.
+
+        Files present at the first poll count as new, so they are reported
+        once they are stable too.
+        """
+        current = take_snapshot(self.directory)
+        changed = {name for name, signature in current.items() if self._previous.get(name) != signature}
+        removed = self._previous.keys() - current.keys()
+
+        settled = []
+        for name in sorted(self._pending - changed - removed):
+            # Temporary and empty files wait until they are renamed or written to
+            if not is_temporary(name) and current[name][1] > 0:
+                settled.append(name)
+        self._pending = (self._pending | changed) - removed - set(settled)
+        self._previous = current
+
+        # Poll quickly while something changes or a pending file may settle
+        can_settle = any(not is_temporary(name) and current[name][1] > 0 for name in self._pending)
+        if changed or removed or can_settle:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return settled
+
+    def wait(self):
+        """Sleep until the next poll is due."""
+        time.sleep(self.interval)
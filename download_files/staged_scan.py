@@ -0,0 +1,403 @@
+import os
+import sys
+import stat
+import time
+import zlib
+import pickle
+import shutil
+import hashlib
+import tempfile
+from hash_cache import get_cache
+from parallel_hash import DEFAULT_WORKERS, hash_files, worker_pool
+from file_hashing import FAST_ALGORITHM, hash_file, new_hasher
+
+# Bytes taken from the head and from the tail of a file for the partial hash
+SAMPLE_SIZE = 64 * 1024
+
+EMPTY_FILE_HASH = hashlib.sha256(b"").hexdigest()
+
+# Paths held in memory by a streaming scan before size buckets are spilled to disk
+MAX_IN_MEMORY = 1000000
+
+# Spill files, a spilled scan holds about 1/SPILL_PARTITIONS of the paths at a time
+SPILL_PARTITIONS = 64
+
+# Size-colliding files confirmed together by a streaming scan before its groups are yielded
+BATCH_FILES = 512
+
+# Files walked between progress reports
+PROGRESS_EVERY = 1000
+
+def new_scan_stats():
+    """Create the counters reported by find_duplicate_groups."""
+    return {
+        'files': 0,
+        'bytes': 0,
+        'cache_hits': 0,
+        'size_stage': {'files_skipped': 0, 'bytes_skipped': 0},
+        'partial_stage': {'files_hashed': 0, 'bytes_read': 0, 'files_skipped': 0, 'bytes_skipped': 0},
+        'full_stage': {'files_hashed': 0, 'bytes_read': 0},
+        'verify_stage': {'files_hashed': 0, 'bytes_read': 0},
+        # Streaming scans: bytes in files sharing a size, and those already checked
+        'candidate_bytes': 0,
+        'checked_bytes': 0,
+    }
+
+def walk_files(directory):
+    """Yield (path, size) for every regular file under a directory."""
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                print(f"Could not access file path: {file_path}")
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield file_path, st.st_size
+
+def partial_hash(file_path, size, sample_size=SAMPLE_SIZE, algorithm="sha256"):
+    """Hash the first and last sample_size bytes of a file.
+
+    Files no larger than two samples are read whole, so for them the
+    result is the full digest of the file.
+    """
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb") as f:
+        if size <= 2 * sample_size:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(sample_size))
+            f.seek(size - sample_size)
+            hasher.update(f.read(sample_size))
+    return hasher.hexdigest()
+
+def full_hash(file_path, size=None, algorithm="sha256"):
+    """Hash a whole file, size is accepted for job tuples."""
+    return hash_file(file_path, algorithm)
+
+def group_duplicates(files, sample_size=SAMPLE_SIZE, skip_empty=False, stats=None, use_cache=True,
+                     workers=DEFAULT_WORKERS, use_processes=False, algorithm=FAST_ALGORITHM):
+    """
+    Group identical files using size, then a head/tail sample, then a full hash.
+
+    Only files whose size collides with another file are sampled, and only
+    files whose sample still collides are read in full. When algorithm is
+    not SHA-256, the files still grouped at the end are verified with
+    SHA-256. All hashing stages run on a worker pool; the result does not
+    depend on the number of workers.
+
+    Args:
+        files: Iterable of (path, size) pairs, in the order results should follow.
+        sample_size: Bytes hashed from each end of a file in the partial stage.
+        skip_empty: If True, zero-byte files are never reported as duplicates.
+        stats: Optional dict from new_scan_stats() to accumulate counters into.
+        use_cache: If True, digests are reused from the shared hash cache.
+        workers: Number of hashing workers.
+        use_processes: Hash in worker processes instead of threads.
+        algorithm: Digest used for the sample and full stages.
+
+    Returns:
+        Dict mapping SHA-256 hex digest to the list of duplicate paths. Groups
+        and the paths inside them keep the order in which files were given.
+    """
+    if stats is None:
+        stats = new_scan_stats()
+    cache = get_cache() if use_cache else None
+
+    # Stage 1: group by size, files with a unique size can't have a duplicate
+    order = {}
+    by_size = {}
+    for file_path, size in files:
+        order[file_path] = len(order)
+        stats['files'] += 1
+        stats['bytes'] += size
+        by_size.setdefault(size, []).append(file_path)
+
+    executor = worker_pool(workers, use_processes)
+    try:
+        return _confirm_groups(by_size, order, sample_size, skip_empty, stats, cache,
+                               workers, use_processes, algorithm, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def _confirm_groups(by_size, order, sample_size, skip_empty, stats, cache, workers, use_processes, algorithm,
+                    executor):
+    """Run the sample, full and verify stages on size buckets, see group_duplicates."""
+    digests = {}
+    sample_jobs = []
+    for size, paths in by_size.items():
+        if len(paths) < 2 or (size == 0 and skip_empty):
+            stats['size_stage']['files_skipped'] += len(paths)
+            stats['size_stage']['bytes_skipped'] += size * len(paths)
+        elif size == 0:
+            # Every empty file has the same content, no need to open them
+            for file_path in paths:
+                digests[file_path] = EMPTY_FILE_HASH
+        else:
+            sample_jobs.extend((file_path, size, sample_size, algorithm) for file_path in paths)
+
+    # Stage 2: hash a head/tail sample of the files sharing a size
+    by_sample = {}
+    for (file_path, size, _, _), sample, from_cache in hash_files(
+            sample_jobs, partial_hash, workers, use_processes,
+            cache=cache, algorithm=f"{algorithm}-sample-{sample_size}", executor=executor):
+        if sample is None:
+            continue  # Skip files that cannot be read
+        stats['partial_stage']['files_hashed'] += 1
+        if from_cache:
+            stats['cache_hits'] += 1
+        else:
+            stats['partial_stage']['bytes_read'] += min(size, 2 * sample_size)
+        by_sample.setdefault((size, sample), []).append(file_path)
+
+    full_jobs = []
+    for (size, sample), sample_paths in by_sample.items():
+        if len(sample_paths) < 2:
+            stats['partial_stage']['files_skipped'] += 1
+            stats['partial_stage']['bytes_skipped'] += size - min(size, 2 * sample_size)
+        elif size <= 2 * sample_size:
+            # The sample already covered the whole file
+            for file_path in sample_paths:
+                digests[file_path] = sample
+        else:
+            full_jobs.extend((file_path, size, algorithm) for file_path in sample_paths)
+
+    # Stage 3: full hash of the files that still collide
+    for (file_path, size, _), digest, from_cache in hash_files(
+            full_jobs, full_hash, workers, use_processes, cache=cache, algorithm=algorithm, executor=executor):
+        if digest is None:
+            continue
+        digests[file_path] = digest
+        stats['full_stage']['files_hashed'] += 1
+        if from_cache:
+            stats['cache_hits'] += 1
+        else:
+            stats['full_stage']['bytes_read'] += size
+
+    if algorithm != "sha256":
+        # Stage 4: confirm the remaining groups with SHA-256, which also keys the result
+        sizes = {file_path: size for size, paths in by_size.items() for file_path in paths}
+        by_digest = {}
+        for file_path, digest in digests.items():
+            by_digest.setdefault(digest, []).append(file_path)
+        verify_jobs = [(file_path, sizes[file_path], "sha256")
+                       for digest, paths in by_digest.items() if len(paths) > 1 and digest != EMPTY_FILE_HASH
+                       for file_path in paths]
+        digests = {file_path: digest for file_path, digest in digests.items() if digest == EMPTY_FILE_HASH}
+        for (file_path, size, _), digest, from_cache in hash_files(
+                verify_jobs, full_hash, workers, use_processes, cache=cache, algorithm="sha256",
+                executor=executor):
+            if digest is None:
+                continue
+            digests[file_path] = digest
+            stats['verify_stage']['files_hashed'] += 1
+            if from_cache:
+                stats['cache_hits'] += 1
+            else:
+                stats['verify_stage']['bytes_read'] += size
+
+    file_hashes = {}
+    for file_path in sorted(digests, key=order.get):
+        file_hashes.setdefault(digests[file_path], []).append(file_path)
+
+    return {file_hash: paths for file_hash, paths in file_hashes.items() if len(paths) > 1}
+
+class SizeBuckets:
+    """Paths grouped by file size, spilled to disk past max_in_memory paths.
+
+    Until the limit is reached this is a plain dict of size -> paths. Past
+    it, the buckets are pickled into SPILL_PARTITIONS temporary files, a
+    size always going to the same file, and partitions() reads them back
+    one at a time. Every path keeps the position it was added at.
+    """
+
+    def __init__(self, max_in_memory=MAX_IN_MEMORY, partitions=SPILL_PARTITIONS):
+        self.max_in_memory = max_in_memory
+        self.num_partitions = partitions
+        self.count = 0
+        self._buckets = {}
+        self._held = 0
+        self._spill_dir = None
+        self._spill_files = []
+
+    def add(self, size, file_path):
+        self._buckets.setdefault(size, []).append((self.count, file_path))
+        self.count += 1
+        self._held += 1
+        if self._held >= self.max_in_memory:
+            self._spill()
+
+    @property
+    def spilled(self):
+        return self._spill_dir is not None
+
+    def _spill(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="ddas-scan-")
+            self._spill_files = [open(os.path.join(self._spill_dir, f"{i}.pickle"), "wb")
+                                 for i in range(self.num_partitions)]
+        chunks = [{} for _ in range(self.num_partitions)]
+        for size, entries in self._buckets.items():
+            chunks[zlib.crc32(size.to_bytes(8, 'little')) % self.num_partitions][size] = entries
+        for chunk, f in zip(chunks, self._spill_files):
+            if chunk:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._buckets = {}
+        self._held = 0
+
+    def partitions(self):
+        """Yield dicts of size -> [(position, path)], each size appears in exactly one."""
+        if self._spill_dir is None:
+            yield self._buckets
+            return
+        self._spill()
+        for f in self._spill_files:
+            f.close()
+            partition = {}
+            with open(f.name, "rb") as spilled:
+                while True:
+                    try:
+                        chunk = pickle.load(spilled)
+                    except EOFError:
+                        break
+                    for size, entries in chunk.items():
+                        partition.setdefault(size, []).extend(entries)
+            os.remove(f.name)
+            yield partition
+
+    def close(self):
+        """Remove the spill files."""
+        for f in self._spill_files:
+            f.close()
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+def iter_duplicate_groups(files, sample_size=SAMPLE_SIZE, skip_empty=False, stats=None, use_cache=True,
+                          workers=DEFAULT_WORKERS, use_processes=False, algorithm=FAST_ALGORITHM,
+                          progress=None, max_in_memory=MAX_IN_MEMORY, batch_files=BATCH_FILES):
+    """
+    Streaming group_duplicates: yield (sha256, paths) groups as soon as they are confirmed.
+
+    Files are first bucketed by size, which only needs the listing. The
+    size buckets are then checked batch_files files at a time and the
+    groups of each batch are yielded before the next batch is read, so
+    results start arriving long before a large tree is done. Past
+    max_in_memory paths the buckets are spilled to disk (see SizeBuckets)
+    and memory stays bounded by one partition and one batch.
+
+    Args:
+        files, sample_size, skip_empty, stats, use_cache, workers,
+            use_processes, algorithm: As for group_duplicates.
+        progress: Optional, called as progress(stats, eta) every
+            PROGRESS_EVERY files listed (eta None) and after every batch,
+            with eta the estimated seconds left, from the share of
+            stats['candidate_bytes'] already checked.
+        max_in_memory: Paths held in memory before spilling to disk.
+        batch_files: Size-colliding files confirmed per batch.
+
+    Yields:
+        (SHA-256 hex digest, list of paths) for every group of duplicates,
+        paths in the order files were given. Groups come in batch order,
+        not in the order of their first file.
+    """
+    if stats is None:
+        stats = new_scan_stats()
+    cache = get_cache() if use_cache else None
+    buckets = SizeBuckets(max_in_memory)
+    size_counts = {}
+    # One pool for every stage of every batch
+    executor = worker_pool(workers, use_processes)
+    try:
+        # Stage 1: bucket by size while listing
+        for file_path, size in files:
+            buckets.add(size, file_path)
+            size_counts[size] = size_counts.get(size, 0) + 1
+            stats['files'] += 1
+            stats['bytes'] += size
+            if progress is not None and stats['files'] % PROGRESS_EVERY == 0:
+                progress(stats, None)
+        stats['candidate_bytes'] += sum(size * count for size, count in size_counts.items() if count > 1)
+        del size_counts
+
+        start = time.monotonic()
+
+        def confirm(batch):
+            by_size = {size: [file_path for _, file_path in entries] for size, entries in batch.items()}
+            order = {file_path: position for entries in batch.values() for position, file_path in entries}
+            groups = _confirm_groups(by_size, order, sample_size, skip_empty, stats, cache,
+                                     workers, use_processes, algorithm, executor)
+            stats['checked_bytes'] += sum(size * len(entries) for size, entries in batch.items()
+                                          if len(entries) > 1)
+            if progress is not None:
+                elapsed = time.monotonic() - start
+                remaining = stats['candidate_bytes'] - stats['checked_bytes']
+                progress(stats, elapsed * remaining / stats['checked_bytes'] if stats['checked_bytes'] else None)
+            return groups.items()
+
+        # Stages 2 to 4, a batch at a time
+        for partition in buckets.partitions():
+            batch = {}
+            batch_count = 0
+            for size, entries in partition.items():
+                batch[size] = entries
+                if len(entries) > 1:
+                    batch_count += len(entries)
+                if batch_count >= batch_files:
+                    yield from confirm(batch)
+                    batch = {}
+                    batch_count = 0
+            if batch:
+                yield from confirm(batch)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        buckets.close()
+
+def find_duplicate_groups(directory, sample_size=SAMPLE_SIZE, skip_empty=False, stats=None, use_cache=True,
+                          workers=DEFAULT_WORKERS, use_processes=False, algorithm=FAST_ALGORITHM):
+    """Walk a directory tree and group identical files, see group_duplicates."""
+    return group_duplicates(walk_files(directory), sample_size, skip_empty, stats, use_cache,
+                            workers, use_processes, algorithm)
+
+def format_bytes(num_bytes):
+    """Format a byte count for display."""
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if num_bytes < 1024 or unit == 'TiB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{num_bytes} B"
+        num_bytes /= 1024
+
+def format_duration(seconds):
+    """Format a number of seconds as h:mm:ss or m:ss for display."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def print_progress(stats, eta):
+    """Progress callback for iter_duplicate_groups, rewrites one status line on stderr."""
+    if eta is None and not stats['checked_bytes']:
+        status = f"Listed {stats['files']} files ({format_bytes(stats['bytes'])})"
+    else:
+        status = (f"Checked {format_bytes(stats['checked_bytes'])} of "
+                  f"{format_bytes(stats['candidate_bytes'])} in same-size files")
+        if eta is not None:
+            status += f", about {format_duration(eta)} left"
+    print(f"\r{status:<79}", end="", file=sys.stderr, flush=True)
+
+def print_scan_stats(stats):
+    """Print how many bytes each stage avoided reading."""
+    print(f"Scanned {stats['files']} files ({format_bytes(stats['bytes'])})")
+    print(f"  Size stage skipped {stats['size_stage']['files_skipped']} files "
+          f"({format_bytes(stats['size_stage']['bytes_skipped'])})")
+    print(f"  Partial hash read {format_bytes(stats['partial_stage']['bytes_read'])}, "
+          f"skipped {stats['partial_stage']['files_skipped']} files "
+          f"({format_bytes(stats['partial_stage']['bytes_skipped'])})")
+    print(f"  Full hash read {stats['full_stage']['files_hashed']} files "
+          f"({format_bytes(stats['full_stage']['bytes_read'])})")
+    if stats['verify_stage']['files_hashed']:
+        print(f"  SHA-256 verification read {stats['verify_stage']['files_hashed']} files "
+              f"({format_bytes(stats['verify_stage']['bytes_read'])})")
+    if stats['cache_hits']:
+        print(f"  Reused {stats['cache_hits']} digests from the hash cache")
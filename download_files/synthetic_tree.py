@@ -0,0 +1,161 @@
+import os
+import json
+import math
+import random
+import argparse
+
+# Name of the manifest written at the top of a generated tree
+MANIFEST_FILE = "tree.json"
+
+# Suffixes of re-downloaded copies, as browsers and file managers name them
+NAME_VARIANTS = ("{stem} (1){ext}", "{stem}-copy{ext}", "{stem}_v2{ext}", "Copy of {stem}{ext}")
+
+EXTENSIONS = (".pdf", ".zip", ".jpg", ".png", ".docx", ".txt", ".mp4", ".exe", ".csv", ".iso")
+
+WORDS = ("report", "invoice", "setup", "photo", "dataset", "notes", "slides", "backup", "scan",
+         "release", "draft", "export", "archive", "lecture", "statement", "thesis")
+
+def parse_size(text):
+    """Parse a size such as 512, 64K, 16M or 1G into bytes."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = str(text).strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def random_size(rng, median_size, sigma, max_size):
+    """Log-normal file size, most files small with a long tail of large ones."""
+    return max(1, min(max_size, int(rng.lognormvariate(math.log(median_size), sigma))))
+
+def variant_name(rng, file_name):
+    """Name a re-downloaded copy of file_name would get."""
+    stem, ext = os.path.splitext(file_name)
+    return rng.choice(NAME_VARIANTS).format(stem=stem, ext=ext)
+
+def generate_tree(root, files=1000, median_size=64 * 1024, sigma=1.5, max_size=64 * 1024 * 1024,
+                  duplicate_ratio=0.3, variant_ratio=0.5, near_duplicate_ratio=0.05,
+                  archive_share=0.5, folders=20, seed=0):
+    """
+    Write a reproducible download/archive tree for benchmarks.
+
+    The tree has a flat downloads/ folder and an archive/ folder spread
+    over subfolders. Every file is either new random content, a copy of an
+    earlier file, or a near duplicate (same size, a few bytes changed),
+    which exercises every stage of the duplicate scans. Copies get a
+    "(1)"/"-copy"/"_v2" variant of the original name or the same name in
+    another folder. The same arguments always produce the same tree.
+
+    Args:
+        root: Folder to create the tree in.
+        files: Number of files.
+        median_size, sigma, max_size: Log-normal size distribution in bytes.
+        duplicate_ratio: Share of files copying an earlier file.
+        variant_ratio: Share of copies given a variant of the original name.
+        near_duplicate_ratio: Share of files differing from an earlier one in a few bytes.
+        archive_share: Share of files placed in the archive.
+        folders: Number of archive subfolders.
+        seed: Random seed.
+
+    Returns:
+        Manifest dict, also written to root/tree.json.
+    """
+    rng = random.Random(seed)
+    downloads = os.path.join(root, "downloads")
+    archive = os.path.join(root, "archive")
+    os.makedirs(downloads, exist_ok=True)
+    for i in range(folders):
+        os.makedirs(os.path.join(archive, f"folder{i:03d}"), exist_ok=True)
+
+    written = []  # (path, size) of the files with new content
+    used_names = set()
+    counts = {'unique': 0, 'duplicates': 0, 'name_variants': 0, 'near_duplicates': 0}
+    total_bytes = 0
+    for i in range(files):
+        if rng.random() < archive_share:
+            folder = os.path.join(archive, f"folder{rng.randrange(folders):03d}")
+        else:
+            folder = downloads
+
+        roll = rng.random()
+        is_new = False
+        if written and roll < duplicate_ratio:
+            source, size = rng.choice(written)
+            with open(source, "rb") as f:
+                content = f.read()
+            name = os.path.basename(source)
+            if rng.random() < variant_ratio:
+                name = variant_name(rng, name)
+                counts['name_variants'] += 1
+            counts['duplicates'] += 1
+        elif written and roll < duplicate_ratio + near_duplicate_ratio:
+            source, size = rng.choice(written)
+            with open(source, "rb") as f:
+                content = bytearray(f.read())
+            for _ in range(3):
+                content[rng.randrange(size)] ^= 0xFF
+            name = f"{rng.choice(WORDS)}_{i}{os.path.splitext(source)[1]}"
+            counts['near_duplicates'] += 1
+        else:
+            size = random_size(rng, median_size, sigma, max_size)
+            content = rng.randbytes(size)
+            name = f"{rng.choice(WORDS)}_{i}{rng.choice(EXTENSIONS)}"
+            counts['unique'] += 1
+            is_new = True
+
+        file_path = os.path.join(folder, name)
+        while file_path in used_names:
+            file_path = os.path.join(folder, f"{i}_{name}")
+        used_names.add(file_path)
+        with open(file_path, "wb") as f:
+            f.write(content)
+        total_bytes += len(content)
+        if is_new:
+            written.append((file_path, size))
+
+    manifest = {
+        'files': files,
+        'bytes': total_bytes,
+        'downloads': downloads,
+        'archive': archive,
+        'settings': {'median_size': median_size, 'sigma': sigma, 'max_size': max_size,
+                     'duplicate_ratio': duplicate_ratio, 'variant_ratio': variant_ratio,
+                     'near_duplicate_ratio': near_duplicate_ratio, 'archive_share': archive_share,
+                     'folders': folders, 'seed': seed},
+        'counts': counts,
+    }
+    with open(os.path.join(root, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def add_tree_arguments(parser):
+    """Add the tree shape options to an argparse parser."""
+    parser.add_argument("--files", type=int, default=1000, help="number of files (default: %(default)s)")
+    parser.add_argument("--median-size", type=parse_size, default="64K", help="median file size (default: 64K)")
+    parser.add_argument("--sigma", type=float, default=1.5, help="spread of the log-normal sizes (default: %(default)s)")
+    parser.add_argument("--max-size", type=parse_size, default="64M", help="largest file (default: 64M)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="share of copies (default: %(default)s)")
+    parser.add_argument("--variant-ratio", type=float, default=0.5,
+                        help="share of copies renamed to (1)/-copy/_v2 variants (default: %(default)s)")
+    parser.add_argument("--near-duplicate-ratio", type=float, default=0.05,
+                        help="share of same-size files with a few bytes changed (default: %(default)s)")
+    parser.add_argument("--archive-share", type=float, default=0.5,
+                        help="share of files placed in archive/ (default: %(default)s)")
+    parser.add_argument("--folders", type=int, default=20, help="archive subfolders (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+
+def tree_options(args):
+    """generate_tree keyword arguments from parsed add_tree_arguments options."""
+    return {'files': args.files, 'median_size': args.median_size, 'sigma': args.sigma,
+            'max_size': args.max_size, 'duplicate_ratio': args.duplicate_ratio,
+            'variant_ratio': args.variant_ratio, 'near_duplicate_ratio': args.near_duplicate_ratio,
+            'archive_share': args.archive_share, 'folders': args.folders, 'seed': args.seed}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic download/archive tree.")
+    parser.add_argument("root", help="folder to create the tree in")
+    add_tree_arguments(parser)
+    args = parser.parse_args()
+
+    manifest = generate_tree(args.root, **tree_options(args))
+    print(f"Wrote {manifest['files']} files ({manifest['bytes'] / 1e6:.1f} MB) to {args.root}: "
+          + ", ".join(f"{count} {kind.replace('_', ' ')}" for kind, count in manifest['counts'].items()))
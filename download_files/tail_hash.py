@@ -0,0 +1,121 @@
+import os
+from file_hashing import BUFFER_SIZE, new_hasher
+
+# Bytes covered by the prefix fingerprint, enough to tell large files apart
+PREFIX_SIZE = 4 * 1024 * 1024
+
+class TailingHasher:
+    """Hashes a file while it is still being written.
+
+    Each update() reads only the bytes appended since the previous call,
+    so once the download stops growing the digest is ready after reading
+    the last few blocks. The file is reopened on every update, which keeps
+    it free for the browser to rename and lets the hasher follow it to its
+    final name. Browsers write downloads sequentially; if a file shrinks
+    the hasher starts over.
+
+    Other writers seek back and rewrite bytes already hashed (archive
+    central directories, MP4 indexes, segmented downloaders), so finish()
+    only trusts the tailed digest if the file never changed without
+    growing and its first bytes still hash as they did when read.
+    Otherwise it hashes the whole file again.
+
+    A fingerprint of the first PREFIX_SIZE bytes is available as soon as
+    they have been read, so a re-download of a known large file can be
+    recognised long before it completes.
+    """
+
+    def __init__(self, algorithm="sha256", prefix_size=PREFIX_SIZE):
+        self.algorithm = algorithm
+        self.prefix_size = prefix_size
+        self.reset()
+
+    def reset(self):
+        """Forget everything hashed so far."""
+        self.offset = 0
+        self.prefix = None
+        self.rewritten = False
+        self._mtime_ns = None
+        self._hasher = new_hasher(self.algorithm)
+        self._prefix_hasher = new_hasher(self.algorithm)
+
+    def update(self, file_path, limit=None):
+        """
+        Hash the bytes appended to a file since the last update.
+
+        Args:
+            file_path: Current path of the file, it may have been renamed.
+            limit: Maximum number of bytes to read in this call.
+
+        Returns:
+            Number of bytes read.
+        """
+        with open(file_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < self.offset:
+                self.reset()
+            elif stat.st_size == self.offset and self._mtime_ns not in (None, stat.st_mtime_ns):
+                # Written to since the last update without growing: bytes already hashed changed
+                self.rewritten = True
+            f.seek(self.offset)
+            read_total = 0
+            while limit is None or read_total < limit:
+                block = f.read(BUFFER_SIZE if limit is None else min(BUFFER_SIZE, limit - read_total))
+                if not block:
+                    break
+                self._update_prefix(block)
+                self._hasher.update(block)
+                self.offset += len(block)
+                read_total += len(block)
+            # Only a file read to its end can tell a later write that didn't append
+            stat = os.fstat(f.fileno())
+            self._mtime_ns = stat.st_mtime_ns if stat.st_size == self.offset else None
+        return read_total
+
+    def _update_prefix(self, block):
+        if self.prefix is not None or self.offset >= self.prefix_size:
+            return
+        self._prefix_hasher.update(block[:self.prefix_size - self.offset])
+        if self.offset + len(block) >= self.prefix_size:
+            self.prefix = format_prefix(self.algorithm, self.prefix_size, self._prefix_hasher.hexdigest())
+
+    def finish(self, file_path):
+        """Hash the rest of a file that stopped growing, returns the digest of the whole file."""
+        tailed = self.offset > 0
+        self.update(file_path)
+        if tailed and (self.rewritten or not self._prefix_unchanged(file_path)):
+            self.reset()
+            self.update(file_path)
+        return self.hexdigest()
+
+    def _prefix_unchanged(self, file_path):
+        """Check if the first bytes of a file still hash as they did when tailed."""
+        remaining = min(self.offset, self.prefix_size)
+        check = new_hasher(self.algorithm)
+        with open(file_path, "rb") as f:
+            while remaining:
+                block = f.read(min(BUFFER_SIZE, remaining))
+                if not block:
+                    return False
+                check.update(block)
+                remaining -= len(block)
+        return check.hexdigest() == self._prefix_hasher.hexdigest()
+
+    def hexdigest(self):
+        """Digest of the bytes hashed so far."""
+        return self._hasher.hexdigest()
+
+def format_prefix(algorithm, prefix_size, digest):
+    """Prefix fingerprint string, which records how it was computed so sizes never mix."""
+    return f"{algorithm}:{prefix_size}:{digest}"
+
+def hash_with_prefix(file_path, algorithm="sha256", prefix_size=PREFIX_SIZE):
+    """
+    Hash a whole file and fingerprint its prefix in one read.
+
+    Returns:
+        (digest, prefix fingerprint), the fingerprint is None for files
+        shorter than prefix_size.
+    """
+    hasher = TailingHasher(algorithm, prefix_size)
+    return hasher.finish(file_path), hasher.prefix
@@ -0,0 +1,191 @@
+import os
+import re
+import tempfile
+import unittest
+from itertools import product
+
+from name_index import SimilarNameIndex, StoredNameIndex, is_similar_filename
+
+def legacy_is_similar_filename(file1, file2):
+    """is_similar_filename as newdetect.py had it before name_index, kept verbatim as the reference"""
+    # Get extensions
+    name1, ext1 = os.path.splitext(file1)
+    name2, ext2 = os.path.splitext(file2)
+    
+    # Must have same extension to be considered similar
+    if ext1.lower() != ext2.lower():
+        return False
+    
+    # Convert to lowercase for comparison
+    base1 = name1.lower().strip()
+    base2 = name2.lower().strip()
+    
+    # If base names are exactly the same, they're similar
+    if base1 == base2:
+        return True
+    
+    # Remove common duplicate patterns
+    duplicate_patterns = [
+        r'\s*\(\d+\)$',           # (1), (2), etc.
+        r'\s*-\s*copy$',          # -copy, - copy
+        r'\s*_copy$',             # _copy
+        r'\s*-\s*v\d+$',          # -v1, -v2, - v1
+        r'\s*_v\d+$',             # _v1, _v2
+        r'\s*-\s*\d+$',           # -1, -2, - 1
+        r'\s*_\d+$',              # _1, _2
+        r'\s*-\s*duplicate$',     # -duplicate
+        r'\s*_duplicate$',        # _duplicate
+        r'\s*\s+copy$',           # space copy
+    ]
+    
+    clean1 = base1
+    clean2 = base2
+    
+    # Remove duplicate patterns from both filenames
+    for pattern in duplicate_patterns:
+        clean1 = re.sub(pattern, '', clean1).strip()
+        clean2 = re.sub(pattern, '', clean2).strip()
+    
+    # If cleaned names are the same, they're similar
+    if clean1 == clean2 and len(clean1) > 0:
+        return True
+    
+    # Check for numbered sequences like "text1" vs "text2", "document_v1" vs "document_v2"
+    def extract_base_and_number(text):
+        """Extract base text and trailing number"""
+        # Match patterns like: text1, text_1, text-1, text 1, textv1, text_v1, text-v1
+        patterns = [
+            r'^(.+?)v?[-_\s]*(\d+)$',      # Matches: text1, text_1, text-1, text 1, textv1, text_v1, text-v1
+            r'^(.+?)[-_\s]*v[-_\s]*(\d+)$', # Matches: text-v1, text_v1, text v1
+        ]
+        
+        for pattern in patterns:
+            match = re.match(pattern, text.strip())
+            if match:
+                base_part = match.group(1).strip().rstrip('_-')
+                number_part = match.group(2)
+                return base_part, number_part
+        
+        return text, None
+    
+    # Extract base and numbers
+    base1_clean, num1 = extract_base_and_number(clean1)
+    base2_clean, num2 = extract_base_and_number(clean2)
+    
+    # If both have numbers and same base, they're similar
+    if num1 and num2 and base1_clean == base2_clean:
+        # Must have meaningful base (at least 2 characters)
+        if len(base1_clean) >= 2:
+            return True
+    
+    # Check for very similar bases with small differences
+    # Only for longer filenames to avoid false positives
+    if len(clean1) >= 5 and len(clean2) >= 5:
+        # Calculate similarity for very close matches
+        if abs(len(clean1) - len(clean2)) <= 2:  # Length difference <= 2
+            # Check how many characters are the same from the beginning
+            shorter_len = min(len(clean1), len(clean2))
+            matches = sum(1 for i in range(shorter_len) if i < len(clean1) and i < len(clean2) and clean1[i] == clean2[i])
+            
+            # If 90% of characters match from the beginning, consider similar
+            if matches / shorter_len >= 0.9 and shorter_len >= 5:
+                return True
+    
+    # Special case: Check if one is a subset of another with minimal differences
+    if len(clean1) >= 4 and len(clean2) >= 4:
+        # Remove common separators and spaces for comparison
+        normalized1 = re.sub(r'[-_\s]+', '', clean1)
+        normalized2 = re.sub(r'[-_\s]+', '', clean2)
+        
+        # If one is contained in another and they're similar length
+        if (normalized1 in normalized2 or normalized2 in normalized1):
+            shorter = min(len(normalized1), len(normalized2))
+            longer = max(len(normalized1), len(normalized2))
+            # Only if the difference is small relative to the shorter string
+            if (longer - shorter) <= max(2, shorter * 0.2):  # Max 20% difference or 2 chars
+                return True
+    
+    return False
+
+# Stems and suffixes combined into the golden names, covering every rule of
+# the legacy function and names of the same shape that block poorly
+STEMS = [
+    "report", "Report", "report final", "report_final", "report-final", "reprot", "reports",
+    "annual report 2023", "annual report 2024", "annual_report_2023", "annualreport2023",
+    "document", "documents", "docum", "doc", "a", "ab", "abcd", "abcde", "abcdef",
+    "text1", "text2", "text", "text_v1", "text-v2", "textv3", "data 1", "data 2",
+    "IMG_0001", "IMG_0002", "IMG_1001", "DSC01234", "DSC01235",
+    "Screenshot 2024-05-06 at 1.02.03", "Screenshot 2024-05-06 at 1.02.04",
+    "Screenshot 2024-11-30 at 12.59.59", "Screenshot from holiday",
+    "invoice-2024-001", "invoice-2024-002", "invoice 2024 001", "in voice",
+    "setup", "setup-x64", "setup_x64_v2", "  spaced  ", "----", "-_-_", "(1)", "",
+    "the quick brown fox", "the quick brown fix", "quick brown fox",
+]
+SUFFIXES = ["", " (1)", " (12)", "-copy", " copy", "_copy", "-v2", "_v3", "-1", "_2", "-duplicate", "2"]
+EXTENSIONS = [".txt", ".TXT", ""]
+
+def golden_names():
+    names = []
+    for stem, suffix, ext in product(STEMS, SUFFIXES, EXTENSIONS):
+        name = stem + suffix + ext
+        if name not in names:
+            names.append(name)
+    return names
+
+def legacy_find_similar(stored, file_name):
+    """Oldest stored name the legacy function finds similar, as the all-pairs loop did."""
+    for existing_name in stored:
+        if existing_name != file_name and legacy_is_similar_filename(file_name, existing_name):
+            return existing_name
+    return None
+
+class GoldenTest(unittest.TestCase):
+    """Compare name_index with the legacy all-pairs implementation on fixed names."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.names = golden_names()
+        # Every fifth one goes through the indexes, the legacy lookup is quadratic
+        cls.indexed = cls.names[::5]
+        # Names of the same shape, stored before the golden names so they are candidates everywhere,
+        # those ending in PM are only similar by the 90% rule
+        cls.screenshots = [f"Screenshot 2024-{month:02}-{day:02} at {hour}.{minute:02}.{second:02}{pm}.png"
+                           for month, day, hour, minute, second, pm
+                           in product((1, 5, 12), (6, 7, 28), (1, 12), (2, 59), (3, 4), ("", " PM"))]
+
+    def test_is_similar_filename(self):
+        for name1, name2 in product(self.names[::25], self.names):
+            self.assertEqual(is_similar_filename(name1, name2), legacy_is_similar_filename(name1, name2),
+                             (name1, name2))
+
+    def check_index(self, index):
+        stored = []
+        for file_name in self.screenshots + self.indexed:
+            self.assertEqual(index.find_similar(file_name), legacy_find_similar(stored, file_name), file_name)
+            index.add(file_name)
+            stored.append(file_name)
+        for file_name in stored[::7]:
+            index.remove(file_name)
+            stored.remove(file_name)
+        for file_name in self.names[1::10] + ["Screenshot from holiday.png"]:
+            self.assertEqual(index.find_similar(file_name), legacy_find_similar(stored, file_name), file_name)
+
+    def test_similar_name_index(self):
+        self.check_index(SimilarNameIndex())
+
+    def test_stored_name_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            index = StoredNameIndex(os.path.join(directory, "names.db"))
+            try:
+                self.check_index(index)
+            finally:
+                index.close()
+
+    def test_unrelated_shape_has_no_candidates(self):
+        index = SimilarNameIndex()
+        for file_name in self.screenshots:
+            index.add(file_name)
+        self.assertEqual(index.candidates("Screenshot from holiday.png")[1], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from parallel_hash import DEFAULT_WORKERS, QUEUE_DEPTH
+from file_hashing import BUFFER_SIZE
+from staged_scan import format_bytes
+
+# Files of a group kept open at once, larger groups reopen files for every chunk
+MAX_OPEN_FILES = 64
+
+def new_verify_stats():
+    """Create the counters updated by verify_groups."""
+    return {'groups': 0, 'files': 0, 'bytes_read': 0, 'files_rejected': 0}
+
+class _ChunkReader:
+    """Reads a group of files chunk by chunk, keeping them open while the group is small."""
+
+    def __init__(self, paths, buffer_size):
+        self.buffer_size = buffer_size
+        self._files = {}
+        if len(paths) <= MAX_OPEN_FILES:
+            for file_path in paths:
+                try:
+                    self._files[file_path] = open(file_path, "rb")
+                except OSError:
+                    pass  # Reported as unreadable by read()
+
+    def read(self, file_path, offset):
+        """Return the chunk at offset, or None if the file can't be read."""
+        try:
+            f = self._files.get(file_path)
+            if f is not None:
+                return f.read(self.buffer_size)
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                return f.read(self.buffer_size)
+        except OSError:
+            return None
+
+    def drop(self, file_path):
+        f = self._files.pop(file_path, None)
+        if f is not None:
+            f.close()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+def compare_files(paths, buffer_size=BUFFER_SIZE):
+    """
+    Split files into groups of byte-identical content.
+
+    All files are read together, one buffer_size chunk at a time, and
+    split wherever their chunks differ. A file stops being read as soon
+    as no other file shares its content so far, so a digest collision
+    costs one chunk rather than a full read. Unreadable files are left out.
+
+    Returns:
+        (groups, bytes_read), groups being lists of two or more paths with
+        identical content, in the order the paths were given.
+    """
+    reader = _ChunkReader(paths, buffer_size)
+    confirmed = []
+    bytes_read = 0
+    offset = 0
+    candidates = [list(paths)]
+    try:
+        while candidates:
+            next_candidates = []
+            for group in candidates:
+                # Chunks are dict keys, so identical chunks are held once
+                by_chunk = {}
+                for file_path in group:
+                    chunk = reader.read(file_path, offset)
+                    if chunk is None:
+                        continue
+                    bytes_read += len(chunk)
+                    by_chunk.setdefault(chunk, []).append(file_path)
+                for chunk, members in by_chunk.items():
+                    if len(members) < 2:
+                        reader.drop(members[0])
+                    elif len(chunk) < buffer_size:
+                        # Every member ended here with the same content
+                        confirmed.append(members)
+                        for file_path in members:
+                            reader.drop(file_path)
+                    else:
+                        next_candidates.append(members)
+            candidates = next_candidates
+            offset += buffer_size
+    finally:
+        reader.close()
+    order = {file_path: i for i, file_path in enumerate(paths)}
+    confirmed.sort(key=lambda group: order[group[0]])
+    return confirmed, bytes_read
+
+def files_identical(file_path1, file_path2, buffer_size=BUFFER_SIZE):
+    """Check two files byte for byte, stopping at the first differing chunk."""
+    return bool(compare_files([file_path1, file_path2], buffer_size)[0])
+
+def verify_groups(groups, workers=DEFAULT_WORKERS, buffer_size=BUFFER_SIZE, stats=None):
+    """
+    Confirm duplicate groups by comparing their bytes, several groups at once.
+
+    Meant to run before any destructive action, when the groups come from
+    digests alone. Groups are compared on a thread pool, at most
+    workers * QUEUE_DEPTH in flight.
+
+    Args:
+        groups: Iterable of lists of paths believed to be identical.
+        workers: Number of groups compared at the same time.
+        buffer_size: Bytes read from each file per step.
+        stats: Optional dict from new_verify_stats() to accumulate counters into.
+
+    Yields:
+        (group, confirmed) for every input group, confirmed being the list of
+        its byte-identical subgroups (normally the whole group, once).
+    """
+    if stats is None:
+        stats = new_verify_stats()
+    workers = max(1, workers)
+
+    def collect(group, future):
+        confirmed, bytes_read = future.result()
+        stats['groups'] += 1
+        stats['files'] += len(group)
+        stats['bytes_read'] += bytes_read
+        stats['files_rejected'] += len(group) - sum(len(subgroup) for subgroup in confirmed)
+        return group, confirmed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for group in groups:
+            group = list(group)
+            pending.append((group, executor.submit(compare_files, group, buffer_size)))
+            while len(pending) >= workers * QUEUE_DEPTH:
+                yield collect(*pending.popleft())
+        while pending:
+            yield collect(*pending.popleft())
+
+def verified_groups(groups, workers=DEFAULT_WORKERS, stats=None):
+    """Byte-identical subgroups of groups, flattened, see verify_groups."""
+    for _, confirmed in verify_groups(groups, workers, stats=stats):
+        yield from confirmed
+
+def print_verify_stats(stats):
+    """Print what the byte comparison read and rejected."""
+    print(f"Byte comparison verified {stats['files']} files in {stats['groups']} groups "
+          f"({format_bytes(stats['bytes_read'])} read)")
+    if stats['files_rejected']:
+        print(f"  {stats['files_rejected']} files did not match their group and were left out")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that files are byte-for-byte identical.")
+    parser.add_argument("files", nargs="+", help="files to compare")
+    args = parser.parse_args()
+
+    groups, bytes_read = compare_files(args.files)
+    for group in groups:
+        print("Identical: " + ", ".join(group))
+    grouped = sum(len(group) for group in groups)
+    print(f"{grouped} of {len(args.files)} files have an identical copy ({format_bytes(bytes_read)} read)")